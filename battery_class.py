@@ -0,0 +1,131 @@
+# coding: utf-8
+
+#Class declarations for the battery models of the FLEET step kernel (IDEAL, LOSSY, AGING)
+
+#INPUT : Battery levels, harvested energy and consumed energy of all the nodes for one hour (arrays)
+
+#OUTPUTS: Battery levels after the hour (before clipping) and the usable capacity of every node
+
+#METHODS: To set up the per node state for a run of N nodes (reset())
+#         To step all the nodes at once (step()), called by FLEET.run() once per hour
+
+#USAGE: python battery_class.py [--nodes 1000]   (parity of IDEAL with dsnv2 CAPM and cost of every model)
+
+#IDEAL is the bucket of dsnv2 CAPM.step(): batt += henergy - e_consumed. LOSSY adds charge / discharge
+#efficiency and self-discharge (leakage per hour of the stored energy), AGING adds capacity fade
+#proportional to the charge throughput (equivalent full cycles). Every model is a few array operations over
+#all the nodes, so a richer model costs the same no. of Python calls per hour as the ideal one.
+#FLEET flags a violation when the battery reaches BMIN or the capacity and clips it to [BMIN, capacity].
+#The fade of an hour takes effect at the start of the next step: the energy above the faded capacity is lost
+#there, without a violation. The reward still uses the nominal BMAX and BOPT of the node (its design point).
+
+import argparse
+import time
+
+import numpy as np
+
+
+class IDEAL(object):
+
+    def reset(self, N, BMAX):
+        self.capacity = BMAX #usable capacity (nominal BMAX)
+        return 0
+
+    #in place update of batt (float array of N) with the energy of one hour
+    def step(self, batt, henergy, e_consumed):
+        batt += henergy - e_consumed
+        return batt
+
+
+class LOSSY(IDEAL):
+
+    def __init__(self, charge=0.9, discharge=0.9, leakage=4e-5):
+        self.charge = charge       #fraction of the surplus energy that is stored
+        self.discharge = discharge #fraction of the drawn energy that reaches the node
+        self.leakage = leakage     #fraction of the stored energy lost per hour (self-discharge, about 3% a month)
+
+    def step(self, batt, henergy, e_consumed):
+        net = henergy - e_consumed
+        batt -= batt * self.leakage
+        batt += np.where(net > 0, net * self.charge, net / self.discharge)
+        return batt
+
+
+class AGING(LOSSY):
+
+    def __init__(self, charge=0.9, discharge=0.9, leakage=4e-5, fade=0.2, cycles=500.0):
+        LOSSY.__init__(self, charge, discharge, leakage)
+        self.fade = fade     #fraction of the capacity lost after `cycles` equivalent full cycles
+        self.cycles = cycles
+
+    def reset(self, N, BMAX):
+        self.nominal = np.broadcast_to(np.asarray(BMAX, dtype=float), (N,)).copy()
+        self.capacity = self.nominal.copy() #capacity of the current step, used by FLEET for the limits
+        self.faded = self.nominal.copy()    #capacity after the throughput so far, used from the next step on
+        self.throughput = np.zeros(N) #energy moved in and out of the battery
+        return 0
+
+    def step(self, batt, henergy, e_consumed):
+        self.capacity = self.faded
+        np.minimum(batt, self.capacity, out=batt) #energy above the faded capacity is lost (not a violation)
+        before = batt.copy()
+        LOSSY.step(self, batt, henergy, e_consumed)
+        self.throughput += np.abs(np.clip(batt, 0, self.capacity) - before)
+        #one equivalent full cycle moves 2*nominal of energy. A worn out battery keeps no energy (capacity 0)
+        self.faded = np.maximum(self.nominal * (1 - self.fade * self.throughput / (2 * self.nominal * self.cycles)), 0)
+        return batt
+
+
+MODELS = {'ideal': IDEAL, 'lossy': LOSSY, 'aging': AGING}
+
+
+#function to run the same actions on dsnv2 CAPM (trainmode=False) and on a FLEET with the IDEAL battery
+#(run(..., exact=True)). Returns the max. absolute differences of the battery levels and day rewards (0 when they are identical)
+def parity(location='tokyo', year=2010, seed=0):
+    from dsnv2_class import CAPM
+    from fleet_class import FLEET
+    from solar_data import get_radiation
+
+    capm = CAPM(location, year)
+    s, r, day_end, year_end = capm.reset()
+    actions = np.random.default_rng(seed).integers(0, capm.N_ACTIONS, capm.eno.NO_OF_DAYS * capm.eno.TIME_STEPS)
+    batt, day_reward = [], []
+    t = 0
+    while not year_end:
+        batt.append(capm.batt)
+        s, r, day_end, year_end = capm.step(actions[t])
+        t += 1
+        if day_end:
+            day_reward.append(r)
+
+    fleet = FLEET(station=0, sradiation=get_radiation(location, year)[None], battery=IDEAL())
+    hour = iter(range(len(actions)))
+    result = fleet.run(lambda state: actions[next(hour)][None], trace=True, exact=True)
+    return {'batt': float(np.max(np.abs(result['batt'][0] - np.array(batt)))),
+            'day_reward': float(np.max(np.abs(result['day_reward'][0] - np.array(day_reward))))}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--nodes', type=int, default=1000)
+    args = parser.parse_args()
+
+    from fleet_class import FLEET, fixed_policy
+    from solar_data import LOCATIONS, get_years
+
+    worst = {'batt': 0.0, 'day_reward': 0.0}
+    for location in LOCATIONS:
+        for year in get_years(location):
+            diff = parity(location, year)
+            worst = {k: max(worst[k], diff[k]) for k in worst}
+    print('IDEAL vs CAPM, all station-years: max |batt diff| %g   max |day reward diff| %g' % (worst['batt'], worst['day_reward']))
+
+    station = np.arange(args.nodes) % 3
+    for name, model in MODELS.items():
+        fleet = FLEET(station=station, battery=model())
+        t = time.perf_counter()
+        result = fleet.run(fixed_policy(4))
+        t = time.perf_counter() - t
+        print('%-6s %d nodes: %6.1f us per hour step   mean reward %.3f   mean downtime %.1f h' %
+              (name, args.nodes, t / (fleet.NO_OF_DAYS * fleet.TIME_STEPS) * 1e6, result['reward'].mean(),
+               result['downtime'].mean()))
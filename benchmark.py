@@ -0,0 +1,212 @@
+# coding: utf-8
+
+#Benchmarks of the hot paths of ENO, CAPM/DAPM and DQN using the bundled data with a fixed seed
+
+#USAGE: python benchmark.py run [--out results.json] [--quick]
+#       python benchmark.py compare baseline.json results.json [--threshold 0.1]
+
+#Every benchmark stores a rate (higher is better) or a time in seconds (lower is better).
+#compare prints every benchmark and exits with status 1 if any of them is slower than the baseline
+#by more than the threshold (0.1 = 10%).
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+
+SEED = 0
+BATCH_SIZES = [24, 256, 4096]
+STARTUP_MODULES = ['numpy', 'dsnv2_class', 'fleet_class', 'sampler_class', 'eno_class_mother', 'learner_class']
+
+
+def seed_all(seed=SEED):
+    random.seed(seed)
+    np.random.seed(seed)
+    if 'torch' in sys.modules:
+        sys.modules['torch'].manual_seed(seed)
+
+
+#function to get the best time of several repeats of fn(); setup() runs before every repeat, outside the timer
+def best_time(fn, repeat=3, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t)
+    return min(times)
+
+
+#eno_class_mother.ENO reads ./<location>/<year>.csv, so DAPM has to be reset from inside ./data/
+@contextmanager
+def in_data_dir():
+    cwd = os.getcwd()
+    os.chdir('data')
+    try:
+        yield
+    finally:
+        os.chdir(cwd)
+
+
+#import time and RSS of a fresh interpreter (e.g. a pool worker) that imports only the given module
+def bench_startup(results, quick):
+    code = ('import sys, time; t = time.perf_counter(); import %s; t = time.perf_counter() - t; '
+            'from profiler_class import get_rss; '
+            'print(t, get_rss(), *[m for m in ("pandas", "torch") if m in sys.modules])')
+    for module in STARTUP_MODULES:
+        out = subprocess.run([sys.executable, '-c', code % module], capture_output=True, text=True, check=True)
+        t, rss, *loads = out.stdout.split()
+        results['import_' + module] = {'value': float(t), 'unit': 's', 'higher_is_better': False, 'loads': loads}
+        results['rss_' + module] = {'value': float(rss), 'unit': 'MB', 'higher_is_better': False, 'loads': loads}
+
+
+#cold: the first reset of a fresh interpreter (first CSV parse or cache load), whatever ran before in this process
+def bench_eno_reset(results, quick):
+    from dsnv2_class import ENO
+    code = ('import time; from dsnv2_class import ENO; t = time.perf_counter(); '
+            'ENO("tokyo", 2010).reset(); print(time.perf_counter() - t)')
+    out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True)
+    results['eno_reset_cold'] = {'value': float(out.stdout.split()[-1]), 'unit': 's', 'higher_is_better': False}
+    results['eno_reset_warm'] = {'value': best_time(lambda: ENO('tokyo', 2010).reset(), 3 if quick else 10),
+                                 'unit': 's', 'higher_is_better': False}
+
+
+def bench_env_steps(results, quick):
+    from dsnv2_class import ENO, CAPM
+    import eno_class_mother
+    days = 30 if quick else 365
+
+    n = days * 24 - 1 #steps after the reset (the first hour)
+    eno = ENO('tokyo', 2010)
+    eno.reset()
+    def run_eno():
+        eno.day, eno.hr = 0, 0 #rewind without reloading the data
+        for _ in range(n):
+            eno.step()
+    results['eno_step'] = {'value': n / best_time(run_eno, 3), 'unit': 'steps/s', 'higher_is_better': True}
+
+    #reset() (forecasts, and for DAPM the CSV parse) is the setup of every repeat: only the steps are timed
+    capm = CAPM('tokyo', 2010)
+    def run_capm():
+        for _ in range(n):
+            capm.step(3)
+    results['capm_step'] = {'value': n / best_time(run_capm, 3, capm.reset), 'unit': 'steps/s', 'higher_is_better': True}
+
+    with in_data_dir():
+        dapm = eno_class_mother.DAPM('tokyo', 2010)
+        def run_dapm():
+            for _ in range(n):
+                dapm.step(3)
+        results['dapm_step'] = {'value': n / best_time(run_dapm, 3, dapm.reset), 'unit': 'steps/s', 'higher_is_better': True}
+
+    c_states = np.random.rand(1000, 4)
+    t = best_time(lambda: [dapm.discretize(c) for c in c_states], 3)
+    results['dapm_discretize'] = {'value': len(c_states) / t, 'unit': 'calls/s', 'higher_is_better': True}
+
+
+def bench_learn(results, quick):
+    from learner_class import DQN
+    n = 50 if quick else 300
+    for batch_size in BATCH_SIZES:
+        seed_all()
+        dqn = DQN(batch_size=batch_size)
+        dqn.memory[:] = np.random.rand(*dqn.memory.shape)
+        dqn.memory[:, dqn.N_STATES] = np.random.randint(0, dqn.N_ACTIONS, dqn.MEMORY_CAPACITY)
+        t = best_time(lambda: [dqn.learn() for _ in range(n)], 3)
+        results['learn_batch_%d' % batch_size] = {'value': n / t, 'unit': 'updates/s', 'higher_is_better': True}
+
+
+def bench_rollout(results, quick):
+    from dsnv2_class import CAPM
+    from learner_class import DQN
+    seed_all()
+    dqn = DQN()
+    capm = CAPM('tokyo', 2010)
+
+    def rollout():
+        s, r, day_end, year_end = capm.reset()
+        while not year_end:
+            s, r, day_end, year_end = capm.step(dqn.choose_greedy_action(s))
+    results['greedy_rollout_year'] = {'value': best_time(rollout, 1 if quick else 3), 'unit': 's',
+                                      'higher_is_better': False}
+
+
+def bench_train_iteration(results, quick):
+    from dsnv2_class import CAPM
+    from learner_class import DQN
+    from train import run_iteration
+    seed_all()
+    dqn = DQN()
+    #start with a full memory so that every step also learns, as in the later iterations of a training run
+    dqn.memory_counter = dqn.MEMORY_CAPACITY + 1
+    t = time.perf_counter()
+    run_iteration(dqn, CAPM('tokyo', 2010, shuffle=True, trainmode=True))
+    results['train_iteration'] = {'value': time.perf_counter() - t, 'unit': 's', 'higher_is_better': False}
+
+
+BENCHMARKS = [bench_startup, bench_eno_reset, bench_env_steps, bench_learn, bench_rollout, bench_train_iteration]
+
+
+def run(out, quick=False, only=None):
+    seed_all()
+    results = {}
+    for bench in BENCHMARKS:
+        if only and bench.__name__ not in only:
+            continue
+        bench(results, quick)
+    with open(out, 'w') as f:
+        json.dump({'meta': {'python': platform.python_version(), 'numpy': np.__version__,
+                            'machine': platform.machine(), 'quick': quick, 'time': time.time()},
+                   'results': results}, f, indent=1)
+    return results
+
+
+#function to compare two result files. Returns the names of the benchmarks that got slower than threshold
+def compare(baseline, new, threshold=0.1):
+    with open(baseline) as f:
+        base = json.load(f)['results']
+    with open(new) as f:
+        results = json.load(f)['results']
+
+    slower = []
+    for name in sorted(results):
+        if name not in base:
+            print('%-24s %12.4g %-10s (new)' % (name, results[name]['value'], results[name]['unit']))
+            continue
+        b, v = base[name]['value'], results[name]['value']
+        #ratio > 1 means slower than the baseline
+        ratio = b / v if results[name]['higher_is_better'] else v / b
+        flag = 'SLOWER' if ratio > 1 + threshold else ''
+        if flag:
+            slower.append(name)
+        print('%-24s %12.4g -> %12.4g %-10s %+7.1f%% %s' % (name, b, v, results[name]['unit'], (ratio - 1) * 100, flag))
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('run')
+    p.add_argument('--out', default='bench_results.json')
+    p.add_argument('--quick', action='store_true')
+    p.add_argument('--only', nargs='*', help='names of the bench_* functions to run')
+    p = sub.add_parser('compare')
+    p.add_argument('baseline')
+    p.add_argument('new')
+    p.add_argument('--threshold', type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        for name, r in run(args.out, args.quick, args.only).items():
+            print('%-24s %12.4g %-10s %s' % (name, r['value'], r['unit'], ' '.join(r.get('loads', []))))
+    else:
+        sys.exit(1 if compare(args.baseline, args.new, args.threshold) else 0)
@@ -0,0 +1,223 @@
+# coding: utf-8
+
+#Class declaration for CHECKPOINTER class (resumable training runs)
+
+#INPUT : DQN being trained (attach())
+#        Training loop state at the end of an iteration (iteration, best reward, reward record)
+
+#OUTPUTS: <run_dir>/state_<iteration>.pt with the eval/target Nets, optimizer state, counters, EPSILON, LR,
+#         training loop state and the random states of python, numpy, torch, the DQN and the DAYSAMPLER
+#         <run_dir>/replay/chunk_<n>.npz with the replay memory writes made since the previous checkpoint
+
+#METHODS: To write a checkpoint without blocking the training loop (save(), submit())
+#         To restore the DQN and the training loop state of the latest checkpoint (restore())
+
+#Only the small state is copied in the training thread, the files are written by a background thread.
+#The replay memory is never rewritten: every store_transition()/store_day_transition() call is logged and
+#each checkpoint appends the new calls as one chunk. restore() replays the chunks to rebuild the memory.
+
+import copy
+import glob
+import os
+import queue
+import random
+import threading
+
+import numpy as np
+
+
+BASE, INSERT, SET = 0, 1, 2 #replay memory operations: whole memory, store_day_transition(), store_transition()
+
+
+#function to rebuild the replay memory from the logged (operation, index, rows) in order.
+#np.insert of every day is O(memory) so the memory is kept as a list of blocks of g rows until the end
+def rebuild_memory(ops):
+    if not ops:
+        return None
+    g = int(np.gcd.reduce([len(rows) for _, _, rows in ops] + [index for _, index, _ in ops] +
+                          [1 for kind, _, _ in ops if kind == SET]))
+    blocks = []
+    for kind, index, rows in ops:
+        if kind == BASE:
+            blocks = list(rows.reshape(-1, g, rows.shape[1]))
+        elif kind == INSERT:
+            p = index // g
+            blocks[p:p] = list(rows.reshape(-1, g, rows.shape[1]))
+        else:
+            p, o = divmod(index, g)
+            blocks[p] = blocks[p].copy()
+            blocks[p][o] = rows[0]
+    return np.concatenate(blocks)
+
+
+#function to get the no. of rows in the replay memory of dqn (0 for an offline DQN, which stores nothing)
+def get_memory_rows(dqn):
+    if dqn.replay is not None:
+        return dqn.replay.size
+    return 0 if dqn.memory is None else dqn.memory.shape[0]
+
+
+class CHECKPOINTER(object):
+
+    def __init__(self, run_dir, every=1, keep=2):
+        self.run_dir = run_dir
+        self.every = every #checkpoint every `every` iterations
+        self.keep = keep   #no. of state files kept (the replay chunks are all kept)
+        os.makedirs(os.path.join(run_dir, 'replay'), exist_ok=True)
+
+        self.pending = [] #replay memory operations not yet written
+        self.no_of_chunks = len(glob.glob(os.path.join(run_dir, 'replay', 'chunk_*.npz')))
+        self.queue = queue.Queue()
+        self.error = None
+        self.writer = threading.Thread(target=self.write_loop, daemon=True)
+        self.writer.start()
+
+    #background thread: runs the submitted writes in order
+    def write_loop(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                fn, args = job
+                fn(*args)
+            except Exception as e: #raised again in the training thread by the next submit() or close()
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    #function to run fn(*args) in the writer thread. The arguments must not be modified afterwards
+    def submit(self, fn, *args):
+        if self.error is not None:
+            raise self.error
+        self.queue.put((fn, args))
+        return 0
+
+    #function to log the replay memory writes of dqn from now on
+    def attach(self, dqn):
+        store_transition, store_day_transition = dqn.store_transition, dqn.store_day_transition
+
+        def log_transition(s, a, r, s_):
+            index = dqn.memory_counter % dqn.MEMORY_CAPACITY
+            self.pending.append((SET, index, np.hstack((s, [a, r], s_))[None]))
+            return store_transition(s, a, r, s_)
+
+        def log_day_transition(transition_rec):
+            index = dqn.memory_counter % dqn.MEMORY_CAPACITY
+            self.pending.append((INSERT, index, np.array(transition_rec)))
+            return store_day_transition(transition_rec)
+
+        dqn.store_transition = log_transition
+        dqn.store_day_transition = log_day_transition
+        if not self.states(): #new run: chunks left by a run without a state file are not replayed
+            self.drop_chunks(0)
+        if self.no_of_chunks == 0 and dqn.replay is None and dqn.memory is not None: #new run: the memory the DQN starts with
+            self.pending.append((BASE, 0, dqn.memory.copy()))
+        return dqn
+
+    #function to checkpoint the DQN and the training loop state (a dict) at the end of an iteration
+    def save(self, iteration, dqn, train_state, sampler=None):
+        import torch
+        if (iteration + 1) % self.every != 0:
+            return 0
+
+        state = {'iteration': iteration,
+                 'train_state': copy.deepcopy(train_state),
+                 'eval_net': {k: v.clone() for k, v in dqn.eval_net.state_dict().items()},
+                 'target_net': {k: v.clone() for k, v in dqn.target_net.state_dict().items()},
+                 'optimizer': copy.deepcopy(dqn.optimizer.state_dict()),
+                 'learn_step_counter': dqn.learn_step_counter,
+                 'memory_counter': dqn.memory_counter,
+                 'memory_rows': get_memory_rows(dqn),
+                 'EPSILON': dqn.EPSILON,
+                 'LR': dqn.LR,
+                 'random': random.getstate(),
+                 'np_random': np.random.get_state(),
+                 'torch_random': torch.get_rng_state(),
+                 'dqn_random': None if dqn.rng is np.random else dqn.rng.get_state(),
+                 'sampler_random': None if sampler is None else copy.deepcopy(sampler.rng.bit_generator.state)}
+
+        ops, self.pending = self.pending, []
+        if ops:
+            self.no_of_chunks += 1
+        state['no_of_chunks'] = self.no_of_chunks
+        self.submit(self.write, iteration, state, ops)
+        return 0
+
+    def write(self, iteration, state, ops):
+        import torch
+        if ops:
+            chunk = os.path.join(self.run_dir, 'replay', 'chunk_%06d.npz' % (state['no_of_chunks'] - 1))
+            with open(chunk + '.tmp', 'wb') as f:
+                np.savez(f, kind=np.array([op[0] for op in ops]), index=np.array([op[1] for op in ops]),
+                         length=np.array([len(op[2]) for op in ops]), rows=np.concatenate([op[2] for op in ops]))
+            os.replace(chunk + '.tmp', chunk)
+
+        file = os.path.join(self.run_dir, 'state_%06d.pt' % iteration)
+        torch.save(state, file + '.tmp')
+        os.replace(file + '.tmp', file)
+        for old in self.states()[:-self.keep]:
+            os.remove(old)
+        return 0
+
+    def states(self):
+        return sorted(glob.glob(os.path.join(self.run_dir, 'state_*.pt')))
+
+    #function to remove the replay chunks from chunk n on (written after the last state file)
+    def drop_chunks(self, n):
+        for file in sorted(glob.glob(os.path.join(self.run_dir, 'replay', 'chunk_*.npz'))):
+            if int(os.path.basename(file)[6:-4]) >= n:
+                os.remove(file)
+        self.no_of_chunks = n
+        return 0
+
+    #function to restore dqn (and the sampler) from the latest checkpoint. Returns (next iteration, train_state)
+    #or (0, None) if there is no checkpoint yet. Must be called before attach()
+    def restore(self, dqn, sampler=None):
+        import torch
+        states = self.states()
+        if not states: #chunks of a run that died before its first state file are not part of any checkpoint
+            self.drop_chunks(0)
+            return 0, None
+        state = torch.load(states[-1], weights_only=False)
+
+        dqn.eval_net.load_state_dict(state['eval_net'])
+        dqn.target_net.load_state_dict(state['target_net'])
+        dqn.optimizer.load_state_dict(state['optimizer'])
+        dqn.learn_step_counter = state['learn_step_counter']
+        dqn.memory_counter = state['memory_counter']
+        dqn.EPSILON = state['EPSILON']
+        dqn.LR = state['LR']
+
+        ops = []
+        for n in range(state['no_of_chunks']):
+            with np.load(os.path.join(self.run_dir, 'replay', 'chunk_%06d.npz' % n)) as chunk:
+                rows = np.split(chunk['rows'], np.cumsum(chunk['length'])[:-1])
+                ops.extend(zip(chunk['kind'], chunk['index'], rows))
+        if dqn.replay is None and dqn.offline is None:
+            dqn.memory = rebuild_memory(ops)
+        elif dqn.replay is not None: #compact replay: push the logged transitions again
+            dqn.replay.clear()
+            for kind, index, rows in ops:
+                dqn.replay.push(rows)
+        if get_memory_rows(dqn) != state['memory_rows']:
+            raise ValueError('replay chunks do not match ' + states[-1])
+        #chunks written after the restored state are dropped
+        self.drop_chunks(state['no_of_chunks'])
+
+        random.setstate(state['random'])
+        np.random.set_state(state['np_random'])
+        torch.set_rng_state(state['torch_random'])
+        if state['dqn_random'] is not None:
+            dqn.rng.set_state(state['dqn_random'])
+        if sampler is not None and state['sampler_random'] is not None:
+            sampler.rng.bit_generator.state = state['sampler_random']
+        return state['iteration'] + 1, state['train_state']
+
+    #function to wait until everything submitted is written
+    def close(self):
+        self.queue.put(None)
+        self.writer.join()
+        if self.error is not None:
+            raise self.error
+        return 0
@@ -0,0 +1,121 @@
+# coding: utf-8
+
+#Precomputed per station climatology tables (forecast source for ENO)
+
+#INPUT : Preprocessed GSR of all the years of every station (preprocess.load_radiation)
+
+#OUTPUTS: <data_dir>/cache/climatology/ with one .npy file per table (memory mapped when loaded):
+#         mean.npy       (stations, 366, 24)     mean GSR of every day of year and hour
+#         quantiles.npy  (stations, Q, 366, 24)  QUANTILES of the GSR of every day of year and hour
+#         daytype.npy    (stations, 366)         daytype of the mean total radiation of every day of year
+#         transition.npy (stations, 6, 6)        probability of the daytype of tomorrow given the daytype of today
+#         stations.txt   order of the stations in the tables
+
+#USAGE: python climatology.py [--fill linear]
+
+#Every day of year uses the days within +-WINDOW days of all the years, so that 20 years are enough for
+#stable quantiles. ENO(forecast='climatology') then gets the forecast of any day with one table lookup.
+
+import argparse
+import os
+
+import numpy as np
+
+from preprocess import cache_file, load_radiation, source_mtime
+from solar_data import LOCATIONS, NO_OF_DAYTYPE, get_years, get_day_states
+
+
+QUANTILES = [0.1, 0.25, 0.5, 0.75, 0.9]
+WINDOW = 7
+
+_tables = {} #data_dir -> loaded tables
+
+
+def table_dir(data_dir='./data/'):
+    return os.path.join(data_dir, 'cache', 'climatology')
+
+
+def build(data_dir='./data/', fill='linear', locations=LOCATIONS, window=WINDOW, quantiles=QUANTILES):
+    S = len(locations)
+    mean = np.zeros((S, 366, 24), dtype=np.float32)
+    qtable = np.zeros((S, len(quantiles), 366, 24), dtype=np.float32)
+    transition = np.zeros((S, NO_OF_DAYTYPE, NO_OF_DAYTYPE), dtype=np.float32)
+
+    for s, location in enumerate(locations):
+        years = get_years(location, data_dir)
+        aligned = np.full((len(years), 366, 24), np.nan) #day of year aligned (Dec 31 of leap years is day 365)
+        for i, year in enumerate(years):
+            sradiation, quality = load_radiation(location, year, fill, data_dir)
+            aligned[i, :len(sradiation)] = sradiation
+            aligned[i, :len(sradiation)][quality < 0.5] = np.nan #mostly missing days are left out
+            daytype = get_day_states(np.sum(sradiation, axis=1))
+            np.add.at(transition[s], (daytype[:-1], daytype[1:]), 1)
+
+        #samples of day of year d: days d-window to d+window of all the years (wrapping around the year)
+        doy = (np.arange(366)[:, None] + np.arange(-window, window + 1)[None, :]) % 366
+        samples = aligned[:, doy].transpose(1, 0, 2, 3).reshape(366, -1, 24) #(366, years*(2*window+1), 24)
+        mean[s] = np.nanmean(samples, axis=1)
+        qtable[s] = np.nanquantile(samples, quantiles, axis=1)
+
+    total = transition.sum(axis=2, keepdims=True)
+    transition = np.where(total > 0, transition / np.maximum(total, 1), 1.0 / NO_OF_DAYTYPE)
+    daytype = get_day_states(mean.sum(axis=2))
+
+    out = table_dir(data_dir)
+    os.makedirs(out, exist_ok=True)
+    for name, table in [('mean', mean), ('quantiles', qtable), ('daytype', daytype), ('transition', transition)]:
+        np.save(os.path.join(out, name + '.tmp.npy'), table)
+        os.replace(os.path.join(out, name + '.tmp.npy'), os.path.join(out, name + '.npy'))
+    with open(os.path.join(out, 'stations.txt'), 'w') as f:
+        f.write('\n'.join(locations))
+    _tables.pop(data_dir, None)
+    return out
+
+
+#function to get the time of the last change of the data the tables are built from: the CSV files and
+#the preprocess cache of the fill
+def sources_mtime(data_dir='./data/', fill='linear'):
+    file = cache_file(fill, data_dir)
+    return max(source_mtime(data_dir), os.path.getmtime(file) if os.path.exists(file) else 0)
+
+
+#function to get the tables as read-only memory mapped arrays. They are built on first use and rebuilt
+#when the CSV files or the preprocess cache are newer than them (stations.txt is written last)
+def load(data_dir='./data/'):
+    if data_dir not in _tables:
+        out = table_dir(data_dir)
+        stations = os.path.join(out, 'stations.txt')
+        if not os.path.exists(stations) or os.path.getmtime(stations) < sources_mtime(data_dir):
+            build(data_dir)
+        tables = {name: np.load(os.path.join(out, name + '.npy'), mmap_mode='r')
+                  for name in ('mean', 'quantiles', 'daytype', 'transition')}
+        with open(os.path.join(out, 'stations.txt')) as f:
+            tables['stations'] = f.read().split('\n')
+        _tables[data_dir] = tables
+    return _tables[data_dir]
+
+
+#function to get the forecast daytype of the given days. station and doy are arrays (or scalars) of the
+#station index (in tables['stations']) and day of year of each day. previous is the daytype of the day before
+#each day (needed by 'persistence' and 'markov')
+def forecast(kind, station=None, doy=None, previous=None, data_dir='./data/'):
+    if kind == 'climatology': #daytype of the mean day of that day of year
+        return load(data_dir)['daytype'][station, np.minimum(doy, 365)]
+    if kind == 'persistence': #same daytype as the day before
+        return np.asarray(previous)
+    if kind == 'markov': #most likely daytype after the daytype of the day before
+        return np.argmax(load(data_dir)['transition'][station, previous], axis=-1)
+    raise ValueError('unknown forecast: ' + str(kind))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fill', default='linear')
+    parser.add_argument('--data-dir', default='./data/')
+    args = parser.parse_args()
+
+    print('written', build(args.data_dir, args.fill))
+    tables = load(args.data_dir)
+    for s, location in enumerate(tables['stations']):
+        print(location, 'daytypes of the mean days', np.bincount(tables['daytype'][s], minlength=NO_OF_DAYTYPE),
+              'persistence', np.round(np.diag(tables['transition'][s]), 2))
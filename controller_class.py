@@ -0,0 +1,142 @@
+# coding: utf-8
+
+#Class declaration for CONTROLLER class (online EPSILON/LR scheduling and convergence detection)
+
+#INPUT : Average reward of every training iteration (or the validation scores of a VALIDATOR)
+
+#OUTPUTS: Smoothed reward (exponential moving average) after every update
+#         EPSILON and LR of the DQN set by the schedule
+#         Iteration at which the smoothed reward stopped improving, no. of iterations and CPU time saved
+
+#METHODS: To feed a score and apply the schedule (update()), used by train(..., controller=CONTROLLER())
+#         To get the iterations and CPU time saved by stopping early (summary())
+#         To get and set the state kept between updates, checkpointed by train() (state_dict(), load_state_dict())
+
+#Training has converged when the best smoothed reward of the last `window` updates improves on the best one
+#before them by less than `threshold`. Then training stops (stop=True) and/or the model is saved to CFILENAME.
+#Schedules: 'none'; 'counter', the up/down counter scheduling of the dsnv2 notebooks (three consecutive
+#better smoothed rewards: EPSILON += 0.1 and LR halved, three consecutive worse ones: EPSILON -= 0.1);
+#or any function schedule(controller, dqn) called after every update.
+
+import copy
+import time
+
+import numpy as np
+
+
+STATE = ['iterations', 'scores', 'smoothed', 'best', 'up_counter', 'down_counter', 'converged_at', 'cpu'] #state kept between updates
+
+
+class CONTROLLER(object):
+
+    def __init__(self, window=10, threshold=0.01, alpha=0.2, min_updates=20, schedule='none', stop=True, CFILENAME=None,
+                 validation=False, counter=3, EPSILON_MIN=0.5, EPSILON_MAX=0.99, LR_MIN=1e-4, LR_MAX=0.05):
+        self.window = window
+        self.threshold = threshold
+        self.alpha = alpha               #weight of the newest score in the moving average
+        self.min_updates = min_updates   #no convergence before this no. of updates
+        self.schedule = schedule
+        self.stop = stop
+        self.CFILENAME = CFILENAME
+        self.validation = validation     #feed the validation scores of the VALIDATOR instead of the average rewards
+        self.counter = counter
+        self.EPSILON_MIN, self.EPSILON_MAX = EPSILON_MIN, EPSILON_MAX
+        self.LR_MIN, self.LR_MAX = LR_MIN, LR_MAX
+
+        self.iterations = [] #iteration of every update
+        self.scores = []
+        self.smoothed = []
+        self.best = None #reference reward of the 'counter' schedule
+        self.up_counter = 0
+        self.down_counter = 0
+        self.converged_at = None #iteration at which training converged
+        self.cpu = [] #CPU time of every training iteration
+        self.tcpu = time.process_time()
+
+    #function to get and set the state kept between updates (saved with the train state of a CHECKPOINTER)
+    def state_dict(self):
+        return copy.deepcopy({k: getattr(self, k) for k in STATE})
+
+    def load_state_dict(self, state):
+        for k in STATE:
+            setattr(self, k, copy.deepcopy(state[k]))
+        return 0
+
+    #function to be called when training starts and at the end of every training iteration (CPU time accounting)
+    def start(self):
+        self.tcpu = time.process_time()
+        return 0
+
+    def tick(self):
+        t = time.process_time()
+        self.cpu.append(t - self.tcpu)
+        self.tcpu = t
+        return 0
+
+    @property
+    def stopped(self):
+        return self.stop and self.converged_at is not None
+
+    def converged(self):
+        if len(self.smoothed) < max(self.min_updates, self.window + 1):
+            return False
+        return max(self.smoothed[-self.window:]) - max(self.smoothed[:-self.window]) < self.threshold
+
+    #function to set the learning rate of the DQN and of its optimizer
+    def set_lr(self, dqn, lr):
+        dqn.LR = float(np.clip(lr, self.LR_MIN, self.LR_MAX))
+        for group in dqn.optimizer.param_groups:
+            group['lr'] = dqn.LR
+        return 0
+
+    def set_epsilon(self, dqn, epsilon):
+        dqn.EPSILON = float(np.clip(epsilon, self.EPSILON_MIN, self.EPSILON_MAX))
+        return 0
+
+    def counter_schedule(self, dqn):
+        score = self.smoothed[-1]
+        if self.best is None:
+            self.best = score
+        self.up_counter = self.up_counter + 1 if score > self.best else 0
+        self.down_counter = self.down_counter + 1 if score < self.best else 0
+        if self.up_counter >= self.counter: #better: exploit more and learn slower
+            self.up_counter = 0
+            self.best = score
+            self.set_epsilon(dqn, dqn.EPSILON + 0.1)
+            self.set_lr(dqn, dqn.LR / 2)
+        if self.down_counter >= self.counter: #worse: explore more
+            self.down_counter = 0
+            self.best = score
+            self.set_epsilon(dqn, dqn.EPSILON - 0.1)
+        return 0
+
+    #function to feed the score of an iteration. Returns True when training should stop
+    def update(self, iteration, score, dqn):
+        self.iterations.append(iteration)
+        self.scores.append(float(score))
+        previous = self.smoothed[-1] if self.smoothed else score
+        self.smoothed.append(float(self.alpha * score + (1 - self.alpha) * previous))
+
+        if self.schedule == 'counter':
+            self.counter_schedule(dqn)
+        elif callable(self.schedule):
+            self.schedule(self, dqn)
+        elif self.schedule != 'none':
+            raise ValueError('unknown schedule: ' + str(self.schedule))
+
+        if self.converged_at is None and self.converged():
+            self.converged_at = iteration
+            if self.CFILENAME is not None:
+                import torch
+                torch.save(dqn.eval_net.state_dict(), self.CFILENAME)
+        return self.stopped
+
+    #function to get the no. of iterations run and saved out of NO_OF_ITERATIONS and the CPU time saved
+    #(estimated with the mean CPU time of the iterations run)
+    def summary(self, NO_OF_ITERATIONS):
+        run = len(self.cpu)
+        cpu_per_iteration = float(np.mean(self.cpu)) if self.cpu else 0.0
+        return {'converged_at': self.converged_at, 'iterations_run': run,
+                'iterations_saved': NO_OF_ITERATIONS - run, 'cpu_per_iteration': cpu_per_iteration,
+                'cpu_saved': (NO_OF_ITERATIONS - run) * cpu_per_iteration,
+                'best_smoothed': max(self.smoothed) if self.smoothed else None}
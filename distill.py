@@ -0,0 +1,172 @@
+# coding: utf-8
+
+#Policy distillation of a trained Net (teacher) into smaller Nets (students)
+
+#INPUT : File of the teacher Net state_dict (3 state [batt, enp, henergy] Nets)
+#        Hidden layer sizes of the students
+
+#OUTPUTS: <out>_h<hidden>.pt: state_dict of every student (n_layers=1, only fc1 and out)
+#         For the teacher and every student: no. of parameters, latency at batch size 1 and throughput at
+#         batch size 4096 of the frozen model (export.py), action agreement with the teacher on held-out
+#         station-years and the average greedy year reward over all the bundled station-years
+
+#USAGE: python distill.py best_dsnv2_uniform_daytype83AU9D6T_BEST.pt --hidden 4 8 16 32 --out distilled
+
+#The dataset is the states visited by rolling out the teacher on every training station-year with a FLEET,
+#once greedily and once per exploration rate in EXPLORE (random actions, so that the students also see
+#states just off the teacher's trajectories), labelled with the teacher's Q values.
+#The students are fitted to the softmax of the teacher Q values at temperature TAU (KL divergence), or to the
+#Q values themselves (loss='mse'), in large batches. The Q values are standardized first (the dsnv2 Nets have
+#Q values of the order of 1e5), which changes neither the greedy actions nor their order.
+
+import argparse
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+
+from export import export_net, measure
+from fleet_class import FLEET, net_policy
+from learner_class import Net, load_net
+from solar_data import LOCATIONS, get_years, get_radiation
+from validator_class import VALIDATION_YEARS
+
+
+EXPLORE = [0.1, 0.3] #rates of random actions of the exploring rollouts (besides the greedy one)
+TAU = 0.01           #softmax temperature of the teacher Q values
+BATCH_SIZE = 4096
+EPOCHS = 10
+LR = 0.01
+
+
+#function to simulate station-years with a FLEET, grouped by no. of days (leap years apart).
+#run(fleet, envs) is called for every group with the indices of its station-years
+def run_groups(station_years, run, copies=1, data_dir='./data/'):
+    sradiation = [get_radiation(l, y, data_dir) for l, y in station_years]
+    for no_of_days in sorted(set(s.shape[0] for s in sradiation)):
+        envs = [e for e in range(len(sradiation)) if sradiation[e].shape[0] == no_of_days]
+        srad = np.stack([sradiation[e] for e in envs])
+        run(FLEET(station=np.tile(np.arange(len(envs)), copies), sradiation=srad), envs)
+    return 0
+
+
+#function to get the states visited by the teacher and its Q values. Every station-year is rolled out
+#greedily and with every exploration rate of explore. Returns states (n, N_STATES) and Q values (n, N_ACTIONS)
+def collect(teacher, station_years, explore=EXPLORE, seed=0, data_dir='./data/'):
+    rng = np.random.default_rng(seed)
+    rates = np.array([0.0] + list(explore))
+    states, qvalues = [], []
+
+    def run(fleet, envs):
+        epsilon = np.repeat(rates, len(envs)) #exploration rate of every node
+
+        def policy(state):
+            with torch.no_grad():
+                q = teacher(torch.from_numpy(np.ascontiguousarray(state, dtype=np.float32)))
+            states.append(state.copy())
+            qvalues.append(q.numpy())
+            action = q.argmax(1).numpy()
+            explore = rng.random(len(action)) < epsilon
+            action[explore] = rng.integers(0, q.shape[1], np.sum(explore))
+            return action
+
+        fleet.run(policy)
+
+    run_groups(station_years, run, len(rates), data_dir)
+    return np.concatenate(states), np.concatenate(qvalues)
+
+
+#function to train a student Net on the states and teacher Q values. Returns the student
+def train_student(states, qvalues, hidden_layer, loss='kl', tau=TAU, epochs=EPOCHS, batch_size=BATCH_SIZE, lr=LR, seed=0):
+    torch.manual_seed(seed)
+    student = Net(states.shape[1], hidden_layer, qvalues.shape[1], n_layers=1)
+    optimizer = torch.optim.Adam(student.parameters(), lr=lr)
+    x_all = torch.from_numpy(states)
+    q_all = torch.from_numpy((qvalues - qvalues.mean()) / qvalues.std())
+    target_all = F.softmax(q_all / tau, dim=1)
+
+    student.train()
+    for epoch in range(epochs):
+        for batch in torch.randperm(len(x_all)).split(batch_size):
+            out = student(x_all[batch])
+            if loss == 'kl':
+                l = F.kl_div(F.log_softmax(out / tau, dim=1), target_all[batch], reduction='batchmean')
+            elif loss == 'mse':
+                l = F.mse_loss(out, q_all[batch])
+            else:
+                raise ValueError('unknown loss: ' + str(loss))
+            optimizer.zero_grad()
+            l.backward()
+            optimizer.step()
+    student.eval()
+    return student
+
+
+#function to get the fraction of the greedy actions of net equal to those of the teacher on the states
+#visited by the teacher in greedy years of the station-years
+def agreement(teacher, net, station_years, data_dir='./data/'):
+    counts = np.zeros(2)
+
+    def run(fleet, envs):
+        def policy(state):
+            with torch.no_grad():
+                x = torch.from_numpy(np.ascontiguousarray(state, dtype=np.float32))
+                action = teacher(x).argmax(1).numpy()
+                counts[0] += np.sum(net(x).argmax(1).numpy() == action)
+                counts[1] += len(action)
+            return action
+
+        fleet.run(policy)
+
+    run_groups(station_years, run, data_dir=data_dir)
+    return counts[0] / counts[1]
+
+
+#function to get the average greedy year reward of net over the station-years
+def year_reward(net, station_years, data_dir='./data/'):
+    rewards = []
+    run_groups(station_years, lambda fleet, envs: rewards.extend(fleet.run(net_policy(net))['reward']), data_dir=data_dir)
+    return float(np.mean(rewards))
+
+
+#function to get the report row of one Net
+def report(name, net, teacher, station_years, heldout, data_dir='./data/'):
+    cost = measure(export_net(net), net.fc1.in_features)
+    return {'name': name, 'hidden': net.fc1.out_features,
+            'parameters': sum(p.numel() for n, p in net.named_parameters() if n.split('.')[0] in ('fc1', 'out')),
+            'latency_us': cost[1] * 1e6, 'rows_per_s': cost[4096],
+            'agreement': agreement(teacher, net, heldout, data_dir),
+            'reward': year_reward(net, station_years, data_dir)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('teacher')
+    parser.add_argument('--hidden', type=int, nargs='+', default=[4, 8, 16, 32])
+    parser.add_argument('--out', default='distilled')
+    parser.add_argument('--loss', default='kl', choices=['kl', 'mse'])
+    parser.add_argument('--tau', type=float, default=TAU)
+    parser.add_argument('--epochs', type=int, default=EPOCHS)
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    teacher = load_net(args.teacher)
+    station_years = [(l, y) for l in LOCATIONS for y in get_years(l)]
+    heldout = [sy for sy in VALIDATION_YEARS if sy in station_years]
+    train_years = [sy for sy in station_years if sy not in heldout]
+
+    states, qvalues = collect(teacher, train_years)
+    print('dataset', states.shape[0], 'states from', len(train_years), 'station-years')
+
+    rows = [report('teacher', teacher, teacher, station_years, heldout)]
+    for hidden_layer in args.hidden:
+        student = train_student(states, qvalues, hidden_layer, args.loss, args.tau, args.epochs)
+        file = '%s_h%d.pt' % (args.out, hidden_layer)
+        torch.save(student.state_dict(), file)
+        rows.append(report(file, student, teacher, station_years, heldout))
+
+    print('%-24s %6s %10s %14s %14s %10s %8s' % ('model', 'hidden', 'parameters', 'batch 1 us/call',
+                                                 'batch 4096 rows/s', 'agreement', 'reward'))
+    for r in rows:
+        print('%-24s %6d %10d %14.1f %14.0f %10.4f %8.3f' % (r['name'], r['hidden'], r['parameters'],
+                                                           r['latency_us'], r['rows_per_s'], r['agreement'], r['reward']))
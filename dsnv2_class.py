@@ -0,0 +1,425 @@
+# coding: utf-8
+
+#Class declarations for the dsnv2 ENO and CAPM classes
+
+#INPUT : CSV file designated by location and year (or a synthetic year from a SYNTH generator)
+
+#OUTPUTS: Harvested Energy (henergy)
+#         Forecast (fcast)
+#         Time (year, day, hr)
+#         Place (location)
+#         Flags (end_of_day, end_of_year)
+
+#METHODS: To shuffle days randomly (shuffle)
+#         To use gap filled data and skip or down-weight days with missing hours (fill, min_quality, weight_quality)
+#         To forecast from the precomputed station climatology instead of the actual day (forecast)
+#         To balance the daytypes seen when training (day_balance)
+#         To draw balanced days from all the stations and years at once (day_balance with a DAYSAMPLER)
+#         CAPM: To observe the last k hours instead of the present hour only (history)
+
+import random
+import numpy as np
+
+from solar_data import get_radiation
+from preprocess import load_radiation
+import climatology
+from history_class import HISTORY
+
+
+class ENO(object):
+    
+    #no. of forecast types is 6 ranging from 0 to 5
+  
+    def __init__(self, location='tokyo', year=2010, shuffle=False, day_balance=False, source=None, sampler=None, profiler=None,
+                 fill=None, min_quality=0.0, weight_quality=False, forecast='perfect'):
+        self.location = location
+        self.year = year
+        self.day = None
+        self.hr = None
+        
+        self.shuffle = shuffle
+        self.day_balance = day_balance
+        self.source = source #SYNTH generator used in place of the CSV files (None -> read CSV)
+        self.sampler = sampler #DAYSAMPLER drawing balanced days from the whole dataset when day_balance is set
+        self.schedule = None #flat dataset indices of the days drawn by the sampler for this episode
+        self.fill = fill #gap filling of the preprocessed data ('zero', 'linear', 'climatology'; None -> read CSV)
+        self.min_quality = min_quality #days with a smaller fraction of measured daylight hours are skipped
+        self.weight_quality = weight_quality #with day_balance, days are drawn in proportion to their quality
+        if(weight_quality and (sampler is not None or fill is None)): #the quality is only known for the preprocessed data
+            raise ValueError('weight_quality needs fill and no sampler (the sampler draws the days itself)')
+        self.quality = None #quality of each day (only with fill)
+        self.forecast = forecast #'perfect' (daytype of the day itself), 'climatology' (daytype of the mean day of
+                                 #that day of year), 'persistence' (daytype of the calendar day before), 'markov'
+                                 #(most likely daytype after the calendar day before)
+        self.doy = None #day of year of each day (not with 'perfect')
+        self.previous = None #daytype of the calendar day before each day, -1 if not known (not with 'perfect')
+        self.station = None #index of the station of each day in the climatology tables (not with 'perfect')
+        self.daytype = None #actual daytype of each day
+
+        self.TIME_STEPS = None #no. of time steps in one episode
+        self.NO_OF_DAYS = None #no. of days in one year
+        
+        self.NO_OF_DAYTYPE = 5 #no. of daytypes
+        self.daycounter = 0 #to count number of days that have been passed
+        
+        self.sradiation = None #matrix with GSR for the entire year
+        self.senergy = None #matrix with harvested energy data for the entire year
+        self.fforecast = None #matrix with forecast values for each day
+        
+
+        self.henergy = None #harvested energy variable
+        self.fcast = None #forecast variable
+        self.sorted_days = [] #days sorted according to day type
+
+        if(profiler is not None): #time the loading of the data at every reset
+            profiler.instrument(self, {'reset': 'eno_reset'})
+    
+    #function to get the solar data for the given location and year and prep it
+    def get_data(self):
+        if(self.day_balance and self.sampler is not None): #draw the days of the whole episode at once
+            self.schedule = self.sampler.draw()
+            sradiation = self.sampler.sradiation[self.schedule]
+            doy, station = self.sampler.day[self.schedule], [self.sampler.locations[i] for i in self.sampler.station[self.schedule]]
+            previous = np.where(doy > 0, self.sampler.daytype[self.schedule - 1], -1) #the sampler keeps whole station-years
+        elif(self.source is not None): #take the next synthetic year for this location from the generator
+            sradiation = self.source.next_year(self.location)
+            doy, station = np.arange(len(sradiation)), self.location
+            previous = self.get_previous(sradiation)
+        elif(self.fill is not None): #preprocessed GSR with the gaps filled, cached once per process
+            sradiation, quality = load_radiation(self.location, self.year, self.fill)
+            previous = self.get_previous(sradiation) #before the skipped days are dropped
+            keep = quality >= self.min_quality
+            sradiation, self.quality, previous = sradiation[keep], quality[keep], previous[keep]
+            doy, station = np.flatnonzero(keep), self.location
+        else: #GSR (Global Solar Radiation in MegaJoules per meters squared per hour) from the CSV file, missing data set to zero
+            sradiation = get_radiation(self.location, self.year)
+            doy, station = np.arange(len(sradiation)), self.location
+            previous = self.get_previous(sradiation)
+        if(self.forecast != 'perfect'): #day of year and station of each day for the climatology tables
+            index = {l: i for i, l in enumerate(climatology.load()['stations'])}
+            self.doy = doy
+            self.station = np.array([index[l] for l in station]) if isinstance(station, list) else np.full(len(doy), index[station])
+            self.previous = previous
+        if(self.shuffle and (self.quality is not None or self.doy is not None)): #same permutation as np.random.shuffle,
+            order = np.random.permutation(len(sradiation))                       #applied to the per day arrays too
+            sradiation = sradiation[order]
+            if(self.quality is not None):
+                self.quality = self.quality[order]
+            if(self.doy is not None):
+                self.doy, self.station, self.previous = self.doy[order], self.station[order], self.previous[order]
+        elif(self.shuffle): #if class instatiation calls for shuffling the day order. Required when learning
+            np.random.shuffle(sradiation) 
+        self.sradiation = sradiation
+        
+        
+        #GSR values (in MJ/sq.mts per hour) need to be expressed in mW
+        # Conversion is accomplished by 
+        # solar_energy = GSR(in MJ/m2/hr) * 1e6 * size of solar cell * efficiency of solar cell /(60x60) *1000 (to express in mW)
+
+        self.senergy = self.sradiation * 1e6 * (55e-3 * 70e-3) * 0.15 * 1000/(60*60) 
+
+        return 0
+    
+    #function to map total day radiation into type of day ranging from 0 to 5
+    #the classification into day types is quite arbitrary. There is no solid logic behind this type of classification.
+    
+    def get_day_state(self,tot_day_radiation):
+        if (tot_day_radiation < 3.5):
+            day_state = 0
+        elif (3.5 <= tot_day_radiation < 7):
+            day_state = 1
+        elif (7 <= tot_day_radiation < 12):
+            day_state = 2
+        elif (12 <= tot_day_radiation < 15):
+            day_state = 3
+        elif (15 <= tot_day_radiation < 17.5):
+            day_state = 4
+        else:
+            day_state = 5
+        return int(day_state)
+    
+    #function to get the daytype of the calendar day before each day of a whole year in order
+    #(-1 for the first day, whose day before is not in the data)
+    def get_previous(self, sradiation):
+        daytype = np.vectorize(self.get_day_state)(np.sum(sradiation, axis=1))
+        return np.r_[-1, daytype[:-1]]
+
+    def get_forecast(self):
+        #create a perfect forecaster.
+        tot_day_radiation = np.sum(self.sradiation, axis=1) #contains total solar radiation for each day
+        get_day_state = np.vectorize(self.get_day_state)
+        self.daytype = get_day_state(tot_day_radiation)
+        if(self.forecast == 'perfect'):
+            self.fforecast = self.daytype
+        elif(self.forecast == 'climatology'):
+            self.fforecast = climatology.forecast('climatology', self.station, self.doy)
+        else: #from the calendar day before, whatever the order of the days (the climatology when it is not known)
+            previous = np.where(self.previous >= 0, self.previous,
+                                climatology.forecast('climatology', self.station, (self.doy - 1) % 366))
+            self.fforecast = climatology.forecast(self.forecast, self.station, previous=previous)
+        
+        #sort days depending on the type of day and shuffle them; maybe required when learning
+        for fcast in range(0,6):
+            fcast_days = ([i for i,x in enumerate(self.daytype) if x == fcast])
+            np.random.shuffle(fcast_days)
+            self.sorted_days.append(fcast_days)
+        return 0
+    
+    def reset(self,day=0): #it is possible to reset to the beginning of a certain day
+        
+        self.get_data() #first get data for the given year
+        self.get_forecast() #calculate the forecast
+        
+        self.TIME_STEPS = self.senergy.shape[1]
+        self.NO_OF_DAYS = self.senergy.shape[0]
+        
+        self.day = day
+        self.hr = 0
+        
+        self.henergy = self.senergy[self.day][self.hr]
+        self.fcast = self.fforecast[self.day]
+        
+        end_of_day = False
+        end_of_year = False
+        return [self.henergy, self.fcast, end_of_day, end_of_year]
+
+    
+    def step(self):
+        end_of_day = False
+        end_of_year = False
+        if not(self.day_balance) or self.sampler is not None: #if daytype balance is not required or the days are already drawn
+            if(self.hr < self.TIME_STEPS - 1):
+                self.hr += 1
+                self.henergy = self.senergy[self.day][self.hr] 
+            else:
+                if(self.day < self.NO_OF_DAYS -1):
+                    end_of_day = True
+                    self.hr = 0
+                    self.day += 1
+                    self.henergy = self.senergy[self.day][self.hr] 
+                    self.fcast = self.fforecast[self.day]
+                else:
+                    end_of_day = True
+                    end_of_year = True
+                    
+        else: #when training, we want all daytypes to be equally represented for robust policy
+              #obviously, the days are going to be in random order
+            if(self.hr < self.TIME_STEPS - 1):
+                self.hr += 1
+                self.henergy = self.senergy[self.day][self.hr] 
+            else:
+                if(self.daycounter < self.NO_OF_DAYS -1):
+                    end_of_day = True
+                    self.daycounter += 1
+                    self.hr = 0
+                    daytype = random.choice(np.arange(0,self.NO_OF_DAYTYPE)) #choose random daytype
+                    if(self.weight_quality and self.quality is not None): #days with missing hours are drawn less often
+                        p = self.quality[self.sorted_days[daytype]]
+                        #uniform when every day of the daytype is fully missing (e.g. the zero radiation daytype)
+                        self.day = np.random.choice(self.sorted_days[daytype], p=p/np.sum(p) if np.sum(p) > 0 else None)
+                    else:
+                        self.day = np.random.choice(self.sorted_days[daytype]) #choose random day from that daytype
+                    self.henergy = self.senergy[self.day][self.hr] 
+                    self.fcast = self.fforecast[self.day]
+                else: 
+                    end_of_day = True
+                    end_of_year = True
+                    self.daycounter = 0
+        
+        return [self.henergy, self.fcast, end_of_day, end_of_year]
+
+    #function to get the no. of steps from the current hour with zero harvested energy, not counting the last
+    #hour of the day (the end of day step is always taken by step())
+    def zero_run(self):
+        hours = self.senergy[self.day][self.hr:self.TIME_STEPS-1]
+        nonzero = np.flatnonzero(hours != 0)
+        return nonzero[0] if len(nonzero) else len(hours)
+
+    #function to move forward n hours within the day, as n calls of step() that do not end the day
+    def skip(self, n):
+        self.hr += n
+        self.henergy = self.senergy[self.day][self.hr]
+        return [self.henergy, self.fcast, False, False]
+
+
+#Continuous Adaptive Power Manager using default ENO class
+class CAPM (object):
+    def __init__(self,location='tokyo', year=2010, shuffle=False, trainmode=False, source=None, sampler=None, profiler=None,
+                 fill=None, min_quality=0.0, weight_quality=False, forecast='perfect', history=1):
+
+        #all energy values i.e. BMIN, BMAX, BOPT, HMAX are in mWhr. Assuming one timestep is one hour
+        
+        self.BMIN = 0.0                #Minimum battery level that is tolerated. Maybe non-zero also
+        self.BMAX = 9250.0            #Max Battery Level. May not necessarily be equal to total batter capacity [3.6V x 2500mAh]
+        self.BOPT = 0.5 * self.BMAX    #Optimal Battery Level. Assuming 50% of battery is the optimum
+        
+        self.HMIN = 0      #Minimum energy that can be harvested by the solar panel.
+        self.HMAX = 500   #Maximum energy that can be harvested by the solar panel. [500mW]
+        
+        self.DMAX = 500      #Maximum energy that can be consumed by the node in one time step. [~ 3.6V x 135mA]
+        self.N_ACTIONS = 10  #No. of different duty cycles possible
+        self.DMIN = self.DMAX/self.N_ACTIONS #Minimum energy that can be consumed by the node in one time step. [~ 3.6V x 15mA]
+        
+        self.binit = None     #battery at the beginning of day
+        self.btrack = []      #track the mean battery level for each day
+        self.batt = None      #battery variable
+        self.enp = None       #enp at end of hr
+        self.henergy = None   #harvested energy variable
+        self.fcast = None     #forecast variable
+        
+        self.location = location
+        self.year = year
+        self.shuffle = shuffle
+        self.trainmode = trainmode
+        self.eno = ENO(self.location, self.year, shuffle=shuffle, day_balance=trainmode, source=source, sampler=sampler, profiler=profiler,
+                       fill=fill, min_quality=min_quality, weight_quality=weight_quality, forecast=forecast) #if trainmode is enable, then days are automatically balanced according to daytype i.e. day_balance= True
+        
+        self.violation_flag = False
+
+        self.no_of_day_state = 6;
+
+        #with history=k > 1 the states are the windows of the last k continuous states (a HISTORY view, newest
+        #first, k*3 values) instead of lists of 3 values
+        self.history = HISTORY(history, 3) if history > 1 else None
+
+        if(profiler is not None): #time every step of the environment (includes ENO.step)
+            profiler.instrument(self, {'step': 'capm_step'})
+ 
+    def reset(self,day=0,batt=-1):
+        henergy, fcast, day_end, year_end = self.eno.reset(day) #reset the eno environment
+        self.violation_flag = False
+        if(batt == -1):
+            self.batt = self.BOPT
+        else:
+            self.batt = batt
+            
+        self.batt = np.clip(self.batt, self.BMIN, self.BMAX)
+        self.binit = self.batt
+        self.btrack = np.append(self.btrack, self.batt) #track battery levels
+        
+        self.enp = self.binit - self.batt #enp is calculated
+        self.henergy = np.clip(henergy, self.HMIN, self.HMAX) #clip henergy within HMIN and HMAX
+        self.fcast = fcast
+        
+        norm_batt = self.batt/self.BMAX
+        norm_enp = self.enp/(self.BMAX/2)
+        norm_henergy = self.henergy/self.HMAX
+#         norm_fcast = self.fcast/(self.no_of_day_state-1)
+
+        c_state = [norm_batt, norm_enp, norm_henergy] #continuous states
+        if(self.history is not None):
+            c_state = self.history.reset(c_state)
+        reward = 0
+        
+        return [c_state, reward, day_end, year_end]
+    
+    def getstate(self): #query the present state of the system
+        if(self.history is not None):
+            return self.history.window()
+        norm_batt = self.batt/self.BMAX
+        norm_enp = self.enp/(self.BMAX/2)
+        norm_henergy = self.henergy/self.HMAX
+#         norm_fcast = self.fcast/(self.no_of_day_state-1)
+        c_state = [norm_batt, norm_enp, norm_henergy] #continuous states
+
+        return c_state
+
+    #reward function
+    def rewardfn(self):
+        
+        #REWARD AS A FUNCTION OF ENP
+        if(np.abs(self.enp/self.BMAX) <= 0.10):
+            enp_reward = 1  #good reward
+        else:
+            enp_reward = 0.5 - 5*np.abs(self.enp/self.BMAX)
+                
+        #PENALTY AS A FUNCTION OF DAILY MEAN VALUE OF BATTERY
+        bmean = np.mean(self.btrack)
+        bdev = np.abs(self.BOPT - bmean)/self.BMAX
+        if (bdev <= 0.1):
+            penalty = 0
+        else:
+            VTh = 0.2
+            penalty = np.exp(bdev/VTh)/np.exp(0.3/VTh) - np.exp(0.1/VTh)/np.exp(0.3/VTh)# max penalty is 1 when mean battery deviates by 50% of BMAX. 
+        
+        #REWARD AS A FUNCTION OF BATTERY VIOLATIONS
+        if(self.violation_flag):
+            violation_penalty = 1
+        else:
+            violation_penalty = 0 #penalty for violating battery limits anytime during the day
+            
+        return 3*((0.3-bdev)*enp_reward + bdev*(-penalty)) - violation_penalty
+        
+    
+    def step(self, action):
+        day_end = False
+        year_end = False
+        reward = 0
+       
+        action = np.clip(action, 0, self.N_ACTIONS-1) #action values range from (0 to N_ACTIONS-1)
+        e_consumed = (action+1)*self.DMAX/self.N_ACTIONS   #energy consumed by the node
+        
+        self.batt += (self.henergy - e_consumed)
+        if(self.batt <= self.BMIN or self.batt >= self.BMAX ):
+            self.violation_flag = True #penalty for violating battery limits anytime during the day
+        self.batt = np.clip(self.batt, self.BMIN, self.BMAX) #clip battery values within permitted level
+        self.btrack = np.append(self.btrack, self.batt) #track battery levels
+
+        
+        self.enp = self.binit - self.batt
+        
+        #proceed to the next time step
+        self.henergy, self.fcast, day_end, year_end = self.eno.step()
+        self.henergy = np.clip(self.henergy, self.HMIN, self.HMAX) #clip henergy within HMIN and HMAX
+
+        if(day_end): #if eno object flags that the day has ended then give reward
+            reward = self.rewardfn()
+             
+            if (self.trainmode): #reset battery to optimal level if limits are exceeded when training
+                if(self.batt == self.BMIN or self.batt == self.BMAX ):
+                    self.batt = self.BOPT
+            
+            self.violation_flag = False
+            self.binit = self.batt #this will be the new initial battery level for next day
+            self.btrack = [] #clear battery tracker 
+                    
+                
+        norm_batt = self.batt/self.BMAX
+        norm_enp = self.enp/(self.BMAX/2)
+        norm_henergy = self.henergy/self.HMAX
+        norm_fcast = self.fcast/5
+
+        c_state = [norm_batt, norm_enp, norm_henergy] #continuous states
+        if(self.history is not None):
+            c_state = self.history.push(c_state)
+        return [c_state, reward, day_end, year_end]
+
+    #function to get the battery levels after each of the given actions taken in zero harvest hours
+    #(the sums are accumulated in the same order as step() does, so the values are identical)
+    def drain(self, actions):
+        actions = np.clip(actions, 0, self.N_ACTIONS-1)
+        e_consumed = (actions+1)*self.DMAX/self.N_ACTIONS
+        batt = np.cumsum(np.concatenate(([self.batt], -e_consumed)))[1:]
+        return batt, np.clip(batt, self.BMIN, self.BMAX)
+
+    #function to take several actions over zero harvest hours at once (see ENO.zero_run()).
+    #Same result as calling step() for each action; no day can end in between
+    def macro_step(self, actions, drained=None):
+        batt, clipped = self.drain(actions) if drained is None else drained #drained: output of drain(actions)
+        if np.any((batt <= self.BMIN) | (batt >= self.BMAX)):
+            self.violation_flag = True
+        self.batt = clipped[-1]
+        self.btrack = np.append(self.btrack, clipped)
+        self.enp = self.binit - self.batt
+
+        self.henergy, self.fcast, day_end, year_end = self.eno.skip(len(actions))
+        self.henergy = np.clip(self.henergy, self.HMIN, self.HMAX)
+
+        c_state = [self.batt/self.BMAX, self.enp/(self.BMAX/2), self.henergy/self.HMAX]
+        if(self.history is not None): #states of the hours of the run (no harvest until the last one)
+            frames = np.zeros((len(actions), 3))
+            frames[:, 0] = clipped/self.BMAX
+            frames[:, 1] = (self.binit - clipped)/(self.BMAX/2)
+            frames[-1] = c_state
+            c_state = self.history.extend(frames)
+        return [c_state, 0, day_end, year_end]
@@ -13,10 +13,12 @@
 
 #METHODS: To shuffle days randomly (shuffle_days())
 #         To emulate days of only a certain daytype (daytype(x))
+#         DAPM: To observe the last k hours instead of the present hour only (history)
 
-import pandas as pd
 import numpy as np
 
+from history_class import HISTORY
+
 
 class ENO(object):
     
@@ -47,6 +49,7 @@ class ENO(object):
         file = './' + self.location +'/' + str(self.year) + '.csv'
         #skiprows=4 to remove unnecessary title texts
         #usecols=4 to read only the Global Solar Radiation (GSR) values
+        import pandas as pd #pandas is only needed when reading the CSV files
         solar_radiation = pd.read_csv(file, skiprows=4, encoding='shift_jisx0213', usecols=[4])
         
         #convert dataframe to numpy array
@@ -169,6 +172,7 @@ class ENO_daytype(object):
         file = './' + self.location +'/' + str(self.year) + '.csv'
         #skiprows=4 to remove unnecessary title texts
         #usecols=4 to read only the Global Solar Radiation (GSR) values
+        import pandas as pd #pandas is only needed when reading the CSV files
         solar_radiation = pd.read_csv(file, skiprows=4, encoding='shift_jisx0213', usecols=[4])
         
         #convert dataframe to numpy array
@@ -265,7 +269,7 @@ class ENO_daytype(object):
 
 #Discrete Adaptive Power Manager using default ENO class
 class DAPM (object):
-    def __init__(self,location='tokyo', year=2010, shuffle=False):
+    def __init__(self,location='tokyo', year=2010, shuffle=False, history=1):
 
         #all energy values i.e. BMIN, BMAX, BOPT, HMAX, DMAX are in mWhr
         
@@ -294,6 +298,10 @@ class DAPM (object):
         self.year = year
         self.shuffle = shuffle
         self.eno = ENO(self.location, self.year, shuffle)
+
+        #with history=k > 1 the states are the windows of the last k discretized states (a HISTORY view,
+        #newest first, k*4 values)
+        self.history = HISTORY(history, 4, dtype=int) if history > 1 else None
   
     #FUNCTIONS TO DISCRETIZE STATES FROM NORMALIZED VALUES OF BATTERY, ENP, HENERGY and FORECAST
     def get_batt_state(self,batt):
@@ -348,11 +356,15 @@ class DAPM (object):
 
         c_state = [norm_batt, norm_enp, norm_henergy, norm_fcast] #continuous states
         d_state = self.discretize(c_state) #discretized states
+        if(self.history is not None):
+            d_state = self.history.reset(d_state)
         reward = 0
         
         return [d_state, reward, day_end, year_end]
     
     def getstate(self): #query the present state of the system
+        if(self.history is not None):
+            return self.history.window()
         norm_batt = self.batt/self.BMAX
         norm_enp = self.enp/(self.BMAX/2)
         norm_henergy = self.henergy/self.HMAX
@@ -406,6 +418,8 @@ class DAPM (object):
 
         c_state = [norm_batt, norm_enp, norm_henergy, norm_fcast] #continuous states
         d_state = self.discretize(c_state) #discretized states
+        if(self.history is not None):
+            d_state = self.history.push(d_state)
         return [d_state, reward, day_end, year_end]
 
 
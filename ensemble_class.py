@@ -0,0 +1,81 @@
+# coding: utf-8
+
+#Class declaration for ENSEMBLE class (K same-architecture Nets evaluated as one stacked model)
+
+#INPUT : K saved Net state_dicts (files or dicts) with the same N_STATES, HIDDEN_LAYER and N_ACTIONS
+#        List of (location, year) to evaluate on
+
+#OUTPUTS: Q values of all the K models for all the states in one batched matmul
+#         Average year reward of every model on every station-year (mode='each')
+#         Average year reward of the ensemble policy on every station-year (mode='vote' or 'mean')
+
+#The weights of fc1 and out (the only layers used by Net.forward) are stacked into (K, ...) tensors.
+#Every (model, station-year) pair is one node of a FLEET, so a whole year of greedy rollouts for all the
+#models costs one forward call per hour.
+
+import numpy as np
+import torch
+
+from fleet_class import FLEET
+from solar_data import get_radiation
+
+
+class ENSEMBLE(object):
+
+    def __init__(self, ckpts):
+        state_dicts = [torch.load(c) if isinstance(c, str) else c for c in ckpts]
+        self.names = [c if isinstance(c, str) else str(i) for i, c in enumerate(ckpts)]
+        self.K = len(state_dicts)
+
+        self.W1 = torch.stack([sd['fc1.weight'] for sd in state_dicts]).transpose(1, 2).float().contiguous() #(K, N_STATES, HIDDEN)
+        self.b1 = torch.stack([sd['fc1.bias'] for sd in state_dicts]).unsqueeze(1).float()                 #(K, 1, HIDDEN)
+        self.W2 = torch.stack([sd['out.weight'] for sd in state_dicts]).transpose(1, 2).float().contiguous() #(K, HIDDEN, N_ACTIONS)
+        self.b2 = torch.stack([sd['out.bias'] for sd in state_dicts]).unsqueeze(1).float()                 #(K, 1, N_ACTIONS)
+        self.N_STATES = self.W1.shape[1]
+        self.N_ACTIONS = self.W2.shape[2]
+
+    #Q values of all the models. x is (N, N_STATES) shared by all the models or (K, N, N_STATES)
+    def forward(self, x):
+        x = torch.as_tensor(x, dtype=torch.float32)
+        if x.dim() == 2:
+            x = x.unsqueeze(0).expand(self.K, -1, -1)
+        with torch.no_grad():
+            h = torch.relu(torch.baddbmm(self.b1, x, self.W1))
+            return torch.baddbmm(self.b2, h, self.W2) #(K, N, N_ACTIONS)
+
+    #greedy action of every model for its own states, x is (K*N, N_STATES) ordered model by model
+    def each_policy(self, state):
+        x = torch.from_numpy(np.ascontiguousarray(state, dtype=np.float32)).view(self.K, -1, self.N_STATES)
+        return self.forward(x).argmax(2).reshape(-1).numpy()
+
+    #action chosen by most of the models (ties go to the smaller duty cycle)
+    def vote_policy(self, state):
+        actions = self.forward(state).argmax(2) #(K, N)
+        counts = torch.zeros(actions.shape[1], self.N_ACTIONS, dtype=torch.int64)
+        counts.scatter_add_(1, actions.t(), torch.ones_like(actions.t()))
+        return counts.argmax(1).numpy()
+
+    #greedy action of the average Q values of the models
+    def mean_policy(self, state):
+        return self.forward(state).mean(0).argmax(1).numpy()
+
+    #function to run a greedy year on each (location, year). Returns the average reward, shape (K, E) for
+    #mode='each' and (E,) for mode='vote' or 'mean'
+    def evaluate(self, station_years, mode='each', data_dir='./data/'):
+        E = len(station_years)
+        sradiation = [get_radiation(location, year, data_dir) for location, year in station_years]
+        rewards = np.empty((self.K, E) if mode == 'each' else (E,))
+
+        #station-years of the same length (leap years apart) are simulated together
+        for no_of_days in set(s.shape[0] for s in sradiation):
+            envs = [e for e in range(E) if sradiation[e].shape[0] == no_of_days]
+            srad = np.stack([sradiation[e] for e in envs])
+            if mode == 'each':
+                station = np.tile(np.arange(len(envs)), self.K) #node k*len(envs) + e runs model k on env e
+                result = FLEET(station=station, sradiation=srad).run(self.each_policy)
+                rewards[:, envs] = result['reward'].reshape(self.K, len(envs))
+            else:
+                policy = self.vote_policy if mode == 'vote' else self.mean_policy
+                result = FLEET(station=np.arange(len(envs)), sradiation=srad).run(policy)
+                rewards[envs] = result['reward']
+        return rewards
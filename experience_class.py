@@ -0,0 +1,190 @@
+# coding: utf-8
+
+#Class declaration for EXPERIENCE class (offline experience dataset in memory mapped files)
+
+#INPUT : Behavior policies, e.g. 'random', 'fixed:3', 'net:best_dsnv2_uniform_daytype83AU9D6T_BEST.pt:0.9'
+#        (epsilon-greedy with the probability of the greedy action as DQN.EPSILON)
+#        List of (location, year) and the CAPM arguments of the rollouts
+
+#OUTPUTS: <root>/chunk_<n>.npy: the transitions (s, a, r, s_, day_end) of one rollout (one behavior on one
+#         station-year) as a structured array, in the order they were taken
+#         <root>/manifest.json: n_states, CAPM arguments and, for every chunk, its file, no. of rows,
+#         behavior, location, year and seed
+
+#METHODS: To roll out behaviors over station-years in parallel and add the chunks (generate())
+#         To sample batches of (s, a, r, s_) like REPLAY.sample() (sample()), used by DQN(offline=EXPERIENCE(...))
+
+#USAGE: python experience_class.py experience/ --behaviors random fixed:3 net:best_dsnv2_uniform_daytype83AU9D6T_BEST.pt:0.9
+
+#r is the reward returned by CAPM.step(), i.e. non-zero only at the end of each day. By default sample()
+#broadcasts the day end reward to all the hours of the day, decayed by LAMBDA, as train.run_iteration()
+#does before storing a day, so that offline and online DQNs learn from the same targets.
+#The chunks are opened memory mapped: only the sampled rows are read.
+
+import argparse
+import json
+import os
+import random
+from multiprocessing import Pool
+
+import numpy as np
+
+from solar_data import LOCATIONS, get_years
+
+
+LAMBDA = 0.9 #decay of the day end reward (train.LAMBDA)
+TIME_STEPS = 24
+
+
+def get_dtype(n_states):
+    return np.dtype([('s', np.float32, (n_states,)), ('a', np.uint8), ('r', np.float32),
+                     ('s_', np.float32, (n_states,)), ('day_end', bool)])
+
+
+_nets = {} #file -> Net, per worker process
+
+
+#function to get the behavior policy (state, rng) -> action of a behavior string
+def get_behavior(behavior, N_ACTIONS=10):
+    kind, _, arg = behavior.partition(':')
+    if kind == 'random':
+        return lambda state, rng: rng.randint(0, N_ACTIONS)
+    if kind == 'fixed':
+        return lambda state, rng: int(arg)
+    if kind == 'net':
+        import torch
+        file, _, epsilon = arg.rpartition(':') if arg.count(':') else (arg, '', '')
+        epsilon = float(epsilon) if epsilon else 1.0
+        if file not in _nets:
+            from learner_class import load_net
+            _nets[file] = load_net(file)
+        net = _nets[file]
+
+        def policy(state, rng):
+            if rng.uniform() < epsilon: #greedy as DQN.choose_action()
+                with torch.no_grad():
+                    return int(net(torch.FloatTensor(np.asarray(state)).unsqueeze(0)).argmax(1)[0])
+            return rng.randint(0, N_ACTIONS)
+        return policy
+    raise ValueError('unknown behavior: ' + behavior)
+
+
+#function to roll out one behavior on one station-year and write its chunk. Returns the chunk entry
+def rollout(task):
+    root, n, behavior, location, year, seed, capm_args = task
+    from dsnv2_class import CAPM
+    np.random.seed(seed) #CAPM shuffles and balances days with the global random states
+    random.seed(seed)
+    rng = np.random.RandomState(seed)
+    policy = get_behavior(behavior)
+
+    capm = CAPM(location, year, **capm_args)
+    s, r, day_end, year_end = capm.reset()
+    rows = np.zeros(capm.eno.NO_OF_DAYS * capm.eno.TIME_STEPS, dtype=get_dtype(len(s)))
+    t = 0
+    while True:
+        a = policy(s, rng)
+        s_, r, day_end, year_end = capm.step(a)
+        rows[t] = (s, a, r, s_, day_end)
+        t += 1
+        if year_end:
+            break
+        s = s_
+
+    file = 'chunk_%06d.npy' % n
+    np.save(os.path.join(root, file + '.tmp.npy'), rows[:t])
+    os.replace(os.path.join(root, file + '.tmp.npy'), os.path.join(root, file))
+    return {'file': file, 'rows': t, 'n_states': len(s), 'behavior': behavior, 'location': location,
+            'year': int(year), 'seed': seed}
+
+
+def read_manifest(root):
+    file = os.path.join(root, 'manifest.json')
+    if not os.path.exists(file):
+        return None
+    with open(file) as f:
+        return json.load(f)
+
+
+#function to roll out every behavior on every station-year (one process per rollout, at most `processes`
+#at a time) and add the chunks to the dataset in root. Returns the manifest
+def generate(root, behaviors, station_years=None, seed=0, processes=None, **capm_args):
+    if station_years is None:
+        station_years = [(l, y) for l in LOCATIONS for y in get_years(l)]
+    os.makedirs(root, exist_ok=True)
+    manifest = read_manifest(root) or {'n_states': None, 'capm_args': capm_args, 'chunks': []}
+    if manifest['capm_args'] != capm_args:
+        raise ValueError('the dataset in %s was generated with CAPM arguments %s' % (root, manifest['capm_args']))
+
+    start = len(manifest['chunks'])
+    tasks = [(root, start + i, behavior, location, year, seed + start + i, capm_args)
+             for i, (behavior, (location, year)) in enumerate((b, sy) for b in behaviors for sy in station_years)]
+    with Pool(processes) as pool:
+        chunks = pool.map(rollout, tasks, chunksize=1)
+
+    n_states = set(c.pop('n_states') for c in chunks) | ({manifest['n_states']} - {None})
+    if len(n_states) != 1:
+        raise ValueError('all the chunks need the same no. of states')
+    manifest['n_states'] = n_states.pop()
+    manifest['chunks'].extend(chunks)
+    with open(os.path.join(root, 'manifest.json.tmp'), 'w') as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(os.path.join(root, 'manifest.json.tmp'), os.path.join(root, 'manifest.json'))
+    return manifest
+
+
+class EXPERIENCE(object):
+
+    #with behaviors / station_years only the matching chunks are used. With LAMBDA=None the rewards are
+    #the rewards of CAPM.step() as stored
+    def __init__(self, root, LAMBDA=LAMBDA, behaviors=None, station_years=None):
+        self.root = root
+        manifest = read_manifest(root)
+        if manifest is None:
+            raise FileNotFoundError(os.path.join(root, 'manifest.json'))
+        self.N_STATES = manifest['n_states']
+        self.entries = [c for c in manifest['chunks']
+                        if (behaviors is None or c['behavior'] in behaviors) and
+                           (station_years is None or (c['location'], c['year']) in station_years)]
+        self.chunks = [np.load(os.path.join(root, c['file']), mmap_mode='r') for c in self.entries]
+        self.start = np.cumsum([0] + [len(c) for c in self.chunks]) #first row of every chunk
+        self.size = int(self.start[-1])
+        self.decay = None if LAMBDA is None else LAMBDA ** np.arange(TIME_STEPS - 1, -1, -1, dtype=np.float32)
+
+    #function to get the rows of the given indices as (s, a, r, s_)
+    def get(self, index):
+        chunk = np.searchsorted(self.start, index, 'right') - 1
+        rows = np.empty(len(index), dtype=self.chunks[0].dtype)
+        r = np.empty(len(index), dtype=np.float32)
+        for k in np.unique(chunk):
+            sel = np.flatnonzero(chunk == k)
+            i = index[sel] - self.start[k]
+            rows[sel] = self.chunks[k][i]
+            if self.decay is None:
+                r[sel] = rows['r'][sel]
+            else: #day end reward of the day of each row (the chunks are whole days)
+                r[sel] = self.chunks[k]['r'][i - i % TIME_STEPS + TIME_STEPS - 1] * self.decay[i % TIME_STEPS]
+        return np.ascontiguousarray(rows['s']), rows['a'].astype(np.int64), r, np.ascontiguousarray(rows['s_'])
+
+    #function to sample a batch of (s, a, r, s_) using the random stream rng
+    def sample(self, batch_size, rng=np.random):
+        return self.get(rng.choice(self.size, batch_size))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('root')
+    parser.add_argument('--behaviors', nargs='+', default=['random'])
+    parser.add_argument('--station-years', nargs='*', help='location:year (default: all the bundled data)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int)
+    parser.add_argument('--shuffle', action='store_true')
+    parser.add_argument('--trainmode', action='store_true')
+    args = parser.parse_args()
+
+    station_years = None
+    if args.station_years:
+        station_years = [(sy.split(':')[0], int(sy.split(':')[1])) for sy in args.station_years]
+    manifest = generate(args.root, args.behaviors, station_years, args.seed, args.processes,
+                        shuffle=args.shuffle, trainmode=args.trainmode)
+    print(len(manifest['chunks']), 'chunks', sum(c['rows'] for c in manifest['chunks']), 'transitions in', args.root)
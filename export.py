@@ -0,0 +1,113 @@
+# coding: utf-8
+
+#Export of a trained Net for inference: TorchScript-frozen, optionally int8 dynamically quantized
+
+#INPUT : File of a Net state_dict (torch.save(dqn.eval_net.state_dict(), FILENAME))
+
+#OUTPUTS: TorchScript file that runs without learner_class (load with torch.jit.load(file))
+#         Action agreement with the float Net on all the bundled station-years (3 state Nets only)
+#         Latency at batch size 1 and throughput at batch size 4096 of the float, frozen and exported models
+
+#USAGE: python export.py best_dsnv2_uniform_daytype83AU9D6T_BEST.pt --out best_frozen.pt [--int8] [--check]
+
+#The exported model is frozen: only fc1 and out (the layers used by Net.forward) are kept as constants.
+#Freezing removes most of the per call overhead at batch size 1. int8 only makes the file smaller for this
+#3-50-10 Net: it is slower than float32 at large batch sizes and changes some of the actions (see --check).
+
+import argparse
+import time
+import warnings
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from learner_class import load_net
+from solar_data import LOCATIONS, get_years, get_radiation
+
+
+BATCH_SIZES = [1, 4096]
+
+
+#function to get the frozen TorchScript model of a Net (int8 weights for the Linear layers if quantize)
+def export_net(net, quantize=False):
+    with warnings.catch_warnings(): #torch.jit and torch.ao.quantization print deprecation warnings
+        warnings.simplefilter('ignore')
+        if quantize:
+            net = torch.ao.quantization.quantize_dynamic(net, {nn.Linear}, dtype=torch.qint8)
+        return torch.jit.freeze(torch.jit.script(net.eval()))
+
+
+#function to export a Net, or the file of its state_dict, to out. Returns the frozen model
+def export(net, out, quantize=False):
+    if isinstance(net, str):
+        net = load_net(net)
+    model = export_net(net, quantize)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        torch.jit.save(model, out, _extra_files={'n_states': str(net.fc1.in_features)}) #read by serve.py
+    return model
+
+
+#function to get the fraction of the greedy actions of model equal to those of net on the states visited
+#by net in a greedy year of every station-year
+def action_agreement(net, model, station_years=None, data_dir='./data/'):
+    from fleet_class import FLEET
+    if station_years is None:
+        station_years = [(l, y) for l in LOCATIONS for y in get_years(l, data_dir)]
+    sradiation = [get_radiation(l, y, data_dir) for l, y in station_years]
+    counts = np.zeros(2)
+
+    def policy(state):
+        with torch.no_grad():
+            x = torch.from_numpy(np.ascontiguousarray(state, dtype=np.float32))
+            action = net(x).argmax(1).numpy()
+            counts[0] += np.sum(model(x).argmax(1).numpy() == action)
+            counts[1] += len(action)
+        return action
+
+    #station-years of the same length are simulated together
+    for no_of_days in set(s.shape[0] for s in sradiation):
+        srad = np.stack([s for s in sradiation if s.shape[0] == no_of_days])
+        FLEET(station=np.arange(len(srad)), sradiation=srad).run(policy)
+    return counts[0] / counts[1]
+
+
+#function to get the latency (s per call) at batch size 1 and the throughput (rows/s) at larger batch sizes
+def measure(model, n_states, batch_sizes=BATCH_SIZES, repeat=200):
+    results = {}
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            x = torch.rand(batch_size, n_states)
+            for _ in range(10): #warm up (TorchScript optimizes on the first calls)
+                model(x)
+            times = []
+            for _ in range(repeat if batch_size == 1 else max(repeat // 10, 5)):
+                t = time.perf_counter()
+                model(x)
+                times.append(time.perf_counter() - t)
+            t = np.median(times)
+            results[batch_size] = t if batch_size == 1 else batch_size / t
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('file')
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--int8', action='store_true', help='int8 dynamic quantization of the Linear layers')
+    parser.add_argument('--check', action='store_true', help='action agreement and latency')
+    args = parser.parse_args()
+
+    torch.set_num_threads(1)
+    net = load_net(args.file)
+    model = export(net, args.out, quantize=args.int8)
+    print('saved', args.out)
+
+    if args.check:
+        n_states = net.fc1.in_features
+        if n_states == 3: #FLEET simulates the 3 state [batt, enp, henergy] dsnv2 CAPM
+            print('action agreement %.4f' % action_agreement(net, model))
+        for name, m in [('eager float', net), ('frozen float', export_net(net, False)), ('exported', model)]:
+            r = measure(m, n_states)
+            print('%-12s batch 1: %7.1f us/call   batch 4096: %10.0f rows/s' % (name, r[1] * 1e6, r[4096]))
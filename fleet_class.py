@@ -0,0 +1,188 @@
+# coding: utf-8
+
+#Class declaration for FLEET class (vectorized simulation of many heterogeneous nodes)
+
+#INPUT : Per node parameters (BMAX, HMAX, DMAX, N_ACTIONS, panel_size, efficiency, station). Each one can be a scalar shared
+#        by all the nodes or an array with one value per node
+#        Solar radiation of one year for each station
+#        Policy mapping the (no. of nodes x 3) state matrix [batt, enp, henergy] to one action per node
+#        Battery model (battery_class IDEAL, LOSSY or AGING)
+
+#OUTPUTS: Downtime (hours with an empty battery), violation counts (days the battery limits were hit),
+#         ENP at the end of each day and the average daily reward of each node
+
+#METHODS: To simulate the whole fleet for a year, one vectorized step per hour (run())
+#         To summarize the fleet level statistics (summary())
+
+#The step follows dsnv2 CAPM.step() with trainmode=False, i.e. the battery is never reset during the year.
+#The battery is a pluggable model of battery_class (IDEAL, the CAPM bucket, by default), stepped for all the
+#nodes at once. The day mean battery is a running sum by default; with run(..., exact=True) it is averaged in
+#the same order as CAPM, and with the IDEAL model the battery levels and day rewards are identical to those of
+#CAPM (battery_class.parity(), test_battery.py).
+
+import numpy as np
+
+from battery_class import IDEAL
+from solar_data import get_radiation
+
+
+PANEL_SIZE = 55e-3 * 70e-3 #size of solar cell used by ENO.get_data()
+EFFICIENCY = 0.15           #efficiency of solar cell used by ENO.get_data()
+
+
+#function to convert GSR (in MJ/sq.mts per hour) into harvested energy (in mWhr) for the given solar cell.
+#Multiplied in the same order as ENO.get_data(), so the default cell gives the same values to the last bit
+def get_energy(sradiation, panel_size=PANEL_SIZE, efficiency=EFFICIENCY):
+    return sradiation * 1e6 * panel_size * efficiency * 1000/(60*60)
+
+
+#vectorized version of dsnv2 CAPM.rewardfn()
+def get_reward(enp, bmean, violation, BMAX, BOPT):
+    enp_reward = np.where(np.abs(enp/BMAX) <= 0.10, 1, 0.5 - 5*np.abs(enp/BMAX))
+
+    bdev = np.abs(BOPT - bmean)/BMAX
+    VTh = 0.2
+    penalty = np.where(bdev <= 0.1, 0, np.exp(bdev/VTh)/np.exp(0.3/VTh) - np.exp(0.1/VTh)/np.exp(0.3/VTh))
+
+    return 3*((0.3-bdev)*enp_reward + bdev*(-penalty)) - violation
+
+
+#policy that always uses the same duty cycle (scalar or one per node)
+def fixed_policy(action):
+    def policy(state):
+        return np.broadcast_to(action, state.shape[:1])
+    return policy
+
+
+#policy that picks the greedy action of a trained Net for all the nodes in one forward pass
+def net_policy(net, chunk=65536):
+    import torch #torch is only needed when a Net is used as the policy
+
+    def policy(state):
+        with torch.no_grad():
+            x = torch.from_numpy(np.ascontiguousarray(state, dtype=np.float32))
+            return np.concatenate([net(x[i:i+chunk]).argmax(1).numpy() for i in range(0, len(x), chunk)])
+    return policy
+
+
+class FLEET(object):
+
+    def __init__(self, BMAX=9250.0, HMAX=500, DMAX=500, N_ACTIONS=10, panel_size=PANEL_SIZE, efficiency=EFFICIENCY,
+                 station=0, stations=('tokyo', 'wakkanai', 'minamidaito'), year=2011, data_dir='./data/', sradiation=None,
+                 battery=None):
+
+        #node parameters are kept as given so that scalars are broadcast instead of copied for every node
+        self.BMIN = 0.0
+        self.BMAX = np.asarray(BMAX, dtype=float)
+        self.BOPT = 0.5 * self.BMAX
+        self.HMIN = 0
+        self.HMAX = np.asarray(HMAX, dtype=float)
+        self.DMAX = np.asarray(DMAX, dtype=float)
+        self.N_ACTIONS = np.asarray(N_ACTIONS)
+        self.panel_size = np.asarray(panel_size, dtype=float)
+        self.efficiency = np.asarray(efficiency, dtype=float)
+        self.station = np.asarray(station) #index into stations of each node
+
+        self.NO_OF_NODES = np.broadcast(self.BMAX, self.HMAX, self.DMAX, self.N_ACTIONS, self.panel_size, self.efficiency,
+                                        self.station).size
+
+        #one shared radiation array (no. of stations x no. of hours); harvested energy is computed per hour
+        if sradiation is None:
+            sradiation = np.stack([get_radiation(s, year, data_dir) for s in stations])
+        self.sradiation = sradiation.reshape(sradiation.shape[0], -1)
+        self.TIME_STEPS = 24
+        self.NO_OF_DAYS = self.sradiation.shape[1] // self.TIME_STEPS
+        self.battery = IDEAL() if battery is None else battery
+
+    #with trace=True the result also has the battery, harvested energy and action of every node and hour, shape (N, hours),
+    #and the reward of every day, shape (N, days). With exact=True the day mean battery is summed in the same order
+    #as np.mean(CAPM.btrack) and the battery trace is kept in float64 (about 15% slower)
+    def run(self, policy, batt=None, trace=False, exact=False):
+        N = self.NO_OF_NODES
+        batt = np.broadcast_to(self.BOPT if batt is None else batt, (N,)).astype(float)
+        binit = batt.copy()
+        if exact:
+            btrack = np.empty((self.TIME_STEPS + 1, N)) #battery levels of the day (CAPM.btrack), one row per hour
+            btrack[0] = batt
+        else:
+            bsum = batt.copy() #running sum of the battery levels of the day (CAPM.btrack)
+        bcount = 1         #CAPM.reset() adds the initial battery to btrack of the first day
+        violation = np.zeros(N, dtype=bool)
+        self.battery.reset(N, self.BMAX)
+
+        downtime = np.zeros(N, dtype=np.int32)
+        violations = np.zeros(N, dtype=np.int32)
+        enp_rec = np.empty((N, self.NO_OF_DAYS), dtype=np.float32)
+        reward_sum = np.zeros(N)
+
+        state = np.empty((N, 3), dtype=np.float32)
+        #with one solar cell for all the nodes the energy of every station and hour is converted once
+        shared = self.panel_size.ndim == 0 and self.efficiency.ndim == 0
+        energy = get_energy(self.sradiation, self.panel_size, self.efficiency) if shared else None
+        get_henergy = lambda t: np.clip(energy[self.station, t] if shared else
+                                        get_energy(self.sradiation[self.station, t], self.panel_size, self.efficiency),
+                                        self.HMIN, self.HMAX)
+        henergy = get_henergy(0)
+        enp = np.zeros(N)
+        if trace:
+            batt_rec = np.empty((N, self.NO_OF_DAYS * self.TIME_STEPS), dtype=float if exact else np.float32)
+            henergy_rec = np.empty((N, self.NO_OF_DAYS * self.TIME_STEPS), dtype=np.float32)
+            reward_rec = np.empty((N, self.NO_OF_DAYS))
+            action_rec = np.empty((N, self.NO_OF_DAYS * self.TIME_STEPS), dtype=np.int8)
+
+        for t in range(self.NO_OF_DAYS * self.TIME_STEPS):
+            state[:,0] = batt/self.BMAX
+            state[:,1] = enp/(self.BMAX/2)
+            state[:,2] = henergy/self.HMAX
+            action = np.clip(policy(state), 0, self.N_ACTIONS-1)
+            e_consumed = (action+1)*self.DMAX/self.N_ACTIONS
+            if trace: #state seen by the policy and its action
+                batt_rec[:,t], henergy_rec[:,t], action_rec[:,t] = batt, henergy, action
+
+            batt = self.battery.step(batt, henergy, e_consumed)
+            violation |= (batt <= self.BMIN) | (batt >= self.battery.capacity)
+            np.clip(batt, self.BMIN, self.battery.capacity, out=batt)
+            downtime += batt <= self.BMIN
+            if exact:
+                btrack[bcount] = batt
+            else:
+                bsum += batt
+            bcount += 1
+            enp = binit - batt
+
+            if t + 1 < self.NO_OF_DAYS * self.TIME_STEPS:
+                henergy = get_henergy(t+1)
+
+            if (t + 1) % self.TIME_STEPS == 0: #end of day
+                day = t // self.TIME_STEPS
+                if exact: #mean of the contiguous rows of each node: summed in the same order as np.mean(CAPM.btrack)
+                    bmean = np.mean(np.ascontiguousarray(btrack[:bcount].T), axis=1)
+                else:
+                    bmean = bsum/bcount
+                    bsum[:] = 0
+                reward = get_reward(enp, bmean, violation, self.BMAX, self.BOPT)
+                reward_sum += reward
+                violations += violation
+                enp_rec[:,day] = enp
+                if trace:
+                    reward_rec[:,day] = reward
+                violation[:] = False
+                binit = batt.copy()
+                bcount = 0
+
+        result = {'downtime': downtime, 'violations': violations, 'enp': enp_rec,
+                  'reward': reward_sum/self.NO_OF_DAYS}
+        if trace:
+            result.update(batt=batt_rec, henergy=henergy_rec, action=action_rec, day_reward=reward_rec)
+        return result
+
+    #fleet level statistics of the output of run()
+    def summary(self, result, percentiles=[5, 25, 50, 75, 95]):
+        return {'nodes': self.NO_OF_NODES,
+                'downtime_mean': float(np.mean(result['downtime'])),
+                'downtime_percentiles': np.percentile(result['downtime'], percentiles).tolist(),
+                'nodes_with_downtime': int(np.sum(result['downtime'] > 0)),
+                'violations_mean': float(np.mean(result['violations'])),
+                'violations_percentiles': np.percentile(result['violations'], percentiles).tolist(),
+                'enp_percentiles': np.percentile(result['enp'], percentiles).tolist(),
+                'reward_mean': float(np.mean(result['reward']))}
@@ -0,0 +1,60 @@
+# coding: utf-8
+
+#Class declaration for HISTORY class (sliding window of the last k observations)
+
+#INPUT : One observation (frame) per hour, e.g. [norm_batt, norm_enp, norm_henergy] of CAPM
+
+#OUTPUTS: Window of the last k frames, newest first, flattened to k*frame_size values
+#         (the first frame_size values are the present state, as without history)
+
+#METHODS: To start a new episode, padding the window with its first frame (reset())
+#         To add the frame of the next hour (push()), or of several hours at once (extend())
+
+#The frames are written backwards into a preallocated buffer of k+SPAN frames, so that every window is a
+#contiguous slice of it: a view, no frames are copied or concatenated per step. When the buffer is used up,
+#the last k-1 frames are moved to its end once every SPAN hours.
+#A window stays valid until the second push() after it, so the state and next state of one step can be kept
+#together (copy a window to keep it longer).
+
+import numpy as np
+
+
+SPAN = 168 #hours written between two moves of the buffer (one week)
+
+
+class HISTORY(object):
+
+    def __init__(self, k, frame_size, span=SPAN, dtype=float):
+        if span < k - 1:
+            raise ValueError('span must be at least k-1')
+        self.k = k
+        self.frame_size = frame_size
+        self.buffer = np.zeros((k + span, frame_size), dtype=dtype)
+        self.t = None #row of the newest frame
+
+    def window(self):
+        return self.buffer[self.t:self.t+self.k].reshape(-1)
+
+    def reset(self, frame):
+        self.t = len(self.buffer) - self.k
+        self.buffer[self.t:] = frame
+        return self.window()
+
+    def push(self, frame):
+        if self.t == 0: #move the k-1 newest frames to the end (the last window is not overwritten)
+            self.buffer[len(self.buffer)-self.k+1:] = self.buffer[:self.k-1]
+            self.t = len(self.buffer) - self.k + 1
+        self.t -= 1
+        self.buffer[self.t] = frame
+        return self.window()
+
+    #function to push the frames (n, frame_size) of n hours, oldest first
+    def extend(self, frames):
+        n = len(frames)
+        if n > self.t: #not enough room before the newest frame
+            for frame in frames:
+                self.push(frame)
+            return self.window()
+        self.buffer[self.t-n:self.t] = frames[::-1]
+        self.t -= n
+        return self.window()
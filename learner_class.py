@@ -0,0 +1,280 @@
+#Class definitions for NN model and learning algorithm
+
+import numpy as np
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from replay_class import REPLAY
+
+
+# Hyper Parameters (defaults used by the dsnv2 notebooks)
+BATCH_SIZE = 24
+LR = 0.01                         # learning rate
+EPSILON = 0.9                     # greedy policy
+GAMMA = 0.9                       # reward discount
+TARGET_REPLACE_ITER = 24*7*4*2    # target update frequency (every two months)
+MEMORY_CAPACITY = 24*7*4*6        # store upto six month worth of memory
+
+N_ACTIONS = 10   # no. of duty cycles
+N_STATES = 3     # number of state space parameter [batt, enp, henergy]
+HIDDEN_LAYER = 50
+N_LAYERS = 4     # no. of hidden layers declared in Net (only fc1 is used by forward)
+STACKED = ['fc1.weight', 'fc1.bias', 'out.weight', 'out.bias'] # parameters used by Net.forward
+
+
+class Net(nn.Module):
+    def __init__(self, n_states=N_STATES, hidden_layer=HIDDEN_LAYER, n_actions=N_ACTIONS, n_layers=N_LAYERS):
+        super(Net, self).__init__()
+        self.fc1 = nn.Linear(n_states, hidden_layer)
+        self.fc1.weight.data.normal_(0, 0.1)   # initialization
+
+        # fc2, fc3, ... are declared (and saved in the state_dict) as in the notebooks but not used by forward
+        for i in range(2, n_layers + 1):
+            fc = nn.Linear(hidden_layer, hidden_layer)
+            fc.weight.data.normal_(0, 0.1)   # initialization
+            setattr(self, 'fc%d' % i, fc)
+
+        self.out = nn.Linear(hidden_layer, n_actions)
+        self.out.weight.data.normal_(0, 0.1)   # initialization
+
+    def forward(self, x):
+        x = self.fc1(x)
+        x = F.relu(x)
+        actions_value = self.out(x)
+        return actions_value
+
+
+#function to get the Net arguments (n_states, hidden_layer, n_actions, n_layers) of a saved state_dict
+def get_net_args(state_dict):
+    n_layers = len([k for k in state_dict if k.startswith('fc') and k.endswith('.weight')])
+    hidden_layer, n_states = state_dict['fc1.weight'].shape
+    n_actions = state_dict['out.weight'].shape[0]
+    return int(n_states), int(hidden_layer), int(n_actions), n_layers
+
+
+#function to build a Net from a file saved with torch.save(dqn.eval_net.state_dict(), FILENAME)
+def load_net(file):
+    state_dict = torch.load(file)
+    net = Net(*get_net_args(state_dict))
+    net.load_state_dict(state_dict)
+    net.eval()
+    return net
+
+
+#function to create the eval and target Nets of one DQN. With a seed the initial weights depend only on
+#the seed and the global torch random state is left untouched
+def init_nets(seed, n_states=N_STATES, hidden_layer=HIDDEN_LAYER, n_actions=N_ACTIONS, n_layers=N_LAYERS):
+    if seed is None:
+        return Net(n_states, hidden_layer, n_actions, n_layers), Net(n_states, hidden_layer, n_actions, n_layers)
+    with torch.random.fork_rng(devices=[]):
+        torch.manual_seed(seed)
+        return Net(n_states, hidden_layer, n_actions, n_layers), Net(n_states, hidden_layer, n_actions, n_layers)
+
+
+class DQN(object):
+    def __init__(self, n_states=N_STATES, hidden_layer=HIDDEN_LAYER, n_actions=N_ACTIONS, n_layers=N_LAYERS,
+                 lr=LR, epsilon=EPSILON, gamma=GAMMA, batch_size=BATCH_SIZE,
+                 memory_capacity=MEMORY_CAPACITY, target_replace_iter=TARGET_REPLACE_ITER, profiler=None, seed=None,
+                 replay=None, history=1, offline=None):
+        self.N_STATES = n_states
+        self.N_ACTIONS = n_actions
+        self.LR = lr
+        self.EPSILON = epsilon
+        self.GAMMA = gamma
+        self.BATCH_SIZE = batch_size
+        self.MEMORY_CAPACITY = memory_capacity
+        self.TARGET_REPLACE_ITER = target_replace_iter
+
+        # random stream for exploration and memory sampling (global np.random unless a seed is given)
+        self.rng = np.random if seed is None else np.random.RandomState(seed)
+        self.eval_net, self.target_net = init_nets(seed, n_states, hidden_layer, n_actions, n_layers)
+
+        self.learn_step_counter = 0                                     # for target updating
+        self.memory_counter = 0                                         # for storing memory
+        self.memory = np.zeros((self.MEMORY_CAPACITY, self.N_STATES * 2 + 2))     # initialize memory [mem: ([s], a, r, [s_]) ]
+        # compact ring buffer replay ('uint16', 'float16' or 'float64' states) used in place of memory if given.
+        # With states of the last `history` hours (CAPM(history=k), n_states = k*3) it keeps one hour per transition
+        self.replay = None
+        if replay is not None:
+            self.replay = REPLAY(self.MEMORY_CAPACITY, self.N_STATES, replay, history=history)
+            self.memory = None
+        # offline dataset (EXPERIENCE) learn() samples from instead of the memory; nothing is stored
+        self.offline = offline
+        if offline is not None:
+            if offline.N_STATES != self.N_STATES:
+                raise ValueError('the offline dataset has %d states' % offline.N_STATES)
+            self.memory = None
+        self.optimizer = torch.optim.Adam(self.eval_net.parameters(), lr=self.LR)
+        self.loss_func = nn.MSELoss()
+
+        if profiler is not None: # time action selection, storage and learning
+            profiler.instrument(self, {'choose_action': 'choose_action', 'choose_greedy_action': 'choose_action',
+                                       'store_transition': 'store_transition',
+                                       'store_day_transition': 'store_transition', 'learn': 'learn'})
+
+    def choose_action(self, x):
+        x = torch.unsqueeze(torch.FloatTensor(x), 0)
+        # input only one sample
+        if self.rng.uniform() < self.EPSILON:   # greedy
+            actions_value = self.eval_net.forward(x)
+            action = torch.max(actions_value, 1)[1].data.numpy()
+            action = action[0] # return the argmax index
+        else:   # random
+            action = self.rng.randint(0, self.N_ACTIONS)
+        return action
+
+    def choose_greedy_action(self, x):
+        x = torch.unsqueeze(torch.FloatTensor(x), 0)
+        # input only one sample
+
+        actions_value = self.eval_net.forward(x)
+        action = torch.max(actions_value, 1)[1].data.numpy()
+        action = action[0] # return the argmax index
+
+        return action
+
+    def store_transition(self, s, a, r, s_):
+        transition = np.hstack((s, [a, r], s_))
+        if self.replay is not None:
+            self.replay.push(transition)
+            self.memory_counter += 1
+            return
+        # replace the old memory with new memory
+        index = self.memory_counter % self.MEMORY_CAPACITY
+        self.memory[index, :] = transition
+        self.memory_counter += 1
+
+    def store_day_transition(self, transition_rec):
+        if self.replay is not None:
+            self.replay.push(transition_rec)
+            self.memory_counter += transition_rec.shape[0]
+            return
+        data = transition_rec
+        index = self.memory_counter % self.MEMORY_CAPACITY
+        self.memory= np.insert(self.memory, index, data,0)
+        self.memory_counter += transition_rec.shape[0]
+
+    def learn(self):
+        # target parameter update
+        if self.learn_step_counter % self.TARGET_REPLACE_ITER == 0:
+            self.target_net.load_state_dict(self.eval_net.state_dict())
+        self.learn_step_counter += 1
+
+        # sample batch transitions
+        if self.offline is not None:
+            b_s, b_a, b_r, b_s_ = map(torch.from_numpy, self.offline.sample(self.BATCH_SIZE, self.rng))
+            b_a, b_r = b_a.view(-1, 1), b_r.view(-1, 1)
+        elif self.replay is not None:
+            b_s, b_a, b_r, b_s_ = map(torch.from_numpy, self.replay.sample(self.BATCH_SIZE, self.rng))
+            b_a, b_r = b_a.view(-1, 1), b_r.view(-1, 1)
+        else:
+            sample_index = self.rng.choice(self.MEMORY_CAPACITY, self.BATCH_SIZE)
+            b_memory = self.memory[sample_index, :]
+            b_s = torch.FloatTensor(b_memory[:, :self.N_STATES])
+            b_a = torch.LongTensor(b_memory[:, self.N_STATES:self.N_STATES+1].astype(int))
+            b_r = torch.FloatTensor(b_memory[:, self.N_STATES+1:self.N_STATES+2])
+            b_s_ = torch.FloatTensor(b_memory[:, -self.N_STATES:])
+
+        # q_eval w.r.t the action in experience
+        q_eval = self.eval_net(b_s).gather(1, b_a)  # shape (batch, 1)
+        q_next = self.target_net(b_s_).detach()     # detach from graph, don't backpropagate
+        q_target = b_r + self.GAMMA * q_next.max(1)[0].view(self.BATCH_SIZE, 1)   # shape (batch, 1)
+        loss = self.loss_func(q_eval, q_target)
+
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+
+
+#K independent DQNs (one per seed) whose eval/target Nets are stacked into (K, ...) parameters.
+#Every seed keeps its own random stream and replay memory, exactly like DQN(seed=seed), while action
+#selection and learning of all the seeds are done with batched matmuls and one Adam step.
+class MULTIDQN(object):
+    def __init__(self, seeds, n_states=N_STATES, hidden_layer=HIDDEN_LAYER, n_actions=N_ACTIONS, n_layers=N_LAYERS,
+                 lr=LR, epsilon=EPSILON, gamma=GAMMA, batch_size=BATCH_SIZE,
+                 memory_capacity=MEMORY_CAPACITY, target_replace_iter=TARGET_REPLACE_ITER):
+        self.K = len(seeds)
+        self.seeds = list(seeds)
+        self.N_STATES = n_states
+        self.N_ACTIONS = n_actions
+        self.LR = lr
+        self.EPSILON = epsilon
+        self.GAMMA = gamma
+        self.BATCH_SIZE = batch_size
+        self.MEMORY_CAPACITY = memory_capacity
+        self.TARGET_REPLACE_ITER = target_replace_iter
+
+        self.rngs = [np.random.RandomState(seed) for seed in seeds]
+        self.init_nets = [init_nets(seed, n_states, hidden_layer, n_actions, n_layers)[0] for seed in seeds]
+
+        # only fc1 and out are used by Net.forward, so only those are stacked and trained
+        self.params = [nn.Parameter(torch.stack([net.state_dict()[name] for net in self.init_nets]))
+                       for name in STACKED]
+        self.target_params = [p.detach().clone() for p in self.params]
+
+        self.learn_step_counter = 0                                     # for target updating
+        self.memory_counter = 0                                         # for storing memory (same for all the seeds)
+        self.memory = [np.zeros((self.MEMORY_CAPACITY, self.N_STATES * 2 + 2)) for _ in seeds]
+        self.optimizer = torch.optim.Adam(self.params, lr=self.LR)
+        self.loss_func = nn.MSELoss()
+
+    # Q values of all the seeds, x is (K, N, N_STATES)
+    def forward(self, x, params):
+        w1, b1, w2, b2 = params
+        x = F.relu(torch.baddbmm(b1.unsqueeze(1), x, w1.transpose(1, 2)))
+        return torch.baddbmm(b2.unsqueeze(1), x, w2.transpose(1, 2))
+
+    # one action per seed for the (K, N_STATES) states, drawing from each seed's stream as DQN.choose_action does
+    def choose_action(self, x):
+        greedy = self.choose_greedy_action(x)
+        action = np.empty(self.K, dtype=int)
+        for k, rng in enumerate(self.rngs):
+            action[k] = greedy[k] if rng.uniform() < self.EPSILON else rng.randint(0, self.N_ACTIONS)
+        return action
+
+    def choose_greedy_action(self, x):
+        x = torch.FloatTensor(np.asarray(x)).unsqueeze(1)   # (K, 1, N_STATES)
+        with torch.no_grad():
+            actions_value = self.forward(x, self.params)
+        return torch.max(actions_value, 2)[1][:, 0].numpy()
+
+    # transition_rec is (K, TIME_STEPS, N_STATES*2+2)
+    def store_day_transition(self, transition_rec):
+        index = self.memory_counter % self.MEMORY_CAPACITY
+        for k in range(self.K):
+            self.memory[k] = np.insert(self.memory[k], index, transition_rec[k], 0)
+        self.memory_counter += transition_rec.shape[1]
+
+    def learn(self):
+        # target parameter update
+        if self.learn_step_counter % self.TARGET_REPLACE_ITER == 0:
+            for t, p in zip(self.target_params, self.params):
+                t.copy_(p.data)
+        self.learn_step_counter += 1
+
+        # sample batch transitions of every seed from its own memory
+        b_memory = np.stack([self.memory[k][rng.choice(self.MEMORY_CAPACITY, self.BATCH_SIZE), :]
+                             for k, rng in enumerate(self.rngs)])
+        b_s = torch.FloatTensor(b_memory[:, :, :self.N_STATES])
+        b_a = torch.LongTensor(b_memory[:, :, self.N_STATES:self.N_STATES+1].astype(int))
+        b_r = torch.FloatTensor(b_memory[:, :, self.N_STATES+1:self.N_STATES+2])
+        b_s_ = torch.FloatTensor(b_memory[:, :, -self.N_STATES:])
+
+        q_eval = self.forward(b_s, self.params).gather(2, b_a)             # shape (K, batch, 1)
+        with torch.no_grad():
+            q_next = self.forward(b_s_, self.target_params)
+        q_target = b_r + self.GAMMA * q_next.max(2)[0].view(self.K, self.BATCH_SIZE, 1)
+        # per seed losses are added so that each seed gets the gradient of its own DQN.learn()
+        loss = sum(self.loss_func(q_eval[k], q_target[k]) for k in range(self.K))
+
+        self.optimizer.zero_grad()
+        loss.backward()
+        self.optimizer.step()
+
+    # state_dict of the eval Net of seed k, same format as dqn.eval_net.state_dict()
+    def state_dict(self, k):
+        state_dict = self.init_nets[k].state_dict()
+        for name, p in zip(STACKED, self.params):
+            state_dict[name] = p.data[k].clone()
+        return state_dict
@@ -0,0 +1,143 @@
+# coding: utf-8
+
+#One time preprocessing of the bundled solar radiation data: gap detection, gap filling and day quality
+
+#INPUT : CSV files in ./data/<location>/<year>.csv (all the locations and years)
+
+#OUTPUTS: <data_dir>/cache/radiation_<fill>.npz with, for every location and year,
+#         the filled GSR values (no_of_daysx24) and the quality of each day (fraction of the daylight hours
+#         that were measured, 1 = no gap)
+
+#USAGE: python preprocess.py [--fill zero|linear|climatology]
+
+#Missing values in the CSV files are either night hours that were not recorded (most of the hours before 2008)
+#or real gaps. An hour is a gap when its value is missing and the same hour has sun on average in the
+#neighbouring days of all the years of the station (station climatology). Night hours are set to zero,
+#gaps are filled with the selected strategy:
+#   zero        : no sun (same as get_radiation())
+#   linear      : linear interpolation between the measured hours around the gap
+#   climatology : mean of the same hour in the neighbouring days of the same year (station climatology if none)
+
+import argparse
+import os
+
+import numpy as np
+
+from solar_data import LOCATIONS, get_years
+
+
+FILLS = ['zero', 'linear', 'climatology']
+WINDOW = 7        #neighbouring days on each side used for the climatology
+SUN = 0.005       #mean GSR (MJ/sq.mts per hour) above which an hour is a daylight hour
+
+_cache = {} #(fill, absolute data_dir) -> loaded npz arrays
+
+
+#function to read the GSR values of a location and year with the missing values left as NaN
+def read_radiation(location, year, data_dir='./data/'):
+    import pandas as pd #pandas is only needed when reading the CSV files
+    file = os.path.join(data_dir, location, str(year) + '.csv')
+    solar_radiation = pd.read_csv(file, skiprows=4, encoding='shift_jisx0213', usecols=[4])
+    return np.array(solar_radiation.values, dtype=float).reshape(-1, 24)
+
+
+#function to get the mean over +-window days (wrapping around the year) of the measured values of every
+#day of year and hour. sradiation is (..., 366, 24) with NaN where missing
+def window_mean(sradiation, window=WINDOW):
+    valid = ~np.isnan(sradiation)
+    total = np.where(valid, sradiation, 0).reshape(-1, 366, 24).sum(axis=0)
+    count = valid.reshape(-1, 366, 24).sum(axis=0)
+    kernel = np.ones(2 * window + 1)
+    pad = lambda x: np.concatenate((x[-window:], x, x[:window]))
+    total = np.apply_along_axis(lambda x: np.convolve(pad(x), kernel, 'valid'), 0, total)
+    count = np.apply_along_axis(lambda x: np.convolve(pad(x), kernel, 'valid'), 0, count)
+    with np.errstate(invalid='ignore'):
+        return total / count #NaN where nothing was measured
+
+
+#function to fill the gaps of one station-year. Returns the filled values and the quality of each day
+def fill_gaps(raw, climatology, fill='zero', window=WINDOW):
+    no_of_days = raw.shape[0]
+    clim = climatology[:no_of_days]
+    daylight = np.nan_to_num(clim) > SUN
+    gap = np.isnan(raw) & daylight
+    sradiation = np.where(np.isnan(raw), 0, raw) #night hours that were not recorded have no sun
+
+    if fill == 'linear' and gap.any():
+        flat, flat_gap = sradiation.reshape(-1), gap.reshape(-1)
+        hours = np.arange(flat.size)
+        flat[flat_gap] = np.interp(hours[flat_gap], hours[~flat_gap], flat[~flat_gap])
+    elif fill == 'climatology' and gap.any():
+        own = np.full((1, 366, 24), np.nan)
+        own[0, :no_of_days] = np.where(gap, np.nan, sradiation)
+        near = window_mean(own, window)[:no_of_days]
+        sradiation[gap] = np.where(np.isnan(near), np.nan_to_num(clim), near)[gap]
+    elif fill not in FILLS:
+        raise ValueError('unknown fill: ' + str(fill))
+
+    expected = daylight.sum(axis=1)
+    quality = 1 - gap.sum(axis=1) / np.maximum(expected, 1)
+    return sradiation, quality.astype(np.float32)
+
+
+#function to preprocess all the station-years and write the cache file. Returns the file name
+def build(fill='zero', data_dir='./data/', locations=LOCATIONS, window=WINDOW):
+    arrays = {}
+    for location in locations:
+        years = get_years(location, data_dir)
+        raw = {year: read_radiation(location, year, data_dir) for year in years}
+        aligned = np.full((len(years), 366, 24), np.nan) #day of year aligned, for the climatology
+        for i, year in enumerate(years):
+            aligned[i, :raw[year].shape[0]] = raw[year]
+        climatology = window_mean(aligned, window)
+        for year in years:
+            sradiation, quality = fill_gaps(raw[year], climatology, fill, window)
+            arrays['%s_%d_sradiation' % (location, year)] = sradiation
+            arrays['%s_%d_quality' % (location, year)] = quality
+            arrays['%s_%d_gaps' % (location, year)] = np.array(np.sum(quality < 1))
+
+    file = cache_file(fill, data_dir)
+    os.makedirs(os.path.dirname(file), exist_ok=True)
+    with open(file + '.tmp', 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(file + '.tmp', file)
+    _cache.pop((fill, os.path.abspath(data_dir)), None)
+    return file
+
+
+def cache_file(fill='zero', data_dir='./data/'):
+    return os.path.join(data_dir, 'cache', 'radiation_%s.npz' % fill)
+
+
+#function to get the time of the last change of the CSV files (the caches built from them are older)
+def source_mtime(data_dir='./data/'):
+    return max(os.path.getmtime(os.path.join(data_dir, l, '%d.csv' % y)) for l in LOCATIONS for y in get_years(l, data_dir))
+
+
+#function to get the filled GSR values and the day quality of a location and year from the cache.
+#The cache is built on first use and rebuilt when a CSV file is newer than it
+def load_radiation(location, year, fill='zero', data_dir='./data/'):
+    key = (fill, os.path.abspath(data_dir)) #the same fill of another data directory is another cache
+    if key not in _cache:
+        file = cache_file(fill, data_dir)
+        if not os.path.exists(file) or os.path.getmtime(file) < source_mtime(data_dir):
+            build(fill, data_dir)
+        with np.load(file) as data:
+            _cache[key] = {k: data[k] for k in data.files}
+    data = _cache[key]
+    return data['%s_%d_sradiation' % (location, year)].copy(), data['%s_%d_quality' % (location, year)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--fill', default='zero', choices=FILLS)
+    parser.add_argument('--data-dir', default='./data/')
+    args = parser.parse_args()
+
+    print('written', build(args.fill, args.data_dir))
+    for location in LOCATIONS:
+        for year in get_years(location, args.data_dir):
+            sradiation, quality = load_radiation(location, year, args.fill, args.data_dir)
+            if np.any(quality < 1):
+                print('%-12s %d  days with gaps %3d  worst day %3d quality %.2f' %
+                      (location, year, np.sum(quality < 1), np.argmin(quality), np.min(quality)))
@@ -0,0 +1,124 @@
+# coding: utf-8
+
+#Class declaration for PROFILER class (training loop instrumentation)
+
+#INPUT : Objects whose methods should be timed (ENO, CAPM, DQN take a profiler argument and instrument themselves)
+#        Name of a JSONL log file (optional)
+
+#OUTPUTS: One record per iteration with the wall clock time and no. of calls of each phase,
+#         env steps/s, updates/s, replay memory size and RSS of the process
+
+#METHODS: To time the methods of an object (instrument())
+#         To time any block of code (with profiler.phase(name): ...)
+#         To time a whole iteration and write its record (with profiler.iteration(i): ... or record())
+
+#Timing is switched on and off with profiler.enabled. Objects created without a profiler are not touched at all.
+
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+
+#function to get the current resident set size of the process in MB
+def get_rss():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10 #peak RSS where /proc is not available
+
+
+class PROFILER(object):
+
+    def __init__(self, log_file=None, enabled=True):
+        self.log_file = log_file
+        self.enabled = enabled
+
+        self.phases = {} #phase name -> [total time in seconds, no. of calls]
+        self.tstart = time.perf_counter() #start of the current iteration
+        self.records = []
+
+    #function to replace the given methods of obj by timed ones. methods maps method name -> phase name
+    def instrument(self, obj, methods):
+        for name, phase in methods.items():
+            setattr(obj, name, self.timed(getattr(obj, name), phase))
+        return obj
+
+    def timed(self, method, phase):
+        acc = self.phases.setdefault(phase, [0.0, 0])
+
+        def wrapper(*args, **kwargs):
+            if not self.enabled:
+                return method(*args, **kwargs)
+            t = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                acc[0] += time.perf_counter() - t
+                acc[1] += 1
+        return wrapper
+
+    @contextmanager
+    def phase(self, phase):
+        if not self.enabled:
+            yield
+            return
+        acc = self.phases.setdefault(phase, [0.0, 0])
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            acc[0] += time.perf_counter() - t
+            acc[1] += 1
+
+    @contextmanager
+    def iteration(self, iteration, dqn=None, **extra):
+        self.reset()
+        try:
+            yield self
+        finally:
+            self.record(iteration, dqn, **extra)
+
+    #function to clear the accumulators at the beginning of an iteration
+    def reset(self):
+        for acc in self.phases.values():
+            acc[0] = 0.0
+            acc[1] = 0
+        self.tstart = time.perf_counter()
+        return 0
+
+    #function to write the record of the iteration that just finished and start the next one
+    def record(self, iteration, dqn=None, **extra):
+        if not self.enabled:
+            return None
+        wall = time.perf_counter() - self.tstart
+        steps = self.phases.get('capm_step', [0.0, 0])[1]
+        updates = self.phases.get('learn', [0.0, 0])[1]
+
+        rec = {'iteration': iteration, 'wall': wall,
+               'time': {k: v[0] for k, v in self.phases.items()},
+               'count': {k: v[1] for k, v in self.phases.items()},
+               'env_steps_per_s': steps / wall if wall > 0 else 0.0,
+               'updates_per_s': updates / wall if wall > 0 else 0.0,
+               'rss_mb': get_rss()}
+        #compact REPLAY, one memory per seed (MULTIDQN) or none at all (offline DQN)
+        replay, memory = getattr(dqn, 'replay', None), getattr(dqn, 'memory', None)
+        if replay is not None:
+            rec['memory_rows'] = int(replay.size)
+            rec['memory_mb'] = replay.nbytes / 2**20
+        elif isinstance(memory, list):
+            rec['memory_rows'] = int(sum(m.shape[0] for m in memory))
+            rec['memory_mb'] = sum(m.nbytes for m in memory) / 2**20
+        elif memory is not None:
+            rec['memory_rows'] = int(memory.shape[0])
+            rec['memory_mb'] = memory.nbytes / 2**20
+        rec.update(extra)
+
+        self.records.append(rec)
+        if self.log_file is not None:
+            with open(self.log_file, 'a') as f:
+                f.write(json.dumps(rec, default=float) + '\n')
+        self.reset()
+        return rec
@@ -0,0 +1,167 @@
+# coding: utf-8
+
+#Class declaration for REPLAY class (compact replay memory)
+
+#INPUT : Transitions [s, a, r, s_] as rows of DQN.memory (one row or one day of rows at a time)
+
+#OUTPUTS: Batches of (s, a, r, s_) as float32 / int64 arrays ready for torch
+
+#METHODS: To store transitions (push())
+#         To sample a batch (sample())
+#         To empty the memory (clear())
+
+#DQN.memory keeps every transition as N_STATES*2+2 float64, i.e. 64 bytes for 3 states.
+#Here each slot keeps one state (float16 or uint16 quantized), the action as uint8 and the reward as float32.
+#The next state of a slot is the state of the following slot, because consecutive hours are stored
+#consecutively. Only the next states that do not start the following slot (end of a year, or the last
+#transition written so far) are kept apart, in a dict.
+#With 3 states that is 12 bytes per transition instead of 64.
+#With history=k the states are windows of the last k frames, newest first (CAPM(history=k)). Each slot then
+#keeps only the newest frame of its state: the older frames are the frames of the slots before it, as long as
+#the window follows on from the window of the slot before (back). Windows that do not follow on and are not
+#padded with their own frame (start of an episode) are kept apart, in a dict, so the memory stays one frame
+#per transition whatever k.
+
+import numpy as np
+
+
+class REPLAY(object):
+
+    def __init__(self, capacity, n_states, dtype='uint16', low=-2.0, high=2.0, history=1):
+        self.capacity = capacity
+        self.n_states = n_states
+        self.dtype = np.dtype(dtype)
+        self.history = history
+        self.frame_size = n_states // history
+        #uint16 quantization range of the states (of one frame or of the whole window). CAPM states are
+        #batt/BMAX and henergy/HMAX in [0, 1] and enp/(BMAX/2) in [-2, 2]
+        self.low = np.broadcast_to(np.asarray(low, dtype=np.float32), (n_states,))
+        self.high = np.broadcast_to(np.asarray(high, dtype=np.float32), (n_states,))
+        if len(np.asarray(low).reshape(-1)) == self.frame_size < n_states: #range of one frame
+            self.low = np.tile(np.asarray(low, dtype=np.float32), history)
+        if len(np.asarray(high).reshape(-1)) == self.frame_size < n_states:
+            self.high = np.tile(np.asarray(high, dtype=np.float32), history)
+
+        self.state = np.zeros((capacity, self.frame_size), dtype=self.dtype) #newest frame of the state
+        self.action = np.zeros(capacity, dtype=np.uint8)
+        self.reward = np.zeros(capacity, dtype=np.float32)
+        self.linked = np.zeros(capacity, dtype=bool) #next state is the state of the following slot
+        self.back = np.zeros(capacity, dtype=bool) #state follows on from the state of the slot before (history)
+        self.clear()
+
+    #function to empty the memory (the arrays are kept and overwritten by the next push())
+    def clear(self):
+        self.linked[:] = False
+        self.back[:] = False
+        self.next_state = {} #slot -> next state of the slots that are not linked
+        self.window = {} #slot -> state of the slots that neither follow on nor are padded (history)
+        self.size = 0 #no. of slots in use
+        self.pos = 0  #next slot to write
+        return 0
+
+    @property
+    def nbytes(self):
+        return (self.state.nbytes + self.action.nbytes + self.reward.nbytes + self.linked.nbytes +
+                sum(s.nbytes for s in self.next_state.values()) +
+                (self.back.nbytes + sum(s.nbytes for s in self.window.values()) if self.history > 1 else 0))
+
+    def quantize(self, x):
+        if self.dtype != np.uint16:
+            return x.astype(self.dtype)
+        x = (np.clip(x, self.low, self.high) - self.low) / (self.high - self.low)
+        return np.rint(x * 65535).astype(np.uint16)
+
+    def dequantize(self, q):
+        if self.dtype != np.uint16:
+            return q.astype(np.float32)
+        return q.astype(np.float32) * ((self.high - self.low) / 65535) + self.low
+
+    #function to store transitions given as rows [s, a, r, s_] (shape (n, N_STATES*2+2) or (N_STATES*2+2,))
+    def push(self, rows):
+        rows = np.atleast_2d(rows)
+        n, S = len(rows), self.n_states
+        slots = (self.pos + np.arange(n)) % self.capacity
+        for slot in slots:
+            self.next_state.pop(slot, None)
+        s = self.quantize(rows[:, :S])
+        s_ = self.quantize(rows[:, -S:])
+        if self.history > 1:
+            self.push_windows(s, slots)
+
+        #the last slot written before can now be linked to the first new slot
+        last = (self.pos - 1) % self.capacity
+        if self.size and last in self.next_state and np.array_equal(self.next_state[last], s[0]):
+            del self.next_state[last]
+            self.linked[last] = True
+
+        self.state[slots] = s[:, :self.frame_size]
+        self.action[slots] = rows[:, S]
+        self.reward[slots] = rows[:, S+1]
+        self.linked[slots[:-1]] = np.all(s_[:-1] == s[1:], axis=1)
+        self.linked[slots[-1]] = False
+        for i in np.flatnonzero(~self.linked[slots]):
+            self.next_state[slots[i]] = s_[i]
+
+        self.pos = (self.pos + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        return 0
+
+    #function to set back and window of the slots about to be written with the (quantized) windows s
+    def push_windows(self, s, slots):
+        F = self.frame_size
+        n = len(slots)
+        #the slot after the written ones loses the slots before it: it keeps its own window from now on
+        after = (slots[-1] + 1) % self.capacity
+        if self.size == self.capacity and after not in slots and self.back[after]:
+            self.window[after] = self.windows(np.array([after]))[0]
+            self.back[after] = False
+        for slot in slots:
+            self.window.pop(slot, None)
+
+        back = np.zeros(n, dtype=bool)
+        back[1:] = np.all(s[1:, F:] == s[:-1, :-F], axis=1)
+        last = (self.pos - 1) % self.capacity
+        if self.size and last not in slots:
+            back[0] = np.array_equal(s[0, F:], self.windows(np.array([last]))[0, :-F])
+        padded = np.all(s[:, F:] == np.tile(s[:, :F], self.history - 1), axis=1)
+        self.back[slots] = back
+        for i in np.flatnonzero(~back & ~padded):
+            self.window[slots[i]] = s[i]
+        return 0
+
+    #function to get the (quantized) states of the given slots
+    def windows(self, index):
+        if self.history == 1:
+            return self.state[index]
+        F = self.frame_size
+        out = np.empty((len(index), self.n_states), dtype=self.dtype)
+        slot = index.copy()
+        out[:, :F] = self.state[slot]
+        follow = np.ones(len(index), dtype=bool)
+        for m in range(1, self.history): #walk back while the windows follow on (else repeat the padding frame)
+            follow &= self.back[slot]
+            slot = np.where(follow, (slot - 1) % self.capacity, slot)
+            out[:, m*F:(m+1)*F] = self.state[slot]
+        for i in np.flatnonzero(~follow): #the walk stopped at a slot whose window may be kept apart
+            m = np.sum(self.back[(index[i] - np.arange(self.history)) % self.capacity].cumprod())
+            if slot[i] in self.window:
+                out[i, m*F:] = self.window[slot[i]][:self.n_states-m*F]
+        return out
+
+    #function to sample a batch of (s, a, r, s_) using the random stream rng
+    def sample(self, batch_size, rng=np.random):
+        index = rng.choice(self.size, batch_size)
+        s_ = self.windows((index + 1) % self.capacity)
+        for i in np.flatnonzero(~self.linked[index]):
+            s_[i] = self.next_state[index[i]]
+        return (self.dequantize(self.windows(index)), self.action[index].astype(np.int64),
+                self.reward[index], self.dequantize(s_))
+
+    #function to get the transitions as rows [s, a, r, s_] in the order they were written (oldest first)
+    def rows(self):
+        index = (self.pos - self.size + np.arange(self.size)) % self.capacity
+        s_ = self.windows((index + 1) % self.capacity)
+        for i in np.flatnonzero(~self.linked[index]):
+            s_[i] = self.next_state[index[i]]
+        return np.column_stack((self.dequantize(self.windows(index)), self.action[index],
+                                self.reward[index], self.dequantize(s_)))
@@ -0,0 +1,186 @@
+# coding: utf-8
+
+#Year run reports rendered to files instead of one notebook figure per day
+
+#INPUT : Policy: a fixed duty cycle (int) or the file of a trained Net state_dict (str)
+#        List of (location, year)
+
+#OUTPUTS: <out_dir>/<location>_<year>_year.png: day x hour heatmaps of battery, duty cycle and harvested energy
+#         <out_dir>/<location>_<year>_days.png: hourly panels of selected days (as the day by day test cells)
+#         <out_dir>/index.html: reward, downtime and violations of every station-year with its figures
+
+#USAGE: python report.py best_dsnv2_uniform_daytype83AU9D6T_BEST.pt --station-years tokyo:2010 wakkanai:2010
+#       python report.py 3 --out report_fixed3
+
+#Each worker process renders its station-years with the Agg backend. The figures and artists are created
+#once per worker and only their data is replaced for every station-year.
+
+import argparse
+import os
+from multiprocessing import Pool
+
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+from fleet_class import FLEET, fixed_policy, net_policy
+from solar_data import LOCATIONS, get_years, get_radiation
+
+
+NO_OF_PANELS = 4 #no. of selected days
+
+
+#function to run a greedy year and get the hourly records as (days, 24) arrays
+def record_year(policy, location, year, data_dir='./data/'):
+    sradiation = get_radiation(location, year, data_dir)
+    fleet = FLEET(station=0, sradiation=sradiation[None])
+    result = fleet.run(policy, trace=True)
+    shape = (fleet.NO_OF_DAYS, fleet.TIME_STEPS)
+    return {'location': location, 'year': year,
+            'batt': result['batt'][0].reshape(shape) / fleet.BMAX,
+            'henergy': result['henergy'][0].reshape(shape) / fleet.HMAX,
+            'action': result['action'][0].reshape(shape),
+            'enp': result['enp'][0] / fleet.BMAX, #day end ENP normalized by BMAX
+            'reward': float(result['reward'][0]), 'downtime': int(result['downtime'][0]),
+            'violations': int(result['violations'][0])}
+
+
+#function to pick the days shown in the panels: least and most harvested energy, largest |ENP| and the median day
+def select_days(record):
+    tot = record['henergy'].sum(axis=1)
+    order = np.argsort(tot)
+    days = [order[0], order[-1], int(np.argmax(np.abs(record['enp']))), order[len(order)//2]]
+    return days[:NO_OF_PANELS]
+
+
+class RENDERER(object):
+
+    def __init__(self, N_ACTIONS=10):
+        #year figure: one heatmap per record
+        self.year_fig, axes = plt.subplots(3, 1, figsize=(16, 10), sharex=True)
+        self.images = {}
+        for ax, (name, title, cmap, vmax) in zip(axes, [('batt', 'Battery', 'viridis', 1),
+                                                     ('action', 'Duty Cycle', 'plasma', N_ACTIONS - 1),
+                                                     ('henergy', 'Harvested Energy', 'inferno', 1)]):
+            self.images[name] = ax.imshow(np.zeros((24, 365)), aspect='auto', origin='lower', cmap=cmap,
+                                          vmin=0, vmax=vmax, interpolation='nearest')
+            ax.set_title(title)
+            ax.set_ylabel('Hour')
+            self.year_fig.colorbar(self.images[name], ax=ax)
+        axes[-1].set_xlabel('Day')
+        self.year_title = self.year_fig.suptitle('')
+
+        #day figure: harvested energy and battery / duty cycle of the selected days
+        self.day_fig, axes = plt.subplots(NO_OF_PANELS, 2, figsize=(16, 4 * NO_OF_PANELS))
+        hours = np.arange(24)
+        self.panels = []
+        for row in axes:
+            (henergy,) = row[0].plot(hours, np.zeros(24), 'g')
+            row[0].set_ylim([0, 1.2])
+            row[0].set_ylabel('Harvested Energy')
+            (batt,) = row[1].plot(hours, np.zeros(24), 'r')
+            (binit,) = row[1].plot(hours, np.zeros(24), 'r--')
+            row[1].set_ylim([0, 1])
+            row[1].set_ylabel('Battery', color='r')
+            twin = row[1].twinx()
+            (action,) = twin.plot(hours, np.zeros(24), 'b')
+            twin.set_ylim([0, N_ACTIONS])
+            twin.set_ylabel('Duty Cycle', color='b')
+            text = row[1].text(0.1, 0.1, '', fontsize=11, ha='left')
+            title = row[0].set_title('')
+            self.panels.append((henergy, batt, binit, action, text, title))
+        for ax in axes[-1]:
+            ax.set_xlabel('Hour')
+        self.day_title = self.day_fig.suptitle('')
+        self.day_fig.tight_layout(rect=(0, 0, 1, 0.97))
+
+    def render(self, record, out_dir):
+        name = '%s_%s' % (record['location'], record['year'])
+        no_of_days = record['batt'].shape[0]
+        for key, image in self.images.items():
+            image.set_data(record[key].T)
+            image.set_extent((-0.5, no_of_days - 0.5, -0.5, 23.5))
+        self.year_title.set_text('%s %s   average reward %.3f   downtime %d h   violations %d days' %
+                                 (record['location'].upper(), record['year'], record['reward'],
+                                  record['downtime'], record['violations']))
+        year_file = os.path.join(out_dir, name + '_year.png')
+        self.year_fig.savefig(year_file, dpi=80)
+
+        for (henergy, batt, binit, action, text, title), day in zip(self.panels, select_days(record)):
+            henergy.set_ydata(record['henergy'][day])
+            batt.set_ydata(record['batt'][day])
+            binit.set_ydata(np.full(24, record['batt'][day, 0]))
+            action.set_ydata(record['action'][day])
+            text.set_text('BINIT = %.2f\nBMEAN = %.2f\nENP = %.2f' %
+                          (record['batt'][day, 0], np.mean(record['batt'][day]), record['enp'][day]))
+            title.set_text('DAY %d' % day)
+        self.day_title.set_text('%s %s' % (record['location'].upper(), record['year']))
+        day_file = os.path.join(out_dir, name + '_days.png')
+        self.day_fig.savefig(day_file, dpi=80)
+        return year_file, day_file
+
+
+_policy, _renderer = None, None #per worker process
+
+
+def _init_worker(policy):
+    global _policy, _renderer
+    if isinstance(policy, str):
+        from learner_class import load_net #torch is only needed for a learned policy
+        _policy = net_policy(load_net(policy))
+    else:
+        _policy = fixed_policy(policy)
+    _renderer = RENDERER()
+
+
+def _render_station_year(task):
+    location, year, out_dir, data_dir = task
+    record = record_year(_policy, location, year, data_dir)
+    files = _renderer.render(record, out_dir)
+    return {k: record[k] for k in ('location', 'year', 'reward', 'downtime', 'violations')}, files
+
+
+def write_index(rows, out_dir, title):
+    lines = ['<html><head><title>%s</title></head><body><h1>%s</h1>' % (title, title),
+             '<table border="1"><tr><th>location</th><th>year</th><th>reward</th><th>downtime (h)</th>'
+             '<th>violations (days)</th></tr>']
+    for row, _ in rows:
+        lines.append('<tr><td>%s</td><td>%s</td><td>%.3f</td><td>%d</td><td>%d</td></tr>' %
+                     (row['location'], row['year'], row['reward'], row['downtime'], row['violations']))
+    lines.append('</table>')
+    for row, files in rows:
+        lines.append('<h2>%s %s</h2>' % (row['location'], row['year']))
+        lines.extend('<img src="%s" width="100%%">' % os.path.basename(f) for f in files)
+    lines.append('</body></html>')
+    with open(os.path.join(out_dir, 'index.html'), 'w') as f:
+        f.write('\n'.join(lines))
+    return 0
+
+
+#function to render the reports of all the station-years, in parallel. Returns the rows of index.html
+def report(policy, station_years, out_dir='report', data_dir='./data/', processes=None):
+    os.makedirs(out_dir, exist_ok=True)
+    tasks = [(location, year, out_dir, data_dir) for location, year in station_years]
+    with Pool(processes, initializer=_init_worker, initargs=(policy,)) as pool:
+        rows = pool.map(_render_station_year, tasks, chunksize=1)
+    write_index(rows, out_dir, 'Policy %s' % policy)
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('policy', help='fixed duty cycle or Net state_dict file')
+    parser.add_argument('--station-years', nargs='*', help='location:year (default: all the bundled data)')
+    parser.add_argument('--out', default='report')
+    parser.add_argument('--processes', type=int)
+    args = parser.parse_args()
+
+    policy = int(args.policy) if args.policy.isdigit() else args.policy
+    if args.station_years:
+        station_years = [(sy.split(':')[0], int(sy.split(':')[1])) for sy in args.station_years]
+    else:
+        station_years = [(l, y) for l in LOCATIONS for y in get_years(l)]
+    for row, files in report(policy, station_years, args.out, processes=args.processes):
+        print('%-12s %d  reward %.3f  downtime %d  violations %d' %
+              (row['location'], row['year'], row['reward'], row['downtime'], row['violations']))
@@ -0,0 +1,225 @@
+# coding: utf-8
+
+#Class declaration for RESULTS class (experiment results database)
+
+#INPUT : Training runs (train(..., results=RESULTS())) and evaluation runs (evaluate())
+
+#OUTPUTS: SQLite database (<file>, default ./results.sqlite) with
+#         runs: kind ('train' or 'eval'), name, config (JSON), checkpoint hash (store_class.get_hash(), as in
+#               CKPTSTORE), wall clock and CPU time
+#         config: every config field of every run, indexed by field and value
+#         iterations: average reward, EPSILON, LR, location, year, time and validation score of every iteration
+#         evals: score of every run on every (location, year, metric), indexed by station and year
+#         summary: summary fields of a run (e.g. CONTROLLER.summary(): iterations and CPU time saved), as config
+
+#METHODS: To record a run (start(), iteration(), score(), summary(), finish())
+#         To evaluate a checkpoint on station-years and record it (evaluate())
+#         To get the best configs on a station / year (top()), the runs with given config values (runs())
+#         and the reward curve of a run (curve())
+
+#USAGE: python results_class.py top minamidaito --year 2011 [-n 5]
+#       python results_class.py runs [--config hidden_layer=50]
+#       python results_class.py curve <run id>
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+
+from store_class import get_hash #hash of a checkpoint file or state_dict, as in CKPTSTORE
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (run INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT, name TEXT, config TEXT,
+    hash TEXT, created REAL, wall REAL, cpu REAL, iterations INTEGER);
+CREATE TABLE IF NOT EXISTS config (run INTEGER, key TEXT, value TEXT, PRIMARY KEY (run, key));
+CREATE TABLE IF NOT EXISTS iterations (run INTEGER, iteration INTEGER, avg_reward REAL, epsilon REAL, lr REAL,
+    location TEXT, year INTEGER, time REAL, val_score REAL, PRIMARY KEY (run, iteration));
+CREATE TABLE IF NOT EXISTS evals (run INTEGER, location TEXT, year INTEGER, metric TEXT, score REAL,
+    PRIMARY KEY (run, location, year, metric));
+CREATE TABLE IF NOT EXISTS summary (run INTEGER, key TEXT, value TEXT, PRIMARY KEY (run, key));
+CREATE INDEX IF NOT EXISTS config_by_key ON config (key, value, run);
+CREATE INDEX IF NOT EXISTS evals_by_station ON evals (location, year, metric, score);
+CREATE INDEX IF NOT EXISTS evals_by_metric ON evals (metric, score);
+CREATE INDEX IF NOT EXISTS runs_by_hash ON runs (hash);
+CREATE INDEX IF NOT EXISTS runs_by_config ON runs (config);
+'''
+
+
+#function to get the config of a DQN (the hyperparameters used by learn() and the Net sizes)
+def get_dqn_config(dqn):
+    config = {'n_states': dqn.N_STATES, 'n_actions': dqn.N_ACTIONS, 'hidden_layer': dqn.eval_net.fc1.out_features,
+              'lr': dqn.LR, 'epsilon': dqn.EPSILON, 'gamma': dqn.GAMMA, 'batch_size': dqn.BATCH_SIZE,
+              'memory_capacity': dqn.MEMORY_CAPACITY, 'target_replace_iter': dqn.TARGET_REPLACE_ITER}
+    if getattr(dqn, 'replay', None) is not None:
+        config.update(replay=str(dqn.replay.dtype), history=dqn.replay.history)
+    return config
+
+
+class RESULTS(object):
+
+    def __init__(self, file='./results.sqlite'):
+        self.file = file
+        self.db = sqlite3.connect(file)
+        self.db.execute('PRAGMA journal_mode=WAL') #readers (e.g. a notebook) do not block a training run
+        self.db.executescript(SCHEMA)
+        self.tstart = {} #run -> (wall clock, CPU time) at start()
+
+    #function to start a run. config is a dict of JSON values. Returns the run id
+    def start(self, kind='train', config=None, name=None):
+        config = {} if config is None else config
+        text = json.dumps(config, sort_keys=True)
+        cur = self.db.execute('INSERT INTO runs (kind, name, config, created) VALUES (?,?,?,?)',
+                              (kind, name, text, time.time()))
+        run = cur.lastrowid
+        self.db.executemany('INSERT INTO config VALUES (?,?,?)',
+                            [(run, k, json.dumps(v, sort_keys=True)) for k, v in config.items()])
+        self.db.commit()
+        self.tstart[run] = (time.perf_counter(), time.process_time())
+        return run
+
+    #function to record one training iteration (committed every `commit` iterations and by finish())
+    def iteration(self, run, iteration, avg_reward, epsilon=None, lr=None, location=None, year=None,
+                  seconds=None, val_score=None, commit=10):
+        self.db.execute('INSERT OR REPLACE INTO iterations VALUES (?,?,?,?,?,?,?,?,?)',
+                        (run, int(iteration), float(avg_reward), epsilon, lr, location,
+                         None if year is None else int(year), seconds, val_score))
+        if (iteration + 1) % commit == 0:
+            self.db.commit()
+        return 0
+
+    #function to set the validation score of an iteration scored later (e.g. by a VALIDATOR)
+    def val_score(self, run, iteration, score):
+        self.db.execute('UPDATE iterations SET val_score=? WHERE run=? AND iteration=?', (float(score), run, int(iteration)))
+        return 0
+
+    #function to record the scores of a run as {(location, year): score}
+    def score(self, run, scores, metric='avg_reward'):
+        self.db.executemany('INSERT OR REPLACE INTO evals VALUES (?,?,?,?,?)',
+                            [(run, l, int(y), metric, float(s)) for (l, y), s in scores.items()])
+        self.db.commit()
+        return 0
+
+    #function to record the summary of a run, a dict of JSON values (e.g. CONTROLLER.summary())
+    def summary(self, run, summary):
+        self.db.executemany('INSERT OR REPLACE INTO summary VALUES (?,?,?)',
+                            [(run, k, json.dumps(v, sort_keys=True)) for k, v in summary.items()])
+        self.db.commit()
+        return 0
+
+    #function to end a run with the checkpoint it produced (file or sha256) and its wall clock and CPU time
+    def finish(self, run, ckpt=None, iterations=None):
+        hash = get_hash(ckpt) if ckpt is not None and os.path.exists(ckpt) else ckpt
+        wall, cpu = None, None
+        if run in self.tstart:
+            wall, cpu = self.tstart.pop(run)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+        self.db.execute('UPDATE runs SET hash=?, wall=?, cpu=?, iterations=? WHERE run=?', (hash, wall, cpu, iterations, run))
+        self.db.commit()
+        return 0
+
+    #function to evaluate checkpoints (files or state_dicts of the same architecture) with greedy year runs on
+    #the station-years (ENSEMBLE.evaluate()) and record one 'eval' run per checkpoint. Returns the run ids.
+    #Without a config, each eval run gets the config of the train run that produced its checkpoint (same hash),
+    #whose id is kept in the summary as train_run
+    def evaluate(self, ckpts, station_years, config=None, data_dir='./data/'):
+        from ensemble_class import ENSEMBLE
+        ensemble = ENSEMBLE(ckpts)
+        rewards = ensemble.evaluate(station_years, data_dir=data_dir)
+        runs = []
+        for k, ckpt in enumerate(ckpts):
+            hash = get_hash(ckpt)
+            train = self.db.execute("SELECT run, config FROM runs WHERE hash=? AND kind='train' ORDER BY run DESC LIMIT 1",
+                                    (hash,)).fetchone()
+            run = self.start('eval', config if config is not None or train is None else json.loads(train[1]),
+                             name=ckpt if isinstance(ckpt, str) else None)
+            self.score(run, dict(zip(station_years, rewards[k])))
+            if train is not None:
+                self.summary(run, {'train_run': train[0]})
+            self.finish(run, hash)
+            runs.append(run)
+        return runs
+
+    #function to get the best configs as a list of (config, score, no. of runs, run ids); the score is the
+    #average over the runs with that config and the matching station-years. Runs without a config (e.g. the
+    #evaluation of a checkpoint no train run produced) are grouped by checkpoint, with the config {'hash': hash}
+    def top(self, location=None, year=None, metric='avg_reward', n=5, **config):
+        where, args = ['e.metric=?'], [metric]
+        if location is not None:
+            where.append('e.location=?')
+            args.append(location)
+        if year is not None:
+            where.append('e.year=?')
+            args.append(int(year))
+        for k, v in config.items(): #filter on config fields, e.g. hidden_layer=50
+            where.append('r.run IN (SELECT run FROM config WHERE key=? AND value=?)')
+            args.extend([k, json.dumps(v, sort_keys=True)])
+        rows = self.db.execute("SELECT r.config, r.hash, AVG(e.score) AS score, COUNT(DISTINCT r.run), GROUP_CONCAT(DISTINCT r.run) "
+                               "FROM evals e JOIN runs r ON r.run=e.run WHERE " + ' AND '.join(where) +
+                               " GROUP BY COALESCE(NULLIF(r.config, '{}'), r.hash, r.run) ORDER BY score DESC LIMIT ?",
+                               args + [n]).fetchall()
+        return [(json.loads(c) if c != '{}' else {'hash': h}, score, count, [int(r) for r in runs.split(',')])
+                for c, h, score, count, runs in rows]
+
+    #function to get the runs whose config has the given values, as dicts (newest first)
+    def runs(self, kind=None, **config):
+        where, args = ['1'], []
+        if kind is not None:
+            where.append('kind=?')
+            args.append(kind)
+        for k, v in config.items():
+            where.append('run IN (SELECT run FROM config WHERE key=? AND value=?)')
+            args.extend([k, json.dumps(v, sort_keys=True)])
+        keys = ['run', 'kind', 'name', 'config', 'hash', 'created', 'wall', 'cpu', 'iterations']
+        rows = self.db.execute('SELECT ' + ', '.join(keys) + ' FROM runs WHERE ' + ' AND '.join(where) +
+                               ' ORDER BY run DESC', args).fetchall()
+        runs = [dict(zip(keys, row)) for row in rows]
+        for r in runs:
+            r['config'] = json.loads(r['config'])
+            r['summary'] = {k: json.loads(v) for k, v in self.db.execute('SELECT key, value FROM summary WHERE run=?',
+                                                                         (r['run'],))}
+        return runs
+
+    #function to get the iterations of a run as rows of [iteration, avg_reward, epsilon, lr, time, val_score]
+    def curve(self, run):
+        return self.db.execute('SELECT iteration, avg_reward, epsilon, lr, time, val_score FROM iterations '
+                               'WHERE run=? ORDER BY iteration', (run,)).fetchall()
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+        return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--file', default='./results.sqlite')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('top')
+    p.add_argument('location', nargs='?')
+    p.add_argument('--year', type=int)
+    p.add_argument('--metric', default='avg_reward')
+    p.add_argument('-n', type=int, default=5)
+    p = sub.add_parser('runs')
+    p.add_argument('--kind')
+    p.add_argument('--config', nargs='*', default=[], help='key=value (value as JSON)')
+    p = sub.add_parser('curve')
+    p.add_argument('run', type=int)
+    args = parser.parse_args()
+
+    results = RESULTS(args.file)
+    if args.command == 'top':
+        t = time.perf_counter()
+        rows = results.top(args.location, args.year, args.metric, args.n)
+        for config, score, count, runs in rows:
+            print('%.4f  %d runs %s  %s' % (score, count, runs, json.dumps(config, sort_keys=True)))
+        print('%.2f ms' % ((time.perf_counter() - t) * 1e3))
+    elif args.command == 'runs':
+        config = {k: json.loads(v) for k, v in (c.split('=', 1) for c in args.config)}
+        for r in results.runs(args.kind, **config):
+            print(r['run'], r['kind'], r['name'], (r['hash'] or '')[:12], r['iterations'], r['wall'], json.dumps(r['config'], sort_keys=True),
+                  json.dumps(r['summary'], sort_keys=True) if r['summary'] else '')
+    else:
+        for row in results.curve(args.run):
+            print(*row)
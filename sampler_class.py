@@ -0,0 +1,109 @@
+# coding: utf-8
+
+#Class declaration for DAYSAMPLER class (daytype balanced day sampler)
+
+#INPUT : CSV files of the given locations and years (read once)
+
+#OUTPUTS: Schedule of days for one episode as flat indices into the dataset
+#         (station, year, day) of each flat index
+
+#METHODS: To set an arbitrary target mix of daytypes (set_mix())
+#         To draw the days of a whole episode in one vectorized call (draw())
+
+#All the days of all the stations and years are kept in one flat array, grouped by daytype.
+#Daytypes are drawn with an alias table so that each day costs O(1) whatever the target mix.
+
+import numpy as np
+
+from solar_data import LOCATIONS, NO_OF_DAYTYPE
+from solar_data import get_years, get_radiation, get_day_states
+
+
+class DAYSAMPLER(object):
+
+    def __init__(self, locations=LOCATIONS, years=None, data_dir='./data/', mix=None, seed=None):
+        self.locations = list(locations)
+        self.years = years #list of years to use (None -> all the years available for each location)
+        self.data_dir = data_dir
+        self.rng = np.random.default_rng(seed)
+
+        self.NO_OF_DAYS = 365 #no. of days in one episode
+
+        self.sradiation = None #GSR of all the days, shape (total no. of days, 24)
+        self.station = None    #index into self.locations of each day
+        self.year = None       #year of each day
+        self.day = None        #day of year of each day
+        self.daytype = None    #daytype of each day
+
+        self.days = None  #flat indices of all the days grouped by daytype
+        self.start = None #index of the first day of each daytype in self.days
+        self.count = None #no. of days of each daytype
+
+        self.mix = mix    #target daytype probabilities (None -> uniform over daytypes 0 to 4 as in ENO.day_balance)
+        self.prob = None  #alias table: probability of keeping the drawn daytype
+        self.alias = None #alias table: daytype used otherwise
+
+    def fit(self):
+        sradiation, station, year = [], [], []
+        for l, location in enumerate(self.locations):
+            years = get_years(location, self.data_dir) if self.years is None else self.years
+            for y in years:
+                s = get_radiation(location, y, self.data_dir)
+                sradiation.append(s)
+                station.append(np.full(s.shape[0], l))
+                year.append(np.full(s.shape[0], y))
+        self.set_days(np.concatenate(sradiation), np.concatenate(station), np.concatenate(year))
+        return 0
+
+    #function to use the given days as the dataset
+    def set_days(self, sradiation, station, year):
+        self.sradiation = sradiation
+        self.station = station
+        self.year = year
+        first = np.r_[True, (station[1:] != station[:-1]) | (year[1:] != year[:-1])]
+        starts = np.flatnonzero(first)
+        self.day = np.arange(len(station)) - np.repeat(starts, np.diff(np.r_[starts, len(station)]))
+        self.daytype = get_day_states(np.sum(sradiation, axis=1))
+
+        self.days = np.argsort(self.daytype, kind='stable')
+        self.count = np.bincount(self.daytype, minlength=NO_OF_DAYTYPE)
+        self.start = np.cumsum(self.count) - self.count
+        self.set_mix(self.mix)
+        return 0
+
+    #function to build the alias table for the target daytype mix (Vose's method)
+    def set_mix(self, mix=None):
+        if mix is None:
+            mix = np.r_[np.ones(NO_OF_DAYTYPE-1), 0]
+        mix = np.array(mix, dtype=float)
+        mix[self.count == 0] = 0 #daytypes that do not exist in the dataset can not be drawn
+        self.mix = mix / np.sum(mix)
+
+        scaled = self.mix * NO_OF_DAYTYPE
+        self.prob = np.ones(NO_OF_DAYTYPE)
+        self.alias = np.arange(NO_OF_DAYTYPE)
+        small = [i for i in range(NO_OF_DAYTYPE) if scaled[i] < 1]
+        large = [i for i in range(NO_OF_DAYTYPE) if scaled[i] >= 1]
+        while small and large:
+            s, l = small.pop(), large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= 1 - scaled[s]
+            (small if scaled[l] < 1 else large).append(l)
+        return 0
+
+    #function to draw the flat indices of the days of a whole episode
+    def draw(self, no_of_days=None):
+        if self.days is None:
+            self.fit()
+        if no_of_days is None:
+            no_of_days = self.NO_OF_DAYS
+
+        k = self.rng.integers(0, NO_OF_DAYTYPE, no_of_days)
+        u = self.rng.random((2, no_of_days))
+        daytype = np.where(u[0] < self.prob[k], k, self.alias[k])
+        return self.days[self.start[daytype] + (u[1] * self.count[daytype]).astype(int)]
+
+    #function to get the (station, year, day) of the drawn days
+    def get_schedule(self, index):
+        return np.stack((self.station[index], self.year[index], self.day[index]), axis=1)
@@ -0,0 +1,221 @@
+# coding: utf-8
+
+#Policy server for simulated node gateways, and its load generator
+
+#INPUT : Trained Net (state_dict file or TorchScript file written by export.py), loaded once
+#        States sent by any number of clients over a Unix socket or localhost TCP
+
+#OUTPUTS: Greedy action (duty cycle) of every state
+#         Load generator: p50/p99 latency and requests/s
+
+#USAGE: python serve.py serve best_dsnv2_uniform_daytype83AU9D6T_BEST.pt [--unix /tmp/dsn.sock | --port 8765]
+#                       [--budget-ms 2] [--max-batch 4096]
+#       python serve.py load [--unix /tmp/dsn.sock | --port 8765] [--clients 64] [--requests 500]
+
+#Protocol: on connect the server sends N_STATES as a uint32. Every request is N_STATES float32 and every
+#reply is the action as one uint8, in order. A client may have several requests in flight.
+
+#Requests are micro-batched: the first request of a batch waits at most budget-ms from its arrival for others
+#to arrive (or until max-batch requests are waiting), then the whole batch goes through one forward call.
+#If the forward call fails, the connections with a request in that batch are closed.
+
+import argparse
+import asyncio
+import struct
+import time
+import warnings
+
+import numpy as np
+
+
+#function to load a Net state_dict or a TorchScript model as a function states (N, N_STATES) -> actions (N,)
+def load_policy(file):
+    import torch
+    try:
+        extra_files = {'n_states': ''}
+        with warnings.catch_warnings(): #torch.jit prints deprecation warnings
+            warnings.simplefilter('ignore')
+            model = torch.jit.load(file, _extra_files=extra_files)
+        n_states = int(extra_files['n_states'])
+    except RuntimeError: #not TorchScript: a state_dict
+        from learner_class import load_net
+        model = load_net(file)
+        n_states = model.fc1.in_features
+
+    def policy(state):
+        with torch.no_grad():
+            return model(torch.from_numpy(state)).argmax(1).numpy().astype(np.uint8)
+    return policy, n_states
+
+
+class SERVER(object):
+
+    def __init__(self, policy, n_states, budget=0.002, max_batch=4096):
+        self.policy = policy
+        self.n_states = n_states
+        self.budget = budget       #max. time in seconds the first request of a batch waits for others
+        self.max_batch = max_batch
+        self.waiting = []          #(state, future, arrival time) of the requests of the next batch
+        self.arrived = None        #set when the first request of a batch arrives
+        self.full = None           #set when max_batch requests are waiting
+        self.batches = 0
+        self.requests = 0
+
+    async def handle(self, reader, writer):
+        frame = 4 * self.n_states
+        writer.write(struct.pack('<I', self.n_states))
+        replies = asyncio.Queue()
+
+        async def reply():
+            failed = False
+            while True:
+                future = await replies.get()
+                if future is None:
+                    break
+                try:
+                    action = await future
+                except Exception: #the policy failed: no reply, the client sees the connection closed
+                    failed = True
+                    writer.close()
+                    continue
+                if not failed:
+                    writer.write(bytes([action]))
+                    if replies.empty():
+                        await writer.drain()
+
+        replier = asyncio.ensure_future(reply())
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                data = await reader.readexactly(frame)
+                future = loop.create_future()
+                self.waiting.append((data, future, loop.time()))
+                self.arrived.set()
+                if len(self.waiting) >= self.max_batch:
+                    self.full.set()
+                replies.put_nowait(future)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            replies.put_nowait(None)
+            await replier
+            writer.close()
+
+    async def batcher(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self.arrived.wait()
+            #the budget counts from the arrival of the oldest waiting request, which may have waited for the last batch
+            timeout = self.waiting[0][2] + self.budget - loop.time()
+            if timeout > 0:
+                try:
+                    await asyncio.wait_for(self.full.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            batch, self.waiting = self.waiting[:self.max_batch], self.waiting[self.max_batch:]
+            if len(self.waiting) < self.max_batch:
+                self.full.clear()
+            if not self.waiting:
+                self.arrived.clear()
+
+            state = np.frombuffer(bytearray(b''.join(data for data, _, _ in batch)), dtype='<f4').reshape(-1, self.n_states)
+            try:
+                actions = self.policy(state)
+            except Exception as e:
+                print('policy failed on a batch of', len(batch), 'requests:', repr(e))
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future, _), action in zip(batch, actions):
+                if not future.done():
+                    future.set_result(int(action))
+            self.batches += 1
+            self.requests += len(batch)
+
+    async def serve(self, unix=None, host='127.0.0.1', port=8765):
+        self.arrived, self.full = asyncio.Event(), asyncio.Event()
+        if unix is not None:
+            server = await asyncio.start_unix_server(self.handle, unix)
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+        batcher = asyncio.ensure_future(self.batcher())
+        async with server:
+            await server.serve_forever()
+        batcher.cancel()
+
+
+#one client: sends its requests keeping `inflight` of them unanswered. Returns the latency of every request
+async def client(unix, host, port, no_of_requests, inflight, rng):
+    if unix is not None:
+        reader, writer = await asyncio.open_unix_connection(unix)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    n_states = struct.unpack('<I', await reader.readexactly(4))[0]
+    states = rng.random((no_of_requests, n_states), dtype=np.float32)
+    sent = np.empty(no_of_requests)
+    latency = np.empty(no_of_requests)
+    slots = asyncio.Semaphore(inflight)
+
+    async def receive():
+        try:
+            for i in range(no_of_requests):
+                await reader.readexactly(1)
+                latency[i] = time.perf_counter() - sent[i]
+                slots.release()
+        except asyncio.IncompleteReadError: #closed by the server: wake the sender
+            slots.release()
+            raise
+
+    receiver = asyncio.ensure_future(receive())
+    for i in range(no_of_requests):
+        await slots.acquire()
+        if receiver.done():
+            break
+        sent[i] = time.perf_counter()
+        writer.write(states[i].tobytes())
+        await writer.drain()
+    await receiver
+    writer.close()
+    return latency
+
+
+async def load(unix=None, host='127.0.0.1', port=8765, clients=64, no_of_requests=500, inflight=1, seed=0):
+    rng = np.random.default_rng(seed)
+    t = time.perf_counter()
+    latency = await asyncio.gather(*[client(unix, host, port, no_of_requests, inflight, rng) for _ in range(clients)])
+    t = time.perf_counter() - t
+    latency = np.concatenate(latency)
+    return {'requests': len(latency), 'requests_per_s': len(latency) / t,
+            'p50_ms': np.percentile(latency, 50) * 1e3, 'p99_ms': np.percentile(latency, 99) * 1e3}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'load'):
+        p = sub.add_parser(name)
+        p.add_argument('--unix', help='Unix socket path (default: localhost TCP)')
+        p.add_argument('--host', default='127.0.0.1')
+        p.add_argument('--port', type=int, default=8765)
+        if name == 'serve':
+            p.add_argument('file')
+            p.add_argument('--budget-ms', type=float, default=2.0)
+            p.add_argument('--max-batch', type=int, default=4096)
+        else:
+            p.add_argument('--clients', type=int, default=64)
+            p.add_argument('--requests', type=int, default=500, help='requests per client')
+            p.add_argument('--inflight', type=int, default=1, help='unanswered requests per client')
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        import torch
+        torch.set_num_threads(1)
+        policy, n_states = load_policy(args.file)
+        server = SERVER(policy, n_states, args.budget_ms / 1e3, args.max_batch)
+        print('serving', args.file, 'N_STATES', n_states, 'on', args.unix or '%s:%d' % (args.host, args.port))
+        asyncio.run(server.serve(args.unix, args.host, args.port))
+    else:
+        result = asyncio.run(load(args.unix, args.host, args.port, args.clients, args.requests, args.inflight))
+        print('%d requests  %.0f requests/s  p50 %.2f ms  p99 %.2f ms' %
+              (result['requests'], result['requests_per_s'], result['p50_ms'], result['p99_ms']))
@@ -0,0 +1,135 @@
+# coding: utf-8
+
+#Hardware sizing sweep: battery / solar panel / load design-space exploration
+
+#INPUT : Grid of BMAX, panel_size (size of solar cell) and DMAX values, efficiency of the solar cell
+#        List of (location, year) to evaluate on
+#        Policy: a fixed duty cycle (int) or the file of a trained Net state_dict (str)
+
+#OUTPUTS: Result table (dict of columns) with one row per grid point and station-year:
+#         downtime, violations, ENP statistics, average reward and minimum battery without violations
+
+#The grid is split into slices so that every worker process has work (at least one slice per process over all the
+#station-years). Each (station-year, slice) task is simulated as a FLEET whose nodes are the grid points of the
+#slice, so the harvested energy is converted lazily from one shared radiation array with the panel sizes broadcast.
+
+import os
+from multiprocessing import Pool
+
+import numpy as np
+
+from fleet_class import FLEET, PANEL_SIZE, EFFICIENCY, get_energy, fixed_policy, net_policy
+from solar_data import LOCATIONS, get_radiation
+
+
+COLUMNS = ['location', 'year', 'BMAX', 'panel_size', 'DMAX', 'downtime', 'violations',
+           'enp_mean', 'enp_p95', 'enp_ok', 'reward', 'min_battery']
+
+
+#function to replay FLEET.run() with the IDEAL battery (batt += henergy - e_consumed, in float64 from BOPT = BMAX/2)
+#until the first violation. np.cumsum adds in order, so the levels are the same floats as the ones FLEET checks.
+#Returns True for the nodes that reach BMIN = 0 or BMAX
+def _violates(BMAX, net):
+    batt = np.cumsum(np.hstack((0.5*BMAX[:,None], net)), axis=1)[:,1:]
+    return np.any(batt <= 0, axis=1) | np.any(batt >= BMAX[:,None], axis=1)
+
+
+#function to get the smallest battery that never hits its limits under a fixed duty cycle (the ideal battery of FLEET).
+#BMAX must be larger than twice the largest drift of the cumulative energy from BOPT = BMAX/2. The rounding of the
+#hourly sums moves that boundary by a few ulps, so it is found by bisection over the floats around it, replaying
+#the run for every candidate: the result has no violations and the float below it has
+def fixed_min_battery(sradiation, panel_size, DMAX, action, efficiency=EFFICIENCY, HMAX=500, N_ACTIONS=10):
+    henergy = np.clip(get_energy(sradiation.reshape(-1)[None,:], np.asarray(panel_size)[:,None], efficiency), 0, HMAX)
+    e_consumed = (np.clip(action, 0, N_ACTIONS-1)+1)*np.asarray(DMAX)[:,None]/N_ACTIONS
+    net = henergy - e_consumed
+    drift = np.cumsum(net, axis=1)
+    boundary = 2*np.maximum(np.max(drift, axis=1), -np.min(drift, axis=1))
+
+    #bracket with lo violating and hi not: the rounding of the sums is far below 1e-9 of the boundary
+    lo, hi = boundary*(1 - 1e-9), boundary*(1 + 1e-9)
+    lo[~_violates(lo, net)] = 0.0 #BMAX = 0 always violates
+    bad = _violates(hi, net)
+    while np.any(bad):
+        hi[bad] *= 2
+        bad = _violates(hi, net)
+    #positive floats are ordered as their int64 bit patterns: bisect over the floats between lo and hi
+    lo, hi = lo.view(np.int64), hi.view(np.int64)
+    while np.any(hi - lo > 1):
+        mid = lo + (hi - lo)//2
+        bad = _violates(mid.view(float), net)
+        lo, hi = np.where(bad, mid, lo), np.where(bad, hi, mid)
+    return hi.view(float)
+
+
+def _run_station_year(task):
+    location, year, BMAX, panel_size, DMAX, efficiency, policy, data_dir = task
+    sradiation = get_radiation(location, year, data_dir)
+    fleet = FLEET(BMAX=BMAX, DMAX=DMAX, panel_size=panel_size, efficiency=efficiency, station=0, sradiation=sradiation[None])
+
+    if isinstance(policy, str):
+        from learner_class import load_net #torch is only needed for a learned policy
+        result = fleet.run(net_policy(load_net(policy)))
+        min_battery = np.full(len(BMAX), np.nan) #filled from the grid by min_battery()
+    else:
+        result = fleet.run(fixed_policy(policy))
+        min_battery = fixed_min_battery(sradiation, panel_size, DMAX, policy, efficiency)
+
+    enp = np.abs(result['enp'])
+    return {'location': np.full(len(BMAX), location), 'year': np.full(len(BMAX), year),
+            'BMAX': BMAX, 'panel_size': panel_size, 'DMAX': DMAX,
+            'downtime': result['downtime'], 'violations': result['violations'],
+            'enp_mean': np.mean(enp, axis=1), 'enp_p95': np.percentile(enp, 95, axis=1),
+            'enp_ok': np.mean(enp <= 0.10*BMAX[:,None], axis=1), #fraction of days rewarded as energy neutral
+            'reward': result['reward'], 'min_battery': min_battery}
+
+
+#function to fill min_battery with the smallest BMAX of the grid that has no violations for the same
+#(location, year, panel_size, DMAX). Used for learned policies where the actions depend on the battery level
+def min_battery(table):
+    keys = (table['BMAX'], table['DMAX'], table['panel_size'], table['year'], table['location'])
+    order = np.lexsort(keys) #sorted by (location, year, panel_size, DMAX) and then by BMAX
+    new_group = np.r_[True, np.any([k[order][1:] != k[order][:-1] for k in keys[1:]], axis=0)]
+    group_id = np.cumsum(new_group) - 1
+
+    #the first row without violations of each group has the smallest BMAX
+    ok = np.flatnonzero(table['violations'][order] == 0)
+    first = np.r_[True, group_id[ok][1:] != group_id[ok][:-1]][:len(ok)]
+    best = np.full(group_id[-1] + 1, np.nan)
+    best[group_id[ok][first]] = table['BMAX'][order][ok][first]
+
+    table['min_battery'] = np.empty(len(order))
+    table['min_battery'][order] = best[group_id]
+    return table
+
+
+def sweep(BMAX=[9250.0], panel_size=[PANEL_SIZE], DMAX=[500], efficiency=EFFICIENCY, station_years=None, policy=3,
+          data_dir='./data/', processes=None):
+    if station_years is None:
+        station_years = [(location, 2011) for location in LOCATIONS]
+
+    #every combination of the hardware parameters is one node of the fleet
+    B, P, D = np.meshgrid(np.asarray(BMAX, dtype=float), np.asarray(panel_size, dtype=float),
+                          np.asarray(DMAX, dtype=float), indexing='ij')
+    B, P, D = B.ravel(), P.ravel(), D.ravel()
+
+    #(station-year, grid slice) tasks, in the order of the table rows
+    workers = os.cpu_count() if processes is None else processes #processes=None uses all the cores
+    slices = np.array_split(np.arange(len(B)), min(len(B), -(-workers // len(station_years))))
+    tasks = [(location, year, B[i], P[i], D[i], efficiency, policy, data_dir)
+             for location, year in station_years for i in slices]
+    with Pool(processes) as pool:
+        results = pool.map(_run_station_year, tasks, chunksize=1)
+
+    table = {c: np.concatenate([r[c] for r in results]) for c in COLUMNS}
+    if isinstance(policy, str):
+        table = min_battery(table)
+    return table
+
+
+#function to write the result table of sweep() as a CSV file
+def save_table(table, file):
+    with open(file, 'w') as f:
+        f.write(','.join(COLUMNS) + '\n')
+        for row in zip(*[table[c] for c in COLUMNS]):
+            f.write(','.join(str(x) for x in row) + '\n')
+    return 0
@@ -0,0 +1,49 @@
+# coding: utf-8
+
+#Helper functions to read the bundled solar radiation data
+
+#INPUT : CSV files in ./data/<location>/<year>.csv
+
+#OUTPUTS: Global Solar Radiation of one year as a no_of_daysx24 array (sradiation)
+#         Day type of each day (same classification as ENO.get_day_state)
+#         Season of each day
+
+import os
+import numpy as np
+
+
+LOCATIONS = ['tokyo', 'wakkanai', 'minamidaito'] #stations bundled in ./data/
+DAYTYPE_BINS = [3.5, 7, 12, 15, 17.5] #upper limits of daytypes 0 to 4 (total day radiation in MJ/sq.mts)
+NO_OF_DAYTYPE = 6 #no. of daytypes ranging from 0 to 5
+NO_OF_SEASON = 4 #winter (DJF), spring (MAM), summer (JJA), autumn (SON)
+
+
+#function to list all the years available for a location
+def get_years(location, data_dir='./data/'):
+    files = os.listdir(os.path.join(data_dir, location))
+    return sorted([int(f[:-4]) for f in files if f.endswith('.csv')])
+
+
+#function to read the GSR values of a location and year as a no_of_daysx24 array
+def get_radiation(location, year, data_dir='./data/'):
+    import pandas as pd #pandas is only needed when reading the CSV files
+
+    file = os.path.join(data_dir, location, str(year) + '.csv')
+    #skiprows=4 to remove unnecessary title texts
+    #usecols=4 to read only the Global Solar Radiation (GSR) values
+    solar_radiation = pd.read_csv(file, skiprows=4, encoding='shift_jisx0213', usecols=[4])
+    sradiation = np.array(solar_radiation.values, dtype=float).reshape(-1,24)
+    sradiation[np.isnan(sradiation)] = 0 #convert missing data in CSV files to zero
+    return sradiation
+
+
+#vectorized version of ENO.get_day_state()
+def get_day_states(tot_day_radiation):
+    return np.digitize(tot_day_radiation, DAYTYPE_BINS)
+
+
+#function to map each day of the year to its season (0:DJF, 1:MAM, 2:JJA, 3:SON)
+def get_seasons(no_of_days, year=2010):
+    days = np.datetime64(str(year) + '-01-01') + np.arange(no_of_days)
+    month = days.astype('datetime64[M]').astype(int) % 12 #0 is January
+    return (month + 1) % 12 // 3
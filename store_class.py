@@ -0,0 +1,190 @@
+# coding: utf-8
+
+#Class declaration for CKPTSTORE class (content addressed checkpoint store)
+
+#INPUT : Saved Net state_dicts (files written by torch.save(dqn.eval_net.state_dict(), FILENAME))
+#        Training config and evaluation scores of each checkpoint
+
+#OUTPUTS: One copy of each distinct checkpoint in <root>/objects/, named by the sha256 of its content (get_hash())
+#         SQLite index (<root>/index.sqlite) with the architecture, config, file names and scores per station-year
+
+#METHODS: To add a checkpoint (put()) and its scores (add_score(), evaluate())
+#         To find the best checkpoints for a station / year (best()) without loading any of them
+#         To load a checkpoint back (load_state_dict(), load_net())
+
+#USAGE: python store_class.py import *.pt "best models/"*.pt dsnv2_best ...
+#       python store_class.py evaluate --station-years tokyo:2011 wakkanai:2011 minamidaito:2011
+#       python store_class.py best wakkanai [--year 2011]
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import time
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS checkpoints (hash TEXT PRIMARY KEY, n_states INTEGER, hidden_layer INTEGER,
+    n_actions INTEGER, n_layers INTEGER, size INTEGER, created REAL, config TEXT);
+CREATE TABLE IF NOT EXISTS names (name TEXT, hash TEXT, PRIMARY KEY (name, hash));
+CREATE TABLE IF NOT EXISTS scores (hash TEXT, location TEXT, year INTEGER, metric TEXT, score REAL,
+    PRIMARY KEY (hash, location, year, metric));
+CREATE INDEX IF NOT EXISTS scores_by_station ON scores (location, year, metric, score);
+CREATE INDEX IF NOT EXISTS scores_by_metric ON scores (metric, score);
+CREATE INDEX IF NOT EXISTS checkpoints_by_arch ON checkpoints (n_states, hidden_layer, n_layers);
+'''
+
+
+#function to get the hash of a checkpoint (file or state_dict): sha256 of its sorted keys and the dtype, shape and
+#contiguous bytes of each tensor. The bytes written by torch.save depend on the file name, so they are not hashed
+def get_hash(ckpt):
+    import torch
+    state_dict = torch.load(ckpt) if isinstance(ckpt, str) else ckpt
+    h = hashlib.sha256()
+    for key in sorted(state_dict):
+        tensor = state_dict[key].detach().cpu().contiguous()
+        h.update(('%s|%s|%s|' % (key, tensor.dtype, tuple(tensor.shape))).encode())
+        h.update(tensor.numpy().tobytes())
+    return h.hexdigest()
+
+
+class CKPTSTORE(object):
+
+    def __init__(self, root='./checkpoints/'):
+        self.root = root
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(root, 'index.sqlite'))
+        self.db.executescript(SCHEMA)
+
+    def path(self, hash):
+        return os.path.join(self.root, 'objects', hash[:2], hash + '.pt')
+
+    #function to add a checkpoint file or state_dict. Returns its hash; the content is stored only once
+    def put(self, ckpt, config=None, name=None):
+        import torch #torch is only needed when adding or loading checkpoints
+
+        if isinstance(ckpt, str):
+            with open(ckpt, 'rb') as f:
+                data = f.read()
+            name = ckpt if name is None else name
+        else:
+            buffer = io.BytesIO()
+            torch.save(ckpt, buffer)
+            data = buffer.getvalue()
+        hash = get_hash(torch.load(io.BytesIO(data)))
+
+        if self.db.execute('SELECT 1 FROM checkpoints WHERE hash=?', (hash,)).fetchone() is None:
+            from learner_class import get_net_args
+            n_states, hidden_layer, n_actions, n_layers = get_net_args(torch.load(io.BytesIO(data)))
+            file = self.path(hash)
+            os.makedirs(os.path.dirname(file), exist_ok=True)
+            with open(file + '.tmp', 'wb') as f:
+                f.write(data)
+            os.replace(file + '.tmp', file)
+            self.db.execute('INSERT INTO checkpoints VALUES (?,?,?,?,?,?,?,?)',
+                            (hash, n_states, hidden_layer, n_actions, n_layers, len(data), time.time(),
+                             json.dumps(config) if config is not None else None))
+        elif config is not None:
+            self.db.execute('UPDATE checkpoints SET config=? WHERE hash=?', (json.dumps(config), hash))
+        if name is not None:
+            self.db.execute('INSERT OR IGNORE INTO names VALUES (?,?)', (name, hash))
+        self.db.commit()
+        return hash
+
+    def add_score(self, hash, location, year, score, metric='avg_reward'):
+        self.db.execute('INSERT OR REPLACE INTO scores VALUES (?,?,?,?,?)', (hash, location, int(year), metric, float(score)))
+        self.db.commit()
+        return 0
+
+    #function to score a checkpoint with a greedy year run on each (location, year). Uses the vectorized FLEET
+    def evaluate(self, hash, station_years, metric='avg_reward'):
+        from fleet_class import FLEET, net_policy
+        net = self.load_net(hash)
+        scores = {}
+        for location, year in station_years:
+            fleet = FLEET(stations=[location], year=year)
+            result = fleet.run(net_policy(net))
+            scores[(location, year)] = float(result['reward'][0])
+            self.add_score(hash, location, year, scores[(location, year)], metric)
+        return scores
+
+    #function to get the best checkpoints as a list of (hash, score, names); the score is averaged over the
+    #matching station-years
+    def best(self, location=None, year=None, metric='avg_reward', n=1, **arch):
+        where, args = ['s.metric=?'], [metric]
+        if location is not None:
+            where.append('s.location=?')
+            args.append(location)
+        if year is not None:
+            where.append('s.year=?')
+            args.append(int(year))
+        for k, v in arch.items(): #filter on the architecture, e.g. hidden_layer=50
+            if k not in ('n_states', 'hidden_layer', 'n_actions', 'n_layers'):
+                raise ValueError('unknown architecture field: ' + k)
+            where.append('c.%s=?' % k)
+            args.append(v)
+        rows = self.db.execute('SELECT s.hash, AVG(s.score) AS score FROM scores s JOIN checkpoints c ON c.hash=s.hash '
+                               'WHERE ' + ' AND '.join(where) + ' GROUP BY s.hash ORDER BY score DESC LIMIT ?',
+                               args + [n]).fetchall()
+        return [(h, score, self.names(h)) for h, score in rows]
+
+    def names(self, hash):
+        return [r[0] for r in self.db.execute('SELECT name FROM names WHERE hash=? ORDER BY name', (hash,))]
+
+    def info(self, hash):
+        row = self.db.execute('SELECT * FROM checkpoints WHERE hash=?', (hash,)).fetchone()
+        if row is None:
+            raise KeyError(hash)
+        keys = ['hash', 'n_states', 'hidden_layer', 'n_actions', 'n_layers', 'size', 'created', 'config']
+        info = dict(zip(keys, row))
+        info['config'] = json.loads(info['config']) if info['config'] else None
+        info['names'] = self.names(hash)
+        info['scores'] = self.db.execute('SELECT location, year, metric, score FROM scores WHERE hash=?', (hash,)).fetchall()
+        return info
+
+    def hashes(self):
+        return [r[0] for r in self.db.execute('SELECT hash FROM checkpoints ORDER BY created')]
+
+    def load_state_dict(self, hash):
+        import torch
+        return torch.load(self.path(hash))
+
+    def load_net(self, hash):
+        from learner_class import load_net
+        return load_net(self.path(hash))
+
+    #function to copy a stored checkpoint out to a plain file, e.g. for the notebooks
+    def export(self, hash, file):
+        shutil.copyfile(self.path(hash), file)
+        return 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--root', default='./checkpoints/')
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('import')
+    p.add_argument('files', nargs='+')
+    p = sub.add_parser('evaluate')
+    p.add_argument('--station-years', nargs='+', default=['tokyo:2011', 'wakkanai:2011', 'minamidaito:2011'])
+    p = sub.add_parser('best')
+    p.add_argument('location', nargs='?')
+    p.add_argument('--year', type=int)
+    p.add_argument('-n', type=int, default=5)
+    args = parser.parse_args()
+
+    store = CKPTSTORE(args.root)
+    if args.command == 'import':
+        for file in args.files:
+            print(store.put(file), file)
+    elif args.command == 'evaluate':
+        station_years = [(sy.split(':')[0], int(sy.split(':')[1])) for sy in args.station_years]
+        for hash in store.hashes():
+            if store.info(hash)['n_states'] == 3: #FLEET simulates the 3 state [batt, enp, henergy] dsnv2 CAPM
+                print(hash[:12], store.evaluate(hash, station_years))
+    else:
+        for hash, score, names in store.best(args.location, args.year, n=args.n):
+            print(hash[:12], '%.4f' % score, ', '.join(names))
@@ -0,0 +1,123 @@
+# coding: utf-8
+
+#Class declaration for SYNTH class (synthetic solar year generator)
+
+#INPUT : CSV files of all the years available for each location (used once to fit the generator)
+
+#OUTPUTS: Synthetic years of Global Solar Radiation with the same shape as ENO.sradiation (no_of_days x 24)
+
+#METHODS: To fit a Markov chain over daytypes for each location and season (fit())
+#         To generate a batch of synthetic years in one vectorized call (generate())
+#         To serve one synthetic year at a time to ENO in place of a CSV file (next_year())
+
+#The daytype of each synthetic day is drawn from the transition matrix of its location and season,
+#then the hourly profile of that day is copied from a real day of the same location, season and daytype.
+
+import numpy as np
+
+from solar_data import LOCATIONS, NO_OF_DAYTYPE, NO_OF_SEASON
+from solar_data import get_years, get_radiation, get_day_states, get_seasons
+
+
+class SYNTH(object):
+
+    def __init__(self, locations=LOCATIONS, data_dir='./data/', batch=256, seed=None):
+        self.locations = list(locations)
+        self.data_dir = data_dir
+        self.batch = batch #no. of years generated at once by next_year()
+        self.rng = np.random.default_rng(seed)
+
+        self.pool = None   #hourly profiles of all the real days, grouped by (location, season, daytype)
+        self.start = None  #index of the first day of each (location, season, daytype) group in pool
+        self.count = None  #no. of days in each (location, season, daytype) group
+        self.cinit = None  #cumulative daytype distribution of each (location, season)
+        self.ctrans = None #cumulative daytype transition matrix of each (location, season)
+
+        self.buffer = {} #pre-generated years for each location
+        self.bcount = {} #index of the next unused year in the buffer
+
+    def fit(self):
+        NO_OF_LOCATIONS = len(self.locations)
+        trans = np.zeros((NO_OF_LOCATIONS, NO_OF_SEASON, NO_OF_DAYTYPE, NO_OF_DAYTYPE))
+        marginal = np.zeros((NO_OF_LOCATIONS, NO_OF_SEASON, NO_OF_DAYTYPE))
+        days = []
+        keys = []
+
+        for l, location in enumerate(self.locations):
+            for year in get_years(location, self.data_dir):
+                sradiation = get_radiation(location, year, self.data_dir)
+                daytype = get_day_states(np.sum(sradiation, axis=1))
+                season = get_seasons(sradiation.shape[0], year)
+
+                #transition into a day is counted in the season of that day
+                np.add.at(trans[l], (season[1:], daytype[:-1], daytype[1:]), 1)
+                np.add.at(marginal[l], (season, daytype), 1)
+                days.append(sradiation)
+                keys.append((l*NO_OF_SEASON + season)*NO_OF_DAYTYPE + daytype)
+
+        #group the days according to (location, season, daytype)
+        keys = np.concatenate(keys)
+        order = np.argsort(keys, kind='stable')
+        self.pool = np.concatenate(days)[order]
+        counts = np.bincount(keys, minlength=NO_OF_LOCATIONS*NO_OF_SEASON*NO_OF_DAYTYPE)
+        self.count = counts.reshape(NO_OF_LOCATIONS, NO_OF_SEASON, NO_OF_DAYTYPE)
+        self.start = (np.cumsum(counts) - counts).reshape(self.count.shape)
+
+        #daytypes never left in the data fall back to the daytype distribution of the season
+        no_data = np.sum(trans, axis=3) == 0
+        trans[no_data] = np.broadcast_to(marginal[:,:,None,:], trans.shape)[no_data]
+        self.ctrans = np.cumsum(trans / np.sum(trans, axis=3, keepdims=True), axis=3)
+        self.cinit = np.cumsum(marginal / np.sum(marginal, axis=2, keepdims=True), axis=2)
+        self.ctrans[..., -1] = 1.0
+        self.cinit[..., -1] = 1.0
+
+        self.buffer = {}
+        self.bcount = {}
+        return 0
+
+    #function to store the fitted generator so that the CSV files need not be read again
+    def save(self, file):
+        np.savez(file, locations=np.array(self.locations), pool=self.pool, start=self.start,
+                 count=self.count, cinit=self.cinit, ctrans=self.ctrans)
+        return 0
+
+    def load(self, file):
+        data = np.load(file)
+        self.locations = [str(l) for l in data['locations']]
+        self.pool = data['pool']
+        self.start = data['start']
+        self.count = data['count']
+        self.cinit = data['cinit']
+        self.ctrans = data['ctrans']
+        self.buffer = {}
+        self.bcount = {}
+        return 0
+
+    #function to generate a batch of synthetic years of solar radiation, shape (no_of_years, no_of_days, 24)
+    def generate(self, no_of_years, location='tokyo', no_of_days=365):
+        if self.pool is None:
+            self.fit()
+        l = self.locations.index(location)
+        season = get_seasons(no_of_days, 2012 if no_of_days > 365 else 2010)
+
+        u = self.rng.random((no_of_years, no_of_days)) #draws for the daytype of each day
+        v = self.rng.random((no_of_years, no_of_days)) #draws for the profile of each day
+
+        daytype = np.empty((no_of_years, no_of_days), dtype=int)
+        daytype[:,0] = np.searchsorted(self.cinit[l, season[0]], u[:,0], side='right')
+        for day in range(1, no_of_days): #only the days are walked, all the years advance together
+            cum = self.ctrans[l, season[day]][daytype[:,day-1]]
+            daytype[:,day] = np.sum(cum <= u[:,day,None], axis=1)
+
+        group = (season[None,:], daytype)
+        index = self.start[l][group] + (v * self.count[l][group]).astype(int)
+        return self.pool[index]
+
+    #function to get one synthetic year for the given location. Used by ENO in place of a CSV file
+    def next_year(self, location='tokyo'):
+        if self.bcount.get(location, self.batch) >= self.batch:
+            self.buffer[location] = self.generate(self.batch, location)
+            self.bcount[location] = 0
+        sradiation = self.buffer[location][self.bcount[location]]
+        self.bcount[location] += 1
+        return sradiation
@@ -0,0 +1,80 @@
+# coding: utf-8
+
+#Tests of the battery models of battery_class and of their parity with dsnv2 CAPM
+
+#USAGE: python -m pytest -q test_battery.py
+
+import numpy as np
+import pytest
+
+from battery_class import IDEAL, LOSSY, AGING, parity
+from fleet_class import FLEET, fixed_policy
+
+
+@pytest.mark.parametrize('location, year', [('tokyo', 2010), ('wakkanai', 2004), ('minamidaito', 2011)])
+def test_ideal_parity_with_capm(location, year):
+    assert parity(location, year) == {'batt': 0.0, 'day_reward': 0.0}
+
+
+def test_fast_day_mean_close_to_exact():
+    fleet = FLEET(station=np.arange(3))
+    fast = fleet.run(fixed_policy(np.array([2, 4, 6])), trace=True)
+    exact = fleet.run(fixed_policy(np.array([2, 4, 6])), trace=True, exact=True)
+    assert fast['batt'].dtype == np.float32 and exact['batt'].dtype == np.float64
+    np.testing.assert_allclose(fast['day_reward'], exact['day_reward'], rtol=0, atol=1e-9)
+
+
+def test_ideal_step():
+    model = IDEAL()
+    model.reset(2, 9250.0)
+    batt = model.step(np.array([1000.0, 1000.0]), np.array([100.0, 0.0]), np.array([0.0, 90.0]))
+    np.testing.assert_array_equal(batt, [1100.0, 910.0])
+
+
+def test_lossy_efficiency_and_leakage():
+    model = LOSSY(charge=0.9, discharge=0.9, leakage=0.01)
+    model.reset(3, 9250.0)
+    batt = model.step(np.array([1000.0, 1000.0, 1000.0]), np.array([100.0, 0.0, 50.0]), np.array([0.0, 90.0, 50.0]))
+    #leakage of 1% of the stored energy, 90% of the surplus stored, 90 drawn cost 90/0.9 = 100
+    np.testing.assert_allclose(batt, [1000 - 10 + 90, 1000 - 10 - 100, 1000 - 10])
+
+
+def test_aging_capacity_falls_with_throughput():
+    model = AGING(leakage=0.0, fade=0.2, cycles=10.0)
+    model.reset(1, 1000.0)
+    batt = np.array([500.0])
+    capacity, throughput = [float(model.faded[0])], [0.0]
+    for hour in range(200):
+        charge = hour % 2 == 0
+        batt = model.step(batt, np.array([200.0 if charge else 0.0]), np.array([0.0 if charge else 200.0]))
+        np.clip(batt, 0, model.capacity, out=batt)
+        capacity.append(float(model.faded[0]))
+        throughput.append(float(model.throughput[0]))
+    assert np.all(np.diff(throughput) > 0)
+    assert np.all(np.diff(capacity) < 0)
+    #fade of `fade` per `cycles` equivalent full cycles (2*nominal of throughput each)
+    np.testing.assert_allclose(capacity[-1], 1000.0 * (1 - 0.2 * throughput[-1] / (2 * 1000.0 * 10.0)))
+
+
+def test_aging_fade_is_not_a_violation():
+    model = AGING(fade=0.9, cycles=0.5)
+    model.reset(1, 1000.0)
+    batt = model.step(np.array([100.0]), np.array([800.0]), np.array([0.0])) #charged to 820
+    assert batt[0] < model.capacity[0] and model.faded[0] < batt[0]
+    #next hour with no energy in or out: the energy above the faded capacity is lost, the level stays below
+    #the capacity the FLEET checks the limits against
+    batt = model.step(batt, np.array([0.0]), np.array([0.0]))
+    assert batt[0] < model.capacity[0]
+
+
+def test_aging_capacity_stops_at_zero():
+    model = AGING(leakage=0.0, fade=1.0, cycles=0.2) #one hour of full charge fades more than what is left
+    model.reset(2, 1000.0)
+    batt = np.array([500.0, 500.0])
+    for hour in range(10):
+        charge = hour % 2 == 0
+        batt = model.step(batt, np.array([1000.0 if charge else 0.0, 0.0]), np.array([0.0 if charge else 1000.0, 0.0]))
+        np.clip(batt, 0, model.capacity, out=batt)
+        assert np.all(model.faded >= 0) and np.all(batt >= 0)
+    assert model.faded[0] == 0.0 and batt[0] == 0.0
+    assert model.faded[1] == 1000.0 #no throughput, no fade
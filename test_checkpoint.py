@@ -0,0 +1,76 @@
+# coding: utf-8
+
+#Tests of the resumable checkpoints of checkpoint_class
+
+#USAGE: python -m pytest -q test_checkpoint.py
+
+import glob
+import os
+
+import numpy as np
+
+from checkpoint_class import CHECKPOINTER
+from learner_class import DQN
+
+
+DQN_ARGS = dict(memory_capacity=48, batch_size=8, seed=0)
+
+
+def day(seed):
+    return np.random.RandomState(seed).rand(24, 8)
+
+
+def test_orphan_chunks_are_dropped(tmp_path):
+    checkpointer = CHECKPOINTER(str(tmp_path))
+    dqn = checkpointer.attach(DQN(**DQN_ARGS))
+    dqn.store_day_transition(day(1))
+    checkpointer.save(0, dqn, {})
+    checkpointer.close()
+    for file in checkpointer.states(): #the process died after the chunk and before the state file
+        os.remove(file)
+
+    checkpointer = CHECKPOINTER(str(tmp_path))
+    dqn = DQN(**DQN_ARGS)
+    assert checkpointer.restore(dqn) == (0, None)
+    assert glob.glob(os.path.join(str(tmp_path), 'replay', 'chunk_*.npz')) == []
+    checkpointer.attach(dqn)
+    dqn.store_day_transition(day(2))
+    memory = dqn.memory.copy()
+    checkpointer.save(0, dqn, {})
+    checkpointer.close()
+
+    restored = DQN(**DQN_ARGS)
+    assert CHECKPOINTER(str(tmp_path)).restore(restored)[0] == 1
+    np.testing.assert_array_equal(restored.memory, memory)
+
+
+def test_replay_is_rebuilt(tmp_path):
+    checkpointer = CHECKPOINTER(str(tmp_path))
+    dqn = checkpointer.attach(DQN(replay='float64', **DQN_ARGS))
+    for seed in range(3):
+        dqn.store_day_transition(day(seed))
+    checkpointer.save(0, dqn, {})
+    checkpointer.close()
+
+    restored = DQN(replay='float64', **DQN_ARGS)
+    restored.store_day_transition(day(9)) #cleared by restore()
+    CHECKPOINTER(str(tmp_path)).restore(restored)
+    np.testing.assert_array_equal(restored.replay.rows(), dqn.replay.rows())
+
+
+def test_offline_resume(tmp_path):
+    from experience_class import EXPERIENCE, generate
+    from train import train_offline
+    generate(str(tmp_path / 'experience'), ['random'], [('tokyo', 2010)], processes=1)
+    args = dict(eval_every=20, station_years=[('tokyo', 2010)], verbose=False)
+
+    dqn = DQN(offline=EXPERIENCE(str(tmp_path / 'experience')), **DQN_ARGS)
+    scores = train_offline(dqn, 80, checkpointer=CHECKPOINTER(str(tmp_path / 'run')), **args)
+
+    resumed = DQN(offline=EXPERIENCE(str(tmp_path / 'experience')), **DQN_ARGS)
+    train_offline(resumed, 40, checkpointer=CHECKPOINTER(str(tmp_path / 'resumed')), **args)
+    resumed = DQN(offline=EXPERIENCE(str(tmp_path / 'experience')), **DQN_ARGS)
+    resumed_scores = train_offline(resumed, 80, checkpointer=CHECKPOINTER(str(tmp_path / 'resumed')), resume=True, **args)
+    np.testing.assert_array_equal(resumed_scores, scores)
+    for name, value in dqn.eval_net.state_dict().items():
+        assert np.array_equal(resumed.eval_net.state_dict()[name].numpy(), value.numpy()), name
@@ -0,0 +1,63 @@
+# coding: utf-8
+
+#Tests of the climatology tables (climatology.py) and of the forecasts of ENO that use them
+
+#USAGE: python -m pytest -q test_climatology.py
+
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+import climatology
+from dsnv2_class import ENO
+from sampler_class import DAYSAMPLER
+from solar_data import get_radiation
+
+
+#function to get the daytype of every day of a station-year in calendar order
+def calendar_daytype(location, year):
+    eno = ENO(location, year)
+    return np.vectorize(eno.get_day_state)(np.sum(get_radiation(location, year), axis=1))
+
+
+@pytest.mark.parametrize('shuffle', [False, True])
+def test_persistence_uses_the_calendar_day_before(shuffle):
+    np.random.seed(0)
+    eno = ENO('tokyo', 2010, shuffle=shuffle, forecast='persistence')
+    eno.reset()
+    daytype = calendar_daytype('tokyo', 2010)
+    later = eno.doy > 0
+    np.testing.assert_array_equal(eno.fforecast[later], daytype[eno.doy[later] - 1])
+    first = np.flatnonzero(eno.doy == 0)[0] #Jan 1: the climatology of Dec 31
+    assert eno.fforecast[first] == climatology.forecast('climatology', eno.station[first], 365)
+
+
+def test_markov_with_sampler_uses_the_calendar_day_before():
+    sampler = DAYSAMPLER(['tokyo', 'wakkanai'], years=[2010], seed=0)
+    np.random.seed(0)
+    eno = ENO(day_balance=True, sampler=sampler, forecast='markov')
+    eno.reset()
+    daytype = {l: calendar_daytype(l, 2010) for l in ['tokyo', 'wakkanai']}
+    stations = climatology.load()['stations']
+    for k in np.flatnonzero(eno.doy > 0):
+        previous = daytype[stations[eno.station[k]]][eno.doy[k] - 1]
+        assert eno.fforecast[k] == climatology.forecast('markov', eno.station[k], previous=previous)
+
+
+def test_tables_are_rebuilt_when_a_csv_changes(tmp_path):
+    data_dir = str(tmp_path / 'data') + '/'
+    shutil.copytree('data', data_dir, ignore=shutil.ignore_patterns('cache'))
+    tables = climatology.load(data_dir)
+    built = os.path.getmtime(os.path.join(climatology.table_dir(data_dir), 'stations.txt'))
+    climatology._tables.pop(data_dir)
+    assert climatology.load(data_dir)['stations'] == tables['stations']
+    assert os.path.getmtime(os.path.join(climatology.table_dir(data_dir), 'stations.txt')) == built #up to date
+
+    time.sleep(0.01)
+    os.utime(os.path.join(data_dir, 'tokyo', '2010.csv')) #a newer source file
+    climatology._tables.pop(data_dir)
+    climatology.load(data_dir)
+    assert os.path.getmtime(os.path.join(climatology.table_dir(data_dir), 'stations.txt')) > built
@@ -0,0 +1,87 @@
+# coding: utf-8
+
+#Tests of the EPSILON/LR scheduling and convergence detection of controller_class
+
+#USAGE: python -m pytest -q test_controller.py
+
+import pytest
+
+from controller_class import CONTROLLER
+from learner_class import DQN
+from train import train
+
+
+def test_converged_after_window_without_improvement():
+    controller = CONTROLLER(window=5, threshold=0.01, alpha=1.0, min_updates=8)
+    dqn = DQN()
+    for it in range(10): #improving by 0.1 every update
+        assert not controller.update(it, 0.1 * it, dqn)
+    assert controller.converged_at is None
+    for it in range(10, 15): #flat: the last 5 updates do not beat the best before them
+        controller.update(it, 0.9, dqn)
+    assert controller.converged_at == 14 and controller.stopped
+    controller.update(15, 5.0, dqn) #converged_at is kept
+    assert controller.converged_at == 14
+
+
+def test_converged_waits_for_min_updates():
+    controller = CONTROLLER(window=2, min_updates=6, alpha=1.0)
+    dqn = DQN()
+    for it in range(5):
+        controller.update(it, 1.0, dqn)
+    assert controller.converged_at is None
+    controller.update(5, 1.0, dqn)
+    assert controller.converged_at == 5
+
+
+def test_counter_schedule():
+    controller = CONTROLLER(schedule='counter', counter=3, alpha=1.0, stop=False)
+    dqn = DQN()
+    dqn.EPSILON, lr = 0.7, dqn.LR
+    for it, score in enumerate([1.0, 2.0, 3.0]): #two better scores: no change yet
+        controller.update(it, score, dqn)
+    assert (dqn.EPSILON, dqn.LR, controller.up_counter) == (0.7, lr, 2)
+    controller.update(3, 4.0, dqn) #third better one: exploit more and learn slower
+    assert dqn.EPSILON == pytest.approx(0.8) and dqn.LR == lr / 2
+    assert controller.best == 4.0 and controller.up_counter == 0
+    for it, score in enumerate([3.0, 2.0, 1.0], 4): #three worse ones: explore more
+        controller.update(it, score, dqn)
+    assert dqn.EPSILON == pytest.approx(0.7) and dqn.LR == lr / 2
+    assert controller.best == 1.0 and controller.down_counter == 0
+    for it in range(7, 30): #EPSILON and LR stay within their limits
+        controller.update(it, float(it), dqn)
+    assert dqn.EPSILON == controller.EPSILON_MAX and dqn.LR == controller.LR_MIN
+    for group in dqn.optimizer.param_groups:
+        assert group['lr'] == dqn.LR
+
+
+def test_state_dict_round_trip():
+    controller = CONTROLLER(schedule='counter', window=3, min_updates=4, alpha=0.5)
+    dqn = DQN()
+    for it, score in enumerate([1.0, 3.0, 2.0, 2.5, 2.4, 2.4]):
+        controller.update(it, score, dqn)
+        controller.tick()
+    state = controller.state_dict()
+    restored = CONTROLLER()
+    restored.load_state_dict(state)
+    assert restored.state_dict() == state
+    controller.update(6, 9.0, dqn) #the state is a copy
+    assert len(state['scores']) == 6 and len(restored.scores) == 6
+
+
+def test_validation_needs_a_validator():
+    with pytest.raises(ValueError):
+        train(DQN(), 1, controller=CONTROLLER(validation=True), verbose=False)
+
+
+def test_resume_restores_the_state(tmp_path):
+    from checkpoint_class import CHECKPOINTER
+    args = dict(locations=['tokyo'], years=[2010], verbose=False)
+    controller = CONTROLLER(stop=False)
+    train(DQN(memory_capacity=240, batch_size=24), 2, checkpointer=CHECKPOINTER(str(tmp_path)), controller=controller, **args)
+    resumed = CONTROLLER(stop=False)
+    train(DQN(memory_capacity=240, batch_size=24), 3, checkpointer=CHECKPOINTER(str(tmp_path)), resume=True,
+          controller=resumed, **args)
+    assert resumed.iterations == [0, 1, 2] and resumed.scores[:2] == controller.scores
+    assert resumed.smoothed[:2] == controller.smoothed and len(resumed.cpu) == 3
+    assert resumed.summary(3)['iterations_run'] == 3
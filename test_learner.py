@@ -0,0 +1,43 @@
+# coding: utf-8
+
+#Tests of the DQN learners of learner_class
+
+#USAGE: python -m pytest -q test_learner.py
+
+import numpy as np
+import torch
+
+from learner_class import DQN, MULTIDQN
+
+
+SEEDS = [3, 11]
+DQN_ARGS = dict(memory_capacity=240, batch_size=24, target_replace_iter=3)
+
+
+def test_multidqn_matches_separate_dqns():
+    multi = MULTIDQN(SEEDS, **DQN_ARGS)
+    dqns = [DQN(seed=seed, **DQN_ARGS) for seed in SEEDS]
+    data = np.random.RandomState(0)
+
+    for day in range(20):
+        #one day of transitions per seed, the same ones for the MULTIDQN and the DQN of the seed
+        states = data.rand(len(SEEDS), 3)
+        actions = multi.choose_action(states)
+        for k, dqn in enumerate(dqns):
+            assert actions[k] == dqn.choose_action(states[k])
+        transition_rec = data.rand(len(SEEDS), 24, multi.N_STATES * 2 + 2)
+        transition_rec[:, :, multi.N_STATES] = data.randint(0, multi.N_ACTIONS, (len(SEEDS), 24))
+        multi.store_day_transition(transition_rec)
+        for k, dqn in enumerate(dqns):
+            dqn.store_day_transition(transition_rec[k])
+
+        for update in range(3):
+            multi.learn()
+            for dqn in dqns:
+                dqn.learn()
+
+    for k, dqn in enumerate(dqns):
+        state_dict = multi.state_dict(k)
+        for name, value in dqn.eval_net.state_dict().items():
+            assert torch.equal(state_dict[name], value), (SEEDS[k], name)
+        assert not torch.equal(state_dict['fc1.weight'], multi.init_nets[k].state_dict()['fc1.weight']) #it learned
@@ -0,0 +1,22 @@
+# coding: utf-8
+
+#Tests of the preprocessed radiation cache (preprocess.py)
+
+#USAGE: python -m pytest -q test_preprocess.py
+
+import shutil
+
+import numpy as np
+
+from preprocess import load_radiation
+
+
+def test_cache_of_each_data_dir(tmp_path):
+    data_dir = str(tmp_path / 'data') + '/'
+    shutil.copytree('data', data_dir, ignore=shutil.ignore_patterns('cache'))
+    shutil.copy('data/tokyo/2011.csv', data_dir + 'tokyo/2010.csv') #another year under the same name
+    bundled, _ = load_radiation('tokyo', 2010, 'zero')
+    other, _ = load_radiation('tokyo', 2010, 'zero', data_dir)
+    np.testing.assert_array_equal(other, load_radiation('tokyo', 2011, 'zero')[0])
+    assert not np.array_equal(other, bundled)
+    np.testing.assert_array_equal(load_radiation('tokyo', 2010, 'zero')[0], bundled)
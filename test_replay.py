@@ -0,0 +1,66 @@
+# coding: utf-8
+
+#Tests of the compact replay memory of replay_class with multi-hour states (frame replay)
+
+#USAGE: python -m pytest -q test_replay.py
+
+import numpy as np
+import pytest
+
+from dsnv2_class import CAPM
+from replay_class import REPLAY
+
+
+#function to get the transitions [s, a, r, s_] of episodes of CAPM(history=k) in the order of
+#train.run_iteration() (one row per hour, stored one day at a time), as emitted by the environment
+def get_days(k, episodes, trainmode, seed=0):
+    np.random.seed(seed)
+    rng = np.random.RandomState(seed)
+    days = []
+    for location, year in episodes:
+        capm = CAPM(location, year, shuffle=trainmode, trainmode=trainmode, history=k)
+        s, r, day_end, year_end = capm.reset()
+        s = s.copy()
+        day = []
+        while not year_end:
+            a = rng.randint(0, 10)
+            s_, r, day_end, year_end = capm.step(a)
+            s_ = s_.copy() #the windows are views of the HISTORY buffer
+            day.append(np.hstack((s, [a, r], s_)))
+            if day_end:
+                days.append(np.array(day))
+                day = []
+            s = s_
+    return days
+
+
+@pytest.mark.parametrize('k', [2, 4])
+@pytest.mark.parametrize('trainmode', [False, True])
+@pytest.mark.parametrize('capacity', [30000, 10000, 1000])
+def test_windows_match_emitted_states(k, trainmode, capacity):
+    days = get_days(k, [('tokyo', 2010), ('wakkanai', 2004)], trainmode)
+    replay = REPLAY(capacity, 3 * k, 'float64', history=k)
+    for day in days:
+        replay.push(day)
+    rows = np.concatenate(days)[-capacity:].astype(np.float32) #the states are sampled as float32
+    np.testing.assert_array_equal(replay.rows(), rows)
+    #one frame per transition, plus the windows and next states kept apart at the episode boundaries
+    assert len(replay.window) <= 2 and len(replay.next_state) <= 2
+
+    slot = np.random.RandomState(1).choice(replay.size, 256)
+    s, a, r, s_ = replay.sample(256, np.random.RandomState(1))
+    expected = rows[(slot - replay.pos + replay.size) % replay.capacity] #rows are oldest first
+    np.testing.assert_array_equal(s, expected[:, :3*k])
+    np.testing.assert_array_equal(a, expected[:, 3*k])
+    np.testing.assert_array_equal(r, expected[:, 3*k+1])
+    np.testing.assert_array_equal(s_, expected[:, -3*k:])
+
+
+def test_hourly_push_matches_day_push():
+    days = get_days(3, [('minamidaito', 2011)], trainmode=True)
+    by_day, by_hour = REPLAY(5000, 9, 'float64', history=3), REPLAY(5000, 9, 'float64', history=3)
+    for day in days:
+        by_day.push(day)
+        for row in day:
+            by_hour.push(row)
+    np.testing.assert_array_equal(by_hour.rows(), by_day.rows())
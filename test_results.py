@@ -0,0 +1,47 @@
+# coding: utf-8
+
+#Tests of the experiment results database (results_class.py)
+
+#USAGE: python -m pytest -q test_results.py
+
+import torch
+
+from learner_class import Net
+from results_class import RESULTS
+
+
+#function to save a random Net as the best model of a train run with the given config
+def train_run(results, file, seed, config):
+    torch.manual_seed(seed)
+    torch.save(Net().state_dict(), file)
+    run = results.start('train', config, file)
+    results.finish(run, file, 1)
+    return run
+
+
+def test_top_configs_on_a_station_year(tmp_path):
+    results = RESULTS(str(tmp_path / 'results.sqlite'))
+    files = [str(tmp_path / ('net%d.pt' % k)) for k in range(4)]
+    high_lr, low_lr = {'lr': 0.01}, {'lr': 0.001}
+    runs = [train_run(results, files[0], 0, low_lr), train_run(results, files[1], 1, low_lr),
+            train_run(results, files[2], 2, high_lr)]
+    torch.manual_seed(3)
+    torch.save(Net().state_dict(), files[3]) #no train run produced it
+
+    evals = results.evaluate(files, [('minamidaito', 2011), ('tokyo', 2011)])
+    assert [r['summary'].get('train_run') for r in results.runs('eval')[::-1]] == runs + [None]
+
+    top = results.top('minamidaito', 2011)
+    scores = {r: s for r, s in zip(evals, results.db.execute(
+        "SELECT score FROM evals WHERE location='minamidaito' AND year=2011 ORDER BY run").fetchall())}
+    assert len(top) == 3
+    groups = {json_key(c): (score, sorted(r)) for c, score, count, r in top}
+    assert groups[json_key(low_lr)][1] == evals[:2]
+    assert abs(groups[json_key(low_lr)][0] - (scores[evals[0]][0] + scores[evals[1]][0]) / 2) < 1e-9
+    assert groups[json_key(high_lr)] == (scores[evals[2]][0], [evals[2]])
+    assert [c for c, _, _, _ in top if 'hash' in c][0]['hash'] == results.runs('eval')[0]['hash']
+    assert [score for _, score, _, _ in top] == sorted([score for _, score, _, _ in top], reverse=True)
+
+
+def json_key(config):
+    return tuple(sorted(config.items()))
@@ -0,0 +1,59 @@
+# coding: utf-8
+
+#Tests of the micro-batching policy server (serve.py)
+
+#USAGE: python -m pytest -q test_serve.py
+
+import asyncio
+
+import numpy as np
+import pytest
+
+from serve import SERVER, client
+
+
+#function to run a SERVER on a Unix socket while `clients` clients send their requests. Returns their latencies
+def run(server, path, clients=4, no_of_requests=20, timeout=10):
+    async def main():
+        task = asyncio.ensure_future(server.serve(path))
+        while server.full is None: #started
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        try:
+            return await asyncio.wait_for(asyncio.gather(
+                *[client(path, None, None, no_of_requests, 2, np.random.default_rng(k)) for k in range(clients)]), timeout)
+        finally:
+            task.cancel()
+    return asyncio.run(main())
+
+
+def test_actions_are_served_in_batches(tmp_path):
+    server = SERVER(lambda state: (state[:, 0] * 10).astype(np.uint8), 3, budget=0.002)
+    latency = run(server, str(tmp_path / 'dsn.sock'))
+    assert server.requests == 80 and server.batches < 80
+    assert max(np.max(l) for l in latency) < 1.0
+
+
+def test_policy_failure_closes_the_connections(tmp_path):
+    def policy(state):
+        raise ValueError('broken model')
+    server = SERVER(policy, 3)
+    with pytest.raises((asyncio.IncompleteReadError, ConnectionError)): #not a hang
+        run(server, str(tmp_path / 'dsn.sock'))
+
+
+def test_budget_counts_from_the_oldest_arrival():
+    server = SERVER(lambda state: np.zeros(len(state), dtype=np.uint8), 1, budget=5.0)
+
+    async def main():
+        loop = asyncio.get_running_loop()
+        server.arrived, server.full = asyncio.Event(), asyncio.Event()
+        future = loop.create_future()
+        server.waiting.append((np.zeros(1, dtype='<f4').tobytes(), future, loop.time() - 5.0)) #waited the budget already
+        server.arrived.set()
+        batcher = asyncio.ensure_future(server.batcher())
+        try:
+            return await asyncio.wait_for(future, 1.0)
+        finally:
+            batcher.cancel()
+    assert asyncio.run(main()) == 0
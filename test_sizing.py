@@ -0,0 +1,34 @@
+# coding: utf-8
+
+#Tests of the hardware sizing sweep (sizing.py)
+
+#USAGE: python -m pytest -q test_sizing.py
+
+import numpy as np
+
+from fleet_class import FLEET, PANEL_SIZE, fixed_policy
+from sizing import fixed_min_battery, sweep
+from solar_data import get_radiation
+
+
+def test_fixed_min_battery_is_the_violation_boundary():
+    sradiation = get_radiation('tokyo', 2011)
+    panel_size, DMAX = np.array([PANEL_SIZE, 2*PANEL_SIZE, 0.5*PANEL_SIZE]), np.array([500.0, 300.0, 100.0])
+    for action in (0, 3, 7):
+        BMAX = fixed_min_battery(sradiation, panel_size, DMAX, action)
+        fleet = FLEET(BMAX=BMAX, DMAX=DMAX, panel_size=panel_size, station=0, sradiation=sradiation[None])
+        assert np.all(fleet.run(fixed_policy(action))['violations'] == 0)
+        #the next smaller battery (float) hits a limit
+        fleet = FLEET(BMAX=np.nextafter(BMAX, 0), DMAX=DMAX, panel_size=panel_size, station=0, sradiation=sradiation[None])
+        assert np.all(fleet.run(fixed_policy(action))['violations'] > 0)
+
+
+def test_sweep_slices_match_one_fleet():
+    BMAX, DMAX = [2000.0, 9250.0, 20000.0], [300.0, 500.0]
+    table = sweep(BMAX=BMAX, DMAX=DMAX, station_years=[('tokyo', 2011)], processes=4)
+    B, D = np.meshgrid(BMAX, DMAX, indexing='ij')
+    fleet = FLEET(BMAX=B.ravel(), DMAX=D.ravel(), station=0, sradiation=get_radiation('tokyo', 2011)[None])
+    result = fleet.run(fixed_policy(3))
+    np.testing.assert_array_equal(table['BMAX'], B.ravel())
+    np.testing.assert_array_equal(table['violations'], result['violations'])
+    np.testing.assert_array_equal(table['reward'], result['reward'])
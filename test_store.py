@@ -0,0 +1,38 @@
+# coding: utf-8
+
+#Tests of the content addressed checkpoint store (store_class.py)
+
+#USAGE: python -m pytest -q test_store.py
+
+import io
+
+import torch
+
+from learner_class import Net
+from store_class import CKPTSTORE, get_hash
+
+
+def test_same_weights_are_stored_once(tmp_path):
+    torch.manual_seed(0)
+    state_dict = Net().state_dict()
+    for name in ('best_run.pt', 'distilled_h16.pt'): #torch.save writes the file name into the archive
+        torch.save(state_dict, str(tmp_path / name))
+    buffer = io.BytesIO()
+    torch.save(state_dict, buffer)
+    assert (tmp_path / 'best_run.pt').read_bytes() != (tmp_path / 'distilled_h16.pt').read_bytes()
+
+    store = CKPTSTORE(str(tmp_path / 'store'))
+    hashes = {store.put(str(tmp_path / 'best_run.pt')), store.put(str(tmp_path / 'distilled_h16.pt')),
+              store.put(state_dict), store.put(torch.load(io.BytesIO(buffer.getvalue())))}
+    assert hashes == {get_hash(state_dict)}
+    assert store.hashes() == [get_hash(state_dict)]
+    assert store.names(get_hash(state_dict)) == [str(tmp_path / 'best_run.pt'), str(tmp_path / 'distilled_h16.pt')]
+
+
+def test_hash_depends_on_the_weights():
+    torch.manual_seed(0)
+    state_dict = Net().state_dict()
+    changed = {k: v.clone() for k, v in state_dict.items()}
+    changed['out.bias'][0] += 1
+    assert get_hash(changed) != get_hash(state_dict)
+    assert get_hash({k: v.double() for k, v in state_dict.items()}) != get_hash(state_dict)
@@ -0,0 +1,28 @@
+# coding: utf-8
+
+#Tests of the background validation process of validator_class
+
+#USAGE: python -m pytest -q test_validator.py
+
+import os
+import signal
+
+import pytest
+
+from learner_class import DQN
+from validator_class import VALIDATOR
+
+
+def test_failure_is_raised_with_the_traceback():
+    validator = VALIDATOR([('nowhere', 2015)], every=1)
+    validator.submit(0, DQN())
+    with pytest.raises(RuntimeError, match='nowhere'):
+        validator.close()
+
+
+def test_dead_process_is_raised():
+    validator = VALIDATOR(every=1)
+    os.kill(validator.process.pid, signal.SIGKILL)
+    validator.process.join()
+    with pytest.raises(RuntimeError, match='exited with code'):
+        validator.poll()
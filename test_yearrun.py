@@ -0,0 +1,50 @@
+# coding: utf-8
+
+#Tests of the macro-stepping over zero harvest hours (CAPM.macro_step(), yearrun.py)
+
+#USAGE: python -m pytest -q test_yearrun.py
+
+import numpy as np
+import pytest
+
+from dsnv2_class import CAPM
+from yearrun import run_year, schedule_policy
+
+
+#function to run a year with a fixed action, step by step or macro-stepping every zero harvest run.
+#Returns the battery, violation flag and btrack before every end of day step and the day rewards
+def run_fixed(location, year, action, macro):
+    capm = CAPM(location, year)
+    s, r, day_end, year_end = capm.reset()
+    days = []
+    while not year_end:
+        n = capm.eno.zero_run() if macro and capm.henergy == 0 else 0
+        if n >= 2:
+            s, r, day_end, year_end = capm.macro_step(np.full(n, action))
+            continue
+        if capm.eno.hr == capm.eno.TIME_STEPS - 1: #end of day step
+            batt, violation, btrack = capm.batt, capm.violation_flag, np.array(capm.btrack)
+            s, r, day_end, year_end = capm.step(action)
+            days.append((batt, violation, btrack, r))
+        else:
+            s, r, day_end, year_end = capm.step(action)
+    return days, capm.batt
+
+
+@pytest.mark.parametrize('location, year', [('tokyo', 2010), ('wakkanai', 2012)])
+@pytest.mark.parametrize('action', [0, 5, 9])
+def test_macro_step_matches_step(location, year, action):
+    days, batt = run_fixed(location, year, action, macro=False)
+    macro_days, macro_batt = run_fixed(location, year, action, macro=True)
+    assert len(days) == len(macro_days) and batt == macro_batt
+    for (b, v, track, r), (mb, mv, mtrack, mr) in zip(days, macro_days):
+        assert b == mb and v == mv and r == mr
+        np.testing.assert_array_equal(track, mtrack)
+    if action == 9: #the violation flags are exercised
+        assert any(v for _, v, _, _ in days)
+
+
+def test_run_year_macro_matches_step():
+    policy = schedule_policy([2]*6 + [6]*12 + [3]*6)
+    record = run_year(CAPM('tokyo', 2010), policy, macro=False)
+    np.testing.assert_array_equal(run_year(CAPM('tokyo', 2010), policy, macro=True), record)
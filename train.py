@@ -0,0 +1,321 @@
+# coding: utf-8
+
+#Training loop of the dsnv2 notebooks (TRAIN USING data from TOKYO, WAKKANAI and MINAMIDAITO FROM 2005 to 2014)
+
+#Each iteration runs the DQN for one simulated year of a random (location, year) with shuffled days and
+#daytype balancing (trainmode=True). The transitions of each day are stored with the day end reward
+#broadcast to all the hours and decayed by LAMBDA.
+
+import os
+import random
+import time
+import numpy as np
+
+from dsnv2_class import CAPM
+from sampler_class import DAYSAMPLER
+from solar_data import LOCATIONS
+
+
+LAMBDA = 0.9 # parameter decay
+TRAIN_YEARS = list(range(2005, 2015))
+
+
+#function to run one training iteration (one simulated year). Returns the record of [batt, henergy, reward, action]
+def run_iteration(dqn, capm, LAMBDA=LAMBDA):
+    N_STATES = dqn.N_STATES
+    s, r, day_end, year_end = capm.reset()
+    record = np.empty((capm.eno.NO_OF_DAYS * capm.eno.TIME_STEPS, 4))
+
+    transition_rec = np.zeros((capm.eno.TIME_STEPS, N_STATES * 2 + 2)) #record all the transition in one day
+    decay_factor = LAMBDA ** np.arange(capm.eno.TIME_STEPS - 1, -1, -1) #decay of the day end reward for each hour
+
+    t = 0
+    while True:
+        a = dqn.choose_action(s)
+        #state = [batt, enp, henergy]
+        record[t] = [s[0], s[2], r, a] #record battery, henergy, reward and action
+        t += 1
+
+        # take action
+        s_, r, day_end, year_end = capm.step(a)
+
+        transition_rec[capm.eno.hr-1,:] = np.hstack((s, [a, r], s_))
+
+        if (day_end):
+            transition_rec[:,N_STATES+1] = r * decay_factor #broadcast reward to all states and decay it proportionately
+            dqn.store_day_transition(transition_rec)
+
+        if dqn.memory_counter > dqn.MEMORY_CAPACITY:
+            dqn.learn()
+
+        if (year_end):
+            break
+
+        s = s_
+
+    return record[:t]
+
+
+#function to get the average of the day end rewards of a record returned by run_iteration()
+def get_avg_reward(record):
+    reward_rec = record[:,2]
+    return np.mean(reward_rec[reward_rec != 0])
+
+
+#With a CHECKPOINTER the full training state is checkpointed in the background and, with resume=True,
+#training continues from its latest checkpoint exactly as if it had never stopped.
+#With a VALIDATOR the best model is the one with the best held-out score (written by the VALIDATOR)
+#instead of the one with the best training reward.
+#With a RESULTS database the config, every iteration and the validation scores of the best model are recorded,
+#and with a CONTROLLER also its summary (iterations and CPU time saved).
+#With a CONTROLLER EPSILON/LR follow its schedule and training stops once the smoothed reward has converged
+def train(dqn, NO_OF_ITERATIONS=20, locations=LOCATIONS, years=TRAIN_YEARS, LAMBDA=LAMBDA,
+          BFILENAME=None, profiler=None, verbose=True, checkpointer=None, resume=False, validator=None, results=None,
+          controller=None, **capm_args):
+    best_avg_reward = -1000 #initialize best average reward to very low value
+    avg_reward_rec = []
+    if results is not None:
+        run = results.start('train', get_run_config(dqn, NO_OF_ITERATIONS, locations, years, LAMBDA, capm_args), BFILENAME)
+
+    if controller is not None and controller.validation and validator is None:
+        raise ValueError('CONTROLLER(validation=True) needs a validator')
+
+    start = 0
+    if checkpointer is not None:
+        if resume:
+            start, train_state = checkpointer.restore(dqn, capm_args.get('sampler'))
+            if train_state is not None:
+                best_avg_reward, avg_reward_rec = train_state['best_avg_reward'], train_state['avg_reward_rec']
+                if controller is not None:
+                    controller.load_state_dict(train_state['controller'])
+        checkpointer.attach(dqn)
+    controlled = NO_OF_ITERATIONS - start + (len(controller.cpu) if controller is not None else 0) #iterations the controller sees
+
+    if profiler is not None:
+        profiler.reset()
+    if controller is not None:
+        controller.start()
+    for iteration in range(start, NO_OF_ITERATIONS):
+        if controller is not None and controller.stopped: #also when it converged before a resumed checkpoint
+            break
+        tstart = time.perf_counter()
+        LOCATION = random.choice(locations)
+        YEAR = random.choice(years)
+        capm = CAPM(LOCATION, YEAR, shuffle=True, trainmode=True, profiler=profiler, **capm_args)
+
+        record = run_iteration(dqn, capm, LAMBDA)
+        avg_reward = get_avg_reward(record)
+        avg_reward_rec.append(avg_reward)
+        if verbose:
+            print('Iteration:', iteration, LOCATION, YEAR, "Average reward =", avg_reward)
+
+        if profiler is not None:
+            profiler.record(iteration, dqn, location=LOCATION, year=int(YEAR), avg_reward=avg_reward,
+                            epsilon=dqn.EPSILON, lr=dqn.LR)
+
+        validated = []
+        if validator is not None:
+            validator.submit(iteration, dqn)
+            for it, score, promoted in validator.poll():
+                if verbose:
+                    print('Validation:', it, "Score =", score, 'best' if promoted else '')
+                if results is not None:
+                    results.val_score(run, it, score)
+                validated.append((it, score))
+
+        if controller is not None:
+            converged = controller.converged_at is not None
+            for it, score in (validated if controller.validation else [(iteration, avg_reward)]):
+                controller.update(it, score, dqn)
+            if verbose and not converged and controller.converged_at is not None:
+                print('Converged:', controller.converged_at, "Smoothed reward =", controller.smoothed[-1])
+
+        if(best_avg_reward < avg_reward):
+            best_avg_reward = avg_reward
+            if BFILENAME is not None and validator is None:
+                import torch
+                if checkpointer is None:
+                    torch.save(dqn.eval_net.state_dict(), BFILENAME)
+                else: #written by the background thread
+                    checkpointer.submit(torch.save, {k: v.clone() for k, v in dqn.eval_net.state_dict().items()}, BFILENAME)
+
+        if controller is not None:
+            controller.tick()
+        if checkpointer is not None:
+            train_state = {'best_avg_reward': best_avg_reward, 'avg_reward_rec': avg_reward_rec}
+            if controller is not None:
+                train_state['controller'] = controller.state_dict()
+            checkpointer.save(iteration, dqn, train_state, capm_args.get('sampler'))
+
+        if results is not None:
+            results.iteration(run, iteration, avg_reward, dqn.EPSILON, dqn.LR, LOCATION, YEAR, time.perf_counter() - tstart)
+
+    if checkpointer is not None:
+        checkpointer.close()
+    if validator is not None:
+        validator.close()
+        if verbose:
+            print('Best validation score:', validator.best_iteration, validator.scores.get(validator.best_iteration))
+    if controller is not None and verbose:
+        print('Controller:', controller.summary(controlled))
+    if results is not None:
+        if controller is not None: #iterations and CPU time saved by stopping early
+            results.summary(run, controller.summary(controlled))
+        if validator is not None:
+            for it, score in validator.scores.items():
+                results.val_score(run, it, score)
+        best_file = validator.BFILENAME if validator is not None else BFILENAME #written by the VALIDATOR
+        if best_file is not None and os.path.exists(best_file): #per station-year scores of the best model
+            from ensemble_class import ENSEMBLE
+            from validator_class import VALIDATION_YEARS
+            station_years = validator.station_years if validator is not None else VALIDATION_YEARS
+            results.score(run, dict(zip(station_years, ENSEMBLE([best_file]).evaluate(station_years)[0])))
+        results.finish(run, best_file, len(avg_reward_rec))
+    return np.array(avg_reward_rec)
+
+
+#function to get the config recorded by RESULTS for a train() run (the CAPM arguments that are not JSON,
+#e.g. a sampler or a profiler, are recorded by their class name)
+def get_run_config(dqn, NO_OF_ITERATIONS, locations, years, LAMBDA, capm_args):
+    from results_class import get_dqn_config
+    config = get_dqn_config(dqn)
+    config.update(NO_OF_ITERATIONS=NO_OF_ITERATIONS, locations=list(locations), years=[int(y) for y in years], LAMBDA=LAMBDA)
+    for k, v in capm_args.items():
+        config[k] = v if v is None or isinstance(v, (bool, int, float, str)) else type(v).__name__
+    return config
+
+
+#function to get one DAYSAMPLER per seed, all sharing the days read once from the CSV files
+def get_samplers(seeds, locations=LOCATIONS, years=TRAIN_YEARS):
+    data = DAYSAMPLER(locations, years)
+    data.fit()
+    samplers = []
+    for seed in seeds:
+        sampler = DAYSAMPLER(locations, years, seed=seed)
+        sampler.set_days(data.sradiation, data.station, data.year)
+        samplers.append(sampler)
+    return samplers
+
+
+#function to run one training iteration of all the seeds of a MULTIDQN, one CAPM per seed stepped in lockstep.
+#All the CAPMs must have episodes of the same length (e.g. DAYSAMPLER days). Returns the records, shape (K, T, 4)
+def run_multi_iteration(mdqn, capms, LAMBDA=LAMBDA):
+    N_STATES = mdqn.N_STATES
+    K = mdqn.K
+    resets = [capm.reset() for capm in capms]
+    s = np.array([r[0] for r in resets])
+    r = np.array([r[1] for r in resets], dtype=float)
+    TIME_STEPS = capms[0].eno.TIME_STEPS
+    if len(set(capm.eno.NO_OF_DAYS * capm.eno.TIME_STEPS for capm in capms)) != 1:
+        raise ValueError('all the seeds need episodes of the same length')
+    record = np.empty((K, capms[0].eno.NO_OF_DAYS * TIME_STEPS, 4))
+
+    transition_rec = np.zeros((K, TIME_STEPS, N_STATES * 2 + 2)) #record all the transition in one day of every seed
+    decay_factor = LAMBDA ** np.arange(TIME_STEPS - 1, -1, -1)
+
+    t = 0
+    while True:
+        a = mdqn.choose_action(s)
+        record[:, t] = np.column_stack((s[:, 0], s[:, 2], r, a))
+        t += 1
+
+        steps = [capm.step(a[k]) for k, capm in enumerate(capms)]
+        s_ = np.array([step[0] for step in steps])
+        r = np.array([step[1] for step in steps], dtype=float)
+        day_end, year_end = steps[0][2], steps[0][3]
+
+        hr = capms[0].eno.hr
+        transition_rec[:, hr-1, :N_STATES] = s
+        transition_rec[:, hr-1, N_STATES] = a
+        transition_rec[:, hr-1, N_STATES+1] = r
+        transition_rec[:, hr-1, -N_STATES:] = s_
+
+        if (day_end):
+            transition_rec[:, :, N_STATES+1] = r[:, None] * decay_factor
+            mdqn.store_day_transition(transition_rec)
+
+        if mdqn.memory_counter > mdqn.MEMORY_CAPACITY:
+            mdqn.learn()
+
+        if (year_end):
+            break
+
+        s = s_
+
+    return record[:, :t]
+
+
+#function to train K seeds at once on daytype balanced days drawn from the given locations and years.
+#Seed k gives the same results as train_seed(seeds[k]) run on its own. Returns the average rewards, shape (iterations, K)
+def train_multi(mdqn, NO_OF_ITERATIONS=20, locations=LOCATIONS, years=TRAIN_YEARS, LAMBDA=LAMBDA,
+                BFILENAME=None, verbose=True, samplers=None):
+    import torch
+    if samplers is None:
+        samplers = get_samplers(mdqn.seeds, locations, years)
+    best_avg_reward = np.full(mdqn.K, -1000.)
+    avg_reward_rec = []
+
+    for iteration in range(NO_OF_ITERATIONS):
+        capms = [CAPM(locations[0], years[0], shuffle=False, trainmode=True, sampler=sampler) for sampler in samplers]
+        record = run_multi_iteration(mdqn, capms, LAMBDA)
+        avg_reward = np.array([get_avg_reward(rec) for rec in record])
+        avg_reward_rec.append(avg_reward)
+        if verbose:
+            print('Iteration:', iteration, "Average reward =", avg_reward)
+
+        for k in np.flatnonzero(best_avg_reward < avg_reward):
+            best_avg_reward[k] = avg_reward[k]
+            if BFILENAME is not None: #one file per seed, BFILENAME is formatted with the seed
+                torch.save(mdqn.state_dict(k), BFILENAME.format(seed=mdqn.seeds[k]))
+
+    return np.array(avg_reward_rec)
+
+
+#function to train one seed on daytype balanced days as train_multi() does for each of its seeds
+def train_seed(dqn, seed, NO_OF_ITERATIONS=20, locations=LOCATIONS, years=TRAIN_YEARS, LAMBDA=LAMBDA, sampler=None):
+    if sampler is None:
+        sampler = get_samplers([seed], locations, years)[0]
+    avg_reward_rec = []
+    for iteration in range(NO_OF_ITERATIONS):
+        capm = CAPM(locations[0], years[0], shuffle=False, trainmode=True, sampler=sampler)
+        avg_reward_rec.append(get_avg_reward(run_iteration(dqn, capm, LAMBDA)))
+    return np.array(avg_reward_rec)
+
+
+#function to train a DQN(offline=EXPERIENCE(...)) with no environment in the loop: NO_OF_STEPS learn() calls.
+#Every eval_every steps the greedy policy is scored on the held-out station-years (ENSEMBLE.evaluate()) and,
+#with a CHECKPOINTER, checkpointed (one checkpointer iteration per eval_every steps; resume=True continues from it).
+#Returns the scores as rows of [step, average reward]
+def train_offline(dqn, NO_OF_STEPS=100000, eval_every=10000, station_years=None, BFILENAME=None, verbose=True,
+                  checkpointer=None, resume=False):
+    from ensemble_class import ENSEMBLE
+    from validator_class import VALIDATION_YEARS
+    if station_years is None:
+        station_years = VALIDATION_YEARS
+    best_score = -1000
+    score_rec = []
+    start = 0
+    if checkpointer is not None:
+        if resume:
+            start, train_state = checkpointer.restore(dqn)
+            if train_state is not None:
+                best_score, score_rec = train_state['best_score'], train_state['score_rec']
+        checkpointer.attach(dqn)
+
+    for step in range(start * eval_every + 1, NO_OF_STEPS + 1):
+        dqn.learn()
+        if step % eval_every == 0 or step == NO_OF_STEPS:
+            score = float(ENSEMBLE([dqn.eval_net.state_dict()]).evaluate(station_years).mean())
+            score_rec.append([step, score])
+            if verbose:
+                print('Step:', step, "Average reward =", score)
+            if best_score < score:
+                best_score = score
+                if BFILENAME is not None:
+                    import torch
+                    torch.save(dqn.eval_net.state_dict(), BFILENAME)
+            if checkpointer is not None:
+                checkpointer.save((step - 1) // eval_every, dqn, {'best_score': best_score, 'score_rec': score_rec})
+    if checkpointer is not None:
+        checkpointer.close()
+    return np.array(score_rec)
@@ -0,0 +1,115 @@
+# coding: utf-8
+
+#Class declaration for VALIDATOR class (best model selection on held-out station-years)
+
+#INPUT : Snapshots of dqn.eval_net taken every N training iterations (submit())
+#        Fixed list of held-out (location, year)
+
+#OUTPUTS: Average greedy reward of every snapshot on the held-out station-years
+#         BFILENAME: state_dict of the snapshot with the best validation score (promoted as soon as it is scored)
+
+#METHODS: To get the scores computed so far without waiting (poll())
+#         To wait for all the snapshots to be scored (close())
+#         Both raise RuntimeError if the validation process failed (with its traceback) or died
+
+#The snapshots are scored by a separate process so that training never waits for validation.
+#The CPU share of that process is set with its torch threads and its nice value.
+
+import multiprocessing as mp
+import os
+import queue
+import traceback
+
+import numpy as np
+
+
+VALIDATION_YEARS = [('tokyo', 2015), ('wakkanai', 2015), ('minamidaito', 2015),
+                    ('tokyo', 2004), ('wakkanai', 2004)] #not in train.TRAIN_YEARS
+
+
+#validation process: scores the snapshots in order and promotes the best one.
+#An exception is sent back as its traceback (a str) and ends the process with exit code 1
+def validate_loop(jobs, results, station_years, BFILENAME, data_dir, threads, nice):
+    try:
+        import torch
+        from ensemble_class import ENSEMBLE
+        torch.set_num_threads(threads)
+        os.nice(nice)
+
+        best_score = -np.inf
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            iteration, state_dict = job
+            score = float(np.mean(ENSEMBLE([state_dict]).evaluate(station_years, data_dir=data_dir)))
+            promoted = score > best_score
+            if promoted:
+                best_score = score
+                if BFILENAME is not None:
+                    torch.save(state_dict, BFILENAME + '.tmp')
+                    os.replace(BFILENAME + '.tmp', BFILENAME)
+            results.put((iteration, score, promoted))
+    except BaseException:
+        results.put(traceback.format_exc())
+        results.close()
+        results.join_thread() #the traceback is flushed before exiting
+        os._exit(1)
+
+
+class VALIDATOR(object):
+
+    def __init__(self, station_years=VALIDATION_YEARS, every=5, BFILENAME=None, data_dir='./data/', threads=1, nice=10):
+        self.station_years = list(station_years)
+        self.every = every #snapshot every `every` iterations
+        self.BFILENAME = BFILENAME
+        self.scores = {} #iteration -> validation score
+        self.best_iteration = None
+
+        ctx = mp.get_context('spawn') #a fresh interpreter, not a fork of the training process
+        self.jobs = ctx.Queue()
+        self.results = ctx.Queue()
+        self.process = ctx.Process(target=validate_loop, daemon=True,
+                                   args=(self.jobs, self.results, self.station_years, BFILENAME, data_dir, threads, nice))
+        self.process.start()
+
+    #function to queue a snapshot of dqn.eval_net for validation at the end of an iteration
+    def submit(self, iteration, dqn):
+        if (iteration + 1) % self.every != 0:
+            return 0
+        self.jobs.put((iteration, {k: v.clone() for k, v in dqn.eval_net.state_dict().items()}))
+        return 0
+
+    #function to collect the scores that are ready. Returns the new (iteration, score, promoted)
+    def poll(self, block=False):
+        new = []
+        while True:
+            try:
+                result = self.results.get(block=block)
+            except queue.Empty:
+                self.check()
+                return new
+            if isinstance(result, str):
+                raise RuntimeError('validation process failed:\n' + result)
+            iteration, score, promoted = result
+            self.scores[iteration] = score
+            if promoted:
+                self.best_iteration = iteration
+            new.append((iteration, score, promoted))
+            block = False
+
+    #function to wait for all the queued snapshots. Returns all the scores
+    def close(self):
+        self.jobs.put(None)
+        while self.process.is_alive() or not self.results.empty():
+            self.poll(block=False)
+            self.process.join(0.1)
+        self.poll()
+        return self.scores
+
+    #function to raise if the validation process died without sending its traceback (killed, out of memory)
+    def check(self):
+        exitcode = self.process.exitcode
+        if exitcode is not None and exitcode != 0:
+            raise RuntimeError('validation process exited with code %d' % exitcode)
+        return 0
